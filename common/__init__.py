@@ -0,0 +1 @@
+"""Money Machine 共通モジュール（パイプラインの各ステップから共有される部品）"""
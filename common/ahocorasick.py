@@ -0,0 +1,62 @@
+"""複数の固定文字列を1回の走査でまとめて探す（Aho-Corasick 法）
+
+パターン数に関係なく、テキストの長さに比例する時間で全ての出現位置を返す。
+オートマトンの構築はパターンの集合ごとに1回だけ行いキャッシュする（get_automaton）。
+"""
+from collections import deque
+from functools import lru_cache
+
+
+class Automaton:
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (index,)
+
+        # 幅優先で失敗遷移を張り、接尾辞で一致するパターンも出力に含める
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def finditer(self, text):
+        """(開始位置, 終了位置, パターン) を終了位置の順に返す（重なりも全て）"""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                pattern = patterns[index]
+                yield pos + 1 - len(pattern), pos + 1, pattern
+
+
+@lru_cache(maxsize=16)
+def _cached(patterns):
+    return Automaton(patterns)
+
+
+def get_automaton(patterns):
+    """同じパターン集合ならキャッシュ済みのオートマトンを返す"""
+    return _cached(tuple(sorted(set(patterns))))
@@ -0,0 +1,87 @@
+"""ビルド状態ストア（コンテンツハッシュによるインクリメンタルビルド）
+
+各ステップの入力（クエリ結果・設定JSON・テンプレートソース）からフィンガープリントを作り、
+money_machine.db の build_state テーブルに前回成功時の値を保存する。
+フィンガープリントが一致し出力も揃っていればステップをスキップでき、
+出力ファイルはバイト単位でそのまま残る（= git の差分も発生しない）。
+
+フィンガープリント仕様（dict）:
+  queries  SQL のリスト。結果行をハッシュする
+  files    BASE_DIR 相対の glob のリスト。ファイル内容をハッシュする
+  listing  BASE_DIR 相対の glob のリスト。一致したパス名だけをハッシュする
+  templates  テンプレート名のリスト。include / extends 先も含めたファイル内容をハッシュする
+  stamp    strftime 書式。出力に日付を含むステップ用（例: '%Y-%m' なら月が変わると再生成）
+"""
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS build_state (
+        step TEXT PRIMARY KEY,
+        fingerprint TEXT,
+        built_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+
+def _glob(pattern):
+    return sorted(glob.glob(os.path.join(BASE_DIR, pattern), recursive=True))
+
+
+def fingerprint(conn, spec):
+    """仕様に従って入力をハッシュし、16進文字列を返す"""
+    h = hashlib.sha256()
+    for sql in spec.get('queries', []):
+        rows = conn.execute(sql).fetchall()
+        h.update(b'Q' + sql.encode('utf-8'))
+        h.update(json.dumps(rows, ensure_ascii=False, default=str).encode('utf-8'))
+    for pattern in spec.get('files', []):
+        for path in _glob(pattern):
+            if not os.path.isfile(path):
+                continue
+            h.update(b'F' + os.path.relpath(path, BASE_DIR).encode('utf-8'))
+            with open(path, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+    for pattern in spec.get('listing', []):
+        for path in _glob(pattern):
+            h.update(b'L' + os.path.relpath(path, BASE_DIR).encode('utf-8'))
+    if spec.get('templates'):
+        from common import templating
+        for name in spec['templates']:
+            for path in templating.dependencies(name):
+                h.update(b'T' + os.path.relpath(path, BASE_DIR).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+    if spec.get('stamp'):
+        h.update(b'S' + datetime.now().strftime(spec['stamp']).encode('utf-8'))
+    return h.hexdigest()
+
+
+def outputs_exist(outputs):
+    """宣言された出力（output/ や config/ 配下のパス）が全て存在するか。db/ は対象外"""
+    for resource in outputs:
+        if resource == 'db' or resource.startswith('db/'):
+            continue
+        if not os.path.exists(os.path.join(BASE_DIR, resource)):
+            return False
+    return True
+
+
+def get(conn, step):
+    ensure_table(conn)
+    row = conn.execute('SELECT fingerprint FROM build_state WHERE step = ?', (step,)).fetchone()
+    return row[0] if row else None
+
+
+def record(conn, step, value):
+    ensure_table(conn)
+    conn.execute('''INSERT INTO build_state (step, fingerprint, built_at) VALUES (?, ?, ?)
+                    ON CONFLICT(step) DO UPDATE SET fingerprint = excluded.fingerprint,
+                                                    built_at = excluded.built_at''',
+                 (step, value, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
@@ -0,0 +1,456 @@
+"""OGP・SNS用カード画像をまとめて描画する
+
+カードは {'layout': レイアウト名, 'path': 出力先(BASE_DIR 相対), 'fields': 差し込む値} の dict。
+レイアウトは (背景を描く関数, 文字を描く関数) の組で LAYOUTS に登録する
+（og-tool / og-sim: 各ページの OGP 画像、sim-ranking / tool-highlight: SNS 投稿用）:
+
+  背景    どのカードでも同じ部分（地色・ヘッダー帯のグラデーション・枠・順位バッジ・固定の文言）。
+          プロセスごとにレイアウトにつき1回だけ描いてキャッシュする（background）
+  文字    カードごとに変わる部分。背景のコピーに fields の値だけを描く
+
+描いたカードは入力（レイアウトの版と fields）のハッシュを rendered_cards テーブル
+（common/migrations.py で作る）に持ち、入力が前回と同じカードは描画も書き込みもしない
+（render_cards）。描き直しても画像が前回と同じになったときはファイルに触らない。
+書き出しはパレットに減色した最適化済み PNG で、WebP / AVIF を並べて書き出すこともできる（encode）。
+カード数が PARALLEL_MIN_CARDS 以上ならワーカープロセスに分けて描画する（common/pages.py と同じ方式）。
+ワーカーは spawn で起動するので fields は pickle できる値（dict / list / str / 数値）にすること。
+フォントと背景はワーカーごとに最初の1枚で読み込み・描画され、以降は使い回される。
+Pillow は関数の中で import する（Pillow が無くても import だけはできるように）。
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from common import fonts
+
+BASE_DIR = fonts.BASE_DIR
+PARALLEL_MIN_CARDS = 64
+BATCHES_PER_WORKER = 4
+
+# エンコードの設定。変えたら ENCODING_VERSION を上げる（入力ハッシュに含まれ、全カードが描き直される）
+ENCODING_VERSION = 1
+PALETTE_COLORS = 256  # 減らすと順位バッジのような面積の小さい色が近い色に潰れる
+# PNG と並べて書き出せる形式: 名前: (Pillow の形式名, 元にする画像, save の引数)
+EXTRA_FORMATS = {
+    'webp': ('WEBP', 'palette', {'lossless': True, 'method': 4}),
+    'avif': ('AVIF', 'rgb', {'quality': 70}),
+}
+
+W, H = 1200, 630  # OGP の推奨サイズ
+SITE_HOST = 'ai-money-lab.github.io/benri-tools'
+
+HEADER_H = 96
+GRADIENT = ('#667eea', '#764ba2')  # サイトのヘッダーと同じ
+BG = '#f5f7fa'
+PANEL = '#ffffff'
+PANEL_BORDER = '#e0e4f0'
+TEXT = '#1a1a2e'
+SUB_TEXT = '#555555'
+MUTED = '#888888'
+ACCENT = '#667eea'
+PRICE = '#e63946'
+RANK_COLORS = ['#FFD700', '#C0C0C0', '#CD7F32']
+
+PANEL_BOX = (40, HEADER_H + 30, W - 40, H - 64)
+SIM_ROWS_TOP = 300
+SIM_ROW_H = 74
+
+
+# ---------------------------------------------------------------------------
+# 文字の配置
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=fonts.TEXT_CACHE_SIZE)
+def _char_width(ch, font):
+    return font.getlength(ch)
+
+
+def _width(text, font):
+    return sum(_char_width(ch, font) for ch in text)
+
+
+def fit(text, font, width):
+    """width に収まらなければ末尾を「…」にして切り詰める"""
+    if _width(text, font) <= width:
+        return text
+    limit = width - _char_width('…', font)
+    used, end = 0, 0
+    for end, ch in enumerate(text):
+        used += _char_width(ch, font)
+        if used > limit:
+            break
+    return text[:end].rstrip() + '…'
+
+
+def wrap(text, font, width, max_lines):
+    """文字単位で折り返して最大 max_lines 行にする（溢れた分は最終行を「…」で切る）"""
+    lines, line, used = [], '', 0
+    for i, ch in enumerate(text):
+        w = _char_width(ch, font)
+        if line and used + w > width:
+            if len(lines) == max_lines - 1:
+                lines.append(fit(line + text[i:], font, width))
+                return lines
+            lines.append(line)
+            line, used = '', 0
+            if ch.isspace():
+                continue
+        line += ch
+        used += w
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _draw_centered(draw, box, text, font, fill):
+    x0, y0, x1, y1 = box
+    tw, th = fonts.text_size(text, font)
+    left, top, _, _ = fonts.text_bbox(text, font)
+    draw.text((x0 + (x1 - x0 - tw) // 2 - left, y0 + (y1 - y0 - th) // 2 - top), text, fill=fill, font=font)
+
+
+# ---------------------------------------------------------------------------
+# OGP 用（output/tools/ の各ページ）: 背景
+# ---------------------------------------------------------------------------
+
+def _base(header_text):
+    """地色・グラデーションのヘッダー帯・白いパネル・フッターの URL"""
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (W, H), BG)
+    mask = Image.linear_gradient('L').rotate(90).resize((W, HEADER_H))
+    img.paste(Image.composite(Image.new('RGB', (W, HEADER_H), GRADIENT[1]),
+                              Image.new('RGB', (W, HEADER_H), GRADIENT[0]), mask), (0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.text((60, 28), header_text, fill='#ffffff', font=fonts.get(30, bold=True))
+    draw.rounded_rectangle(PANEL_BOX, radius=20, fill=PANEL, outline=PANEL_BORDER, width=2)
+    draw.text((60, H - 46), SITE_HOST, fill=MUTED, font=fonts.get(20))
+    return img, draw
+
+
+def _tool_background():
+    img, draw = _base('Money Machine ｜ 無料お金ツール')
+    x0, y0, _, y1 = PANEL_BOX
+    draw.rectangle([x0, y0 + 24, x0 + 8, y1 - 24], fill=ACCENT)
+    draw.rounded_rectangle([90, y0 + 34, 250, y0 + 76], radius=21, fill='#eef0fc')
+    _draw_centered(draw, (90, y0 + 34, 250, y0 + 76), '無料ツール', fonts.get(22, bold=True), ACCENT)
+    return img
+
+
+def _sim_background():
+    img, draw = _base('格安SIM比較【自動更新】')
+    rank_font = fonts.get(26, bold=True)
+    for i, color in enumerate(RANK_COLORS):
+        y = SIM_ROWS_TOP + i * SIM_ROW_H
+        if i % 2 == 0:
+            draw.rectangle([60, y, W - 60, y + SIM_ROW_H - 8], fill='#f8fafc')
+        cx, cy, r = 104, y + (SIM_ROW_H - 8) // 2, 24
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=color)
+        _draw_centered(draw, (cx - r, cy - r, cx + r, cy + r), str(i + 1), rank_font, '#ffffff')
+    draw.text((80, SIM_ROWS_TOP - 40), '最安プラン', fill=MUTED, font=fonts.get(20, bold=True))
+    return img
+
+
+# ---------------------------------------------------------------------------
+# OGP 用: 文字
+# ---------------------------------------------------------------------------
+
+def _tool_text(draw, fields):
+    """fields: {'title', 'description'}"""
+    title_font, desc_font = fonts.get(48, bold=True), fonts.get(26)
+    y = PANEL_BOX[1] + 104
+    for line in wrap(fields['title'], title_font, 1000, 2):
+        draw.text((90, y), line, fill=TEXT, font=title_font)
+        y += 66
+    y += 18
+    for line in wrap(fields.get('description', ''), desc_font, 1000, 3):
+        draw.text((90, y), line, fill=SUB_TEXT, font=desc_font)
+        y += 40
+
+
+def _sim_text(draw, fields):
+    """fields: {'heading', 'lead', 'date'（省略可）, 'plans': [[事業者, プラン名, 料金, データ容量], ...]}（最大3件）"""
+    heading_font, lead_font = fonts.get(42, bold=True), fonts.get(22)
+    provider_font, plan_font, price_font = fonts.get(26, bold=True), fonts.get(18), fonts.get(30, bold=True)
+    draw.text((80, PANEL_BOX[1] + 28), fit(fields['heading'], heading_font, 1040), fill=TEXT, font=heading_font)
+    draw.text((80, PANEL_BOX[1] + 88), fit(fields.get('lead', ''), lead_font, 1040), fill=SUB_TEXT, font=lead_font)
+    for i, (provider, plan_name, price, data) in enumerate(fields['plans'][:len(RANK_COLORS)]):
+        y = SIM_ROWS_TOP + i * SIM_ROW_H
+        draw.text((150, y + 6), fit(provider, provider_font, 560), fill=TEXT, font=provider_font)
+        draw.text((150, y + 40), fit(plan_name, plan_font, 560), fill=SUB_TEXT, font=plan_font)
+        dw, _ = fonts.text_size(data, plan_font)
+        draw.text((800 - dw // 2, y + 22), data, fill=SUB_TEXT, font=plan_font)
+        pw, _ = fonts.text_size(price, price_font)
+        draw.text((W - 90 - pw, y + 14), price, fill=PRICE, font=price_font)
+    if fields.get('date'):
+        date_font = fonts.get(20)
+        dw, _ = fonts.text_size(fields['date'], date_font)
+        draw.text((W - 60 - dw, H - 46), fields['date'], fill=MUTED, font=date_font)
+
+
+# ---------------------------------------------------------------------------
+# SNS 投稿用（X のカード）
+# ---------------------------------------------------------------------------
+
+RANKING_SIZE = (1200, 675)
+RANKING_ROWS_TOP = 110
+RANKING_ROW_H = 100
+RANKING_LABELS = ['1位', '2位', '3位', '4位', '5位']
+RANKING_COLORS = ['#FFD700', '#C0C0C0', '#CD7F32', '#666666', '#666666']
+RANKING_ROW_BG = ['#FFF8E1', '#F5F5F5', '#FFF3E0', '#FAFAFA', '#FAFAFA']
+
+
+def _ranking_background():
+    from PIL import Image, ImageDraw
+    w, h = RANKING_SIZE
+    img = Image.new('RGB', RANKING_SIZE, '#FFFFFF')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([(0, 0), (w, 90)], fill='#0d1b3e')
+    title, title_font = '格安SIM 最安ランキング', fonts.get(36)
+    tw, _ = fonts.text_size(title, title_font)
+    draw.text(((w - tw) // 2, 22), title, fill='#FFFFFF', font=title_font)
+    label_font = fonts.get(24)
+    for i, label in enumerate(RANKING_LABELS):
+        y = RANKING_ROWS_TOP + i * RANKING_ROW_H
+        draw.rectangle([(40, y), (w - 40, y + RANKING_ROW_H - 10)], fill=RANKING_ROW_BG[i], outline='#E0E0E0')
+        cx, cy, r = 100, y + (RANKING_ROW_H - 10) // 2, 28
+        draw.ellipse([(cx - r, cy - r), (cx + r, cy + r)], fill=RANKING_COLORS[i])
+        rw, rh = fonts.text_size(label, label_font)
+        draw.text((cx - rw // 2, cy - rh // 2 - 2), label, fill='#FFFFFF', font=label_font)
+    draw.rectangle([(0, h - 50), (w, h)], fill='#f5f5f5')
+    draw.text((40, h - 38), '※税込価格 ｜ 最新情報は公式サイトをご確認ください', fill='#999999', font=fonts.get(18))
+    return img
+
+
+def _ranking_text(draw, fields):
+    """fields: {'date', 'plans': [[事業者, プラン名, 料金, データ容量], ...]}（最大5件）"""
+    w = RANKING_SIZE[0]
+    small, provider_font, price_font = fonts.get(18), fonts.get(32), fonts.get(28)
+    dw, _ = fonts.text_size(fields['date'], small)
+    draw.text(((w - dw) // 2, 68), fields['date'], fill='#aabbcc', font=small)
+    for i, (provider, plan_name, price, data) in enumerate(fields['plans'][:len(RANKING_LABELS)]):
+        y = RANKING_ROWS_TOP + i * RANKING_ROW_H
+        draw.text((160, y + 12), provider, fill='#1a1a1a', font=provider_font)
+        draw.text((160, y + 52), plan_name, fill='#666666', font=small)
+        pw, _ = fonts.text_size(price, price_font)
+        draw.text((w - 80 - pw, y + 25), price, fill='#1a73e8', font=price_font)
+        draw.text((w - 80 - pw, y + 60), data, fill='#888888', font=small)
+
+
+HIGHLIGHT_FOOTER_Y = H - 50
+HIGHLIGHT_CARD = (60, 115, W - 60, H - 70)
+HIGHLIGHT_FEATURES = [
+    '無料で使える計算・シミュレーションツール',
+    'スマホ対応 -- いつでもどこでも利用可能',
+    'データは自動更新 -- 常に最新情報',
+]
+
+
+def _highlight_background():
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (W, H), '#FFFFFF')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, W, 90], fill='#1DA1F2')
+    title, title_font = '今日のおすすめツール', fonts.get(36, bold=True)
+    tw, _ = fonts.text_size(title, title_font)
+    draw.text(((W - tw) // 2, 20), title, fill='#FFFFFF', font=title_font)
+    x0, y0, x1, y1 = HIGHLIGHT_CARD
+    draw.rounded_rectangle(HIGHLIGHT_CARD, radius=16, fill='#F8F9FA')
+    draw.rectangle([x0, y0 + 20, x0 + 8, y1 - 20], fill='#2ECC71')
+    draw.rectangle([0, HIGHLIGHT_FOOTER_Y, W, H], fill='#F0F4F8')
+    draw.line([(0, HIGHLIGHT_FOOTER_Y), (W, HIGHLIGHT_FOOTER_Y)], fill='#E0E0E0', width=1)
+    draw.text((30, HIGHLIGHT_FOOTER_Y + 14), SITE_HOST, fill='#666666', font=fonts.get(16))
+    tagline, small = '-- Data updated automatically --', fonts.get(14)
+    tw, _ = fonts.text_size(tagline, small)
+    draw.text(((W - tw) // 2, HIGHLIGHT_FOOTER_Y + 16), tagline, fill='#AAAAAA', font=small)
+    return img
+
+
+def _highlight_text(draw, fields):
+    """fields: {'name', 'category', 'url', 'date'}（行の位置は上の行の高さで決まる）"""
+    name_font, desc_font, plan_font = fonts.get(30, bold=True), fonts.get(20), fonts.get(18)
+    x0, y0, x1, _ = HIGHLIGHT_CARD
+    nw, nh = fonts.text_size(fields['name'], name_font)
+    name_y = y0 + 40
+    draw.text(((W - nw) // 2, name_y), fields['name'], fill='#1A1A2E', font=name_font)
+    div_y = name_y + nh + 25
+    draw.line([(x0 + 40, div_y), (x1 - 40, div_y)], fill='#E0E0E0', width=2)
+
+    category = f"カテゴリ: {fields['category']}"
+    cw, ch = fonts.text_size(category, desc_font)
+    cat_y = div_y + 20
+    draw.text(((W - cw) // 2, cat_y), category, fill='#555555', font=desc_font)
+    uw, uh = fonts.text_size(fields['url'], desc_font)
+    url_y = cat_y + ch + 25
+    draw.text(((W - uw) // 2, url_y), fields['url'], fill='#4A90D9', font=desc_font)
+
+    y = url_y + uh + 35
+    for feature in HIGHLIGHT_FEATURES:
+        text = f'  {feature}'
+        fw, fh = fonts.text_size(text, plan_font)
+        draw.text(((W - fw) // 2, y), text, fill='#1A1A2E', font=plan_font)
+        y += fh + 12
+
+    date_font = fonts.get(14)
+    dw, _ = fonts.text_size(fields['date'], date_font)
+    draw.text((W - dw - 30, HIGHLIGHT_FOOTER_Y + 16), fields['date'], fill='#666666', font=date_font)
+
+
+# 名前: (背景, 文字, 版)。描画を変えたら版を上げる（同じ入力でも描き直させるため）
+LAYOUTS = {
+    'og-tool': (_tool_background, _tool_text, 1),
+    'og-sim': (_sim_background, _sim_text, 1),
+    'sim-ranking': (_ranking_background, _ranking_text, 1),
+    'tool-highlight': (_highlight_background, _highlight_text, 1),
+}
+
+
+@lru_cache(maxsize=None)
+def background(layout):
+    """レイアウトの背景レイヤー（プロセス内で1回だけ描く。使う側はコピーして描き足す）"""
+    return LAYOUTS[layout][0]()
+
+
+def draw(card):
+    """1枚描いて RGB の画像を返す（画像の大きさはレイアウトの背景の大きさ）"""
+    from PIL import ImageDraw
+    img = background(card['layout']).copy()
+    LAYOUTS[card['layout']][1](ImageDraw.Draw(img), card['fields'])
+    return img
+
+
+# ---------------------------------------------------------------------------
+# 書き出し（エンコード）
+# ---------------------------------------------------------------------------
+
+def extra_path(path, fmt):
+    """PNG と並べて書き出す fmt 形式のパス（拡張子だけ替える）"""
+    return os.path.splitext(path)[0] + '.' + fmt
+
+
+def available_formats():
+    """EXTRA_FORMATS のうち、この環境の Pillow で書き出せるもの"""
+    from PIL import features
+    return [fmt for fmt in EXTRA_FORMATS if features.check(fmt)]
+
+
+def encode(img, formats=()):
+    """(PNG のバイト列, 減色・最適化する前の PNG のバイト数, {形式: バイト列}) を返す
+
+    カードは色数の少ない平坦な図なので、PALETTE_COLORS 色のパレットに減色して（誤差拡散なし）
+    optimize 付きで PNG にする。WebP（可逆）はパレット画像から、AVIF は減色前の画像から作る。
+    """
+    from PIL import Image
+    raw = io.BytesIO()
+    img.save(raw, 'PNG')
+    palette = img.quantize(colors=PALETTE_COLORS, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    buf = io.BytesIO()
+    palette.save(buf, 'PNG', optimize=True)
+    extras = {}
+    for fmt in formats:
+        name, source, options = EXTRA_FORMATS[fmt]
+        out = io.BytesIO()
+        (palette if source == 'palette' else img).save(out, name, **options)
+        extras[fmt] = out.getvalue()
+    return buf.getvalue(), len(raw.getvalue()), extras
+
+
+def render(card, formats=()):
+    """1枚描いてエンコードする（encode と同じ戻り値）"""
+    return encode(draw(card), formats)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _render_batch(batch):
+    """(card, 前回ハッシュ, 形式) のリストを描画し、変わったものだけ書き込む（ワーカー側でも動く）"""
+    results = []
+    for card, previous, formats in batch:
+        data, raw_bytes, extras = render(card, formats)
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(BASE_DIR, card['path'])
+        written = digest != previous or not os.path.isfile(path)
+        if written:
+            _write(path, data)
+        for fmt, extra in extras.items():
+            _write(extra_path(path, fmt), extra)
+        results.append({'path': card['path'], 'sha256': digest, 'bytes': len(data), 'written': written,
+                        'raw_bytes': raw_bytes, 'extras': {fmt: len(extra) for fmt, extra in extras.items()}})
+    return results
+
+
+def input_hash(card):
+    """カードの入力（レイアウト名・レイアウトの版・エンコードの版・fields）のハッシュ"""
+    _, _, version = LAYOUTS[card['layout']]
+    data = json.dumps([card['layout'], version, ENCODING_VERSION, card['fields']], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def render_cards(conn, cards, workers=None, formats=()):
+    """cards を描画して結果のリストを cards と同じ順で返す
+
+    結果は {'path', 'sha256', 'bytes', 'written', 'raw_bytes', 'extras'}。描かなかったカードは
+    raw_bytes が None（描いたときは減色・最適化する前の PNG のバイト数）、extras は
+    {形式: バイト数}（formats に渡した 'webp' / 'avif' を PNG と並べて書き出したもの）。
+
+    入力ハッシュ（input_hash）が前回このパスに描いたときと同じで、ファイルも残っていれば描かない。
+    'reuse': True のカード（日付入りのファイル名の SNS 画像など）は、同じ入力で描いた画像が
+    別のパスに残っていればそれを使う（結果の path がそのパスになる）。
+    """
+    known = {path: (inputs, digest, size) for path, inputs, digest, size in conn.execute(
+        'SELECT path, input_sha256, sha256, bytes FROM rendered_cards')}
+    by_input = {}
+    for path, (inputs, digest, size) in known.items():
+        by_input.setdefault(inputs, []).append(path)
+
+    results = [None] * len(cards)
+    jobs = []
+    for i, card in enumerate(cards):
+        inputs = input_hash(card)
+        candidates = [card['path']] + (sorted(by_input.get(inputs, []), reverse=True) if card.get('reuse') else [])
+        for path in candidates:
+            full = os.path.join(BASE_DIR, path)
+            if (known.get(path, (None,))[0] == inputs and os.path.isfile(full)
+                    and all(os.path.isfile(extra_path(full, fmt)) for fmt in formats)):
+                _, digest, size = known[path]
+                results[i] = {'path': path, 'sha256': digest, 'bytes': size, 'written': False,
+                              'raw_bytes': None, 'extras': {}}
+                break
+        else:
+            jobs.append((i, card, known.get(card['path'], (None, None))[1]))
+
+    # 同じレイアウトのカードを同じバッチに寄せる（ワーカーが描く背景の種類を減らす）
+    jobs.sort(key=lambda job: job[1]['layout'])
+    batch_jobs = [(card, previous, tuple(formats)) for _, card, previous in jobs]
+    workers = workers or os.cpu_count() or 1
+    if len(batch_jobs) < PARALLEL_MIN_CARDS or workers < 2:
+        done = _render_batch(batch_jobs)
+    else:
+        size = max(1, len(batch_jobs) // (workers * BATCHES_PER_WORKER))
+        batches = [batch_jobs[i:i + size] for i in range(0, len(batch_jobs), size)]
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            done = [r for batch in pool.map(_render_batch, batches) for r in batch]
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    for (i, card, _), result in zip(jobs, done):
+        results[i] = result
+        rows.append((result['path'], input_hash(card), result['sha256'], result['bytes'], now))
+    with conn:
+        conn.executemany('''INSERT INTO rendered_cards (path, input_sha256, sha256, bytes, rendered_at)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(path) DO UPDATE SET input_sha256 = excluded.input_sha256,
+                                sha256 = excluded.sha256, bytes = excluded.bytes,
+                                rendered_at = excluded.rendered_at''', rows)
+    return results
@@ -0,0 +1,33 @@
+"""パイプライン実行のチェックポイント（daily_run.py --resume 用）
+
+各ステップは完了するたびに pipeline_runs テーブルへ status 付きで記録される
+（common/metrics.py）。この記録をチェックポイントとして使い、
+中断・失敗した run の「成功済みステップ」を求める。
+"""
+from common import metrics
+
+DONE_STATUSES = ('ok', 'skipped')
+
+
+def latest_run_id(conn):
+    metrics.ensure_table(conn)
+    row = conn.execute('SELECT run_id FROM pipeline_runs ORDER BY id DESC LIMIT 1').fetchone()
+    return row[0] if row else None
+
+
+def step_statuses(conn, run_id):
+    """{ステップ名: 最後に記録された status}。再開で同じステップが複数回記録されても最新が勝つ
+
+    run 単位の記録（metrics.RUN_STEP）はステップではないので含めない。
+    """
+    metrics.ensure_table(conn)
+    statuses = {}
+    for step, status in conn.execute(
+            'SELECT step, status FROM pipeline_runs WHERE run_id = ? ORDER BY id', (run_id,)):
+        if step != metrics.RUN_STEP:
+            statuses[step] = status
+    return statuses
+
+
+def completed_steps(conn, run_id):
+    return {step for step, status in step_statuses(conn, run_id).items() if status in DONE_STATUSES}
@@ -0,0 +1,67 @@
+"""money_machine.db への共通接続
+
+どのスクリプトもここから接続を取る。接続ごとに以下を設定する:
+  journal_mode=WAL      読み取りが書き込みをブロックしない（並列ステップ・X投稿と同時実行可）
+  synchronous=NORMAL    WAL ではこれで十分に安全で、コミットごとの fsync が減る
+  cache_size / mmap_size  ページキャッシュとメモリマップ読み込み
+  busy_timeout          ロック中は BUSY_TIMEOUT_MS までリトライ
+  cached_statements     同じ SQL の prepare を使い回す
+
+get_connection() はスレッドごとに1本をキャッシュして返す（プロセス内で再利用し、
+呼び出し側では close しない）。独立した接続が必要なときは connect() を使う。
+"""
+import atexit
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'money_machine.db')
+
+BUSY_TIMEOUT_MS = 10000
+CACHED_STATEMENTS = 256
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),           # 約16MB（負数は KiB 指定）
+    ('mmap_size', 64 * 1024 * 1024),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('temp_store', 'MEMORY'),
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_cached = []
+
+
+def connect(path=DB_PATH):
+    """設定済みの新しい接続を返す（close は呼び出し側の責任）"""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           cached_statements=CACHED_STATEMENTS)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def get_connection(path=DB_PATH):
+    """このスレッド用にキャッシュした接続を返す。プロセス終了時にまとめて閉じる"""
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = connect(path)
+        with _lock:
+            _cached.append(conn)
+    return conn
+
+
+@atexit.register
+def close_all():
+    with _lock:
+        for conn in _cached:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _cached.clear()
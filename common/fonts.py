@@ -0,0 +1,130 @@
+"""SNS画像生成で共有するフォントのレジストリ
+
+- 日本語フォントのパスは候補を1回だけ探し、data/font_paths.json に保存する
+  （次回からはファイルが残っているかを1回確認するだけ）
+- 読み込んだ FreeTypeFont を (パス, サイズ) ごとにプロセス内で使い回す（load / get）
+- 文字列の描画サイズを (フォント, 文字列) ごとに上限付き LRU で覚える（text_size）
+
+同じプロセスで何枚描いてもフォントの読み込みは1回で、事業者名や価格など
+繰り返し出てくる文字列の計測はキャッシュから返る。
+Pillow は関数の中で import する（Pillow が無くても import だけはできるように）。
+"""
+import json
+import os
+import threading
+from functools import lru_cache
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PATHS_FILE = os.path.join(BASE_DIR, 'data', 'font_paths.json')
+TEXT_CACHE_SIZE = 4096
+
+REGULAR_CANDIDATES = [
+    # Windows
+    "C:/Windows/Fonts/meiryo.ttc",
+    "C:/Windows/Fonts/msgothic.ttc",
+    "C:/Windows/Fonts/YuGothR.ttc",
+    "C:/Windows/Fonts/YuGothM.ttc",
+    "C:/Windows/Fonts/yugothic.ttf",
+    # Mac
+    "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
+    "/System/Library/Fonts/Hiragino Sans GB.ttc",
+    "/Library/Fonts/Arial Unicode.ttf",
+    # Linux
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/OTF/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "/usr/share/fonts/ipa-gothic/ipag.ttf",
+    "/usr/share/fonts/truetype/ipafont-gothic/ipag.ttf",
+]
+
+BOLD_CANDIDATES = [
+    "C:/Windows/Fonts/meiryob.ttc",
+    "C:/Windows/Fonts/YuGothB.ttc",
+    "/System/Library/Fonts/ヒラギノ角ゴシック W6.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/OTF/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Bold.ttc",
+]
+
+_lock = threading.Lock()
+_paths = None
+
+
+def _probe(candidates):
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _resolve():
+    """{'regular': パス or None, 'bold': パス or None}（保存済みの値が使えなければ探し直す）"""
+    try:
+        with open(PATHS_FILE, encoding='utf-8') as f:
+            saved = json.load(f)
+        if all(path is None or os.path.isfile(path) for path in saved.values()) and saved.get('regular'):
+            return saved
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    regular = _probe(REGULAR_CANDIDATES)
+    paths = {'regular': regular, 'bold': _probe(BOLD_CANDIDATES) or regular}
+    if regular:
+        os.makedirs(os.path.dirname(PATHS_FILE), exist_ok=True)
+        tmp = PATHS_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(paths, f, ensure_ascii=False)
+        os.replace(tmp, PATHS_FILE)
+    return paths
+
+
+def font_path(bold=False):
+    """日本語フォントのパス（見つからなければ None）"""
+    global _paths
+    with _lock:
+        if _paths is None:
+            _paths = _resolve()
+        return _paths['bold' if bold else 'regular']
+
+
+@lru_cache(maxsize=None)
+def load(path, size):
+    """path のフォントを size で読み込む（同じ組み合わせは2回目からキャッシュ）"""
+    from PIL import ImageFont
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=None)
+def default(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:  # Pillow 10.1 より前はサイズを指定できない
+        return ImageFont.load_default()
+
+
+def get(size, bold=False):
+    """日本語フォントを size で返す（日本語フォントが無ければ Pillow の既定フォント）"""
+    path = font_path(bold)
+    return load(path, size) if path else default(size)
+
+
+@lru_cache(maxsize=1)
+def _measure():
+    from PIL import Image, ImageDraw
+    return ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_bbox(text, font):
+    """draw.textbbox((0, 0), text, font=font) と同じ値（フォントは load / get で得た同一オブジェクトを渡す）"""
+    return _measure().textbbox((0, 0), text, font=font)
+
+
+def text_size(text, font):
+    """(幅, 高さ)"""
+    left, top, right, bottom = text_bbox(text, font)
+    return right - left, bottom - top
@@ -0,0 +1,113 @@
+"""アフィリエイトリンクの逆引きインデックス（data/affiliate_index.json）
+
+inject_affiliate_links.py が注入のたびに作り直す。注入時の config の全URLと、キーごとに
+そのURLが入っている href の位置（ファイル・バイトオフセット・長さ）を持つ:
+
+  {"urls": {"sbi_securities": "https://...", ...},
+   "keys": {"sbi_securities": {"output/tools/nisa-simulator/index.html": [[12345, 26]]}}}
+
+--changed モードは config と比べてURLが変わったキーだけを取り出し、そのキーの
+入っているファイルだけを開いて該当箇所を書き換える（patch_file）。オフセットは目安で、
+縮小など後段の書き換えでずれていたら、そのファイルだけ data-aff の目印から探し直す。
+"""
+import html
+import json
+import os
+import re
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+INDEX_PATH = os.path.join(BASE_DIR, 'data', 'affiliate_index.json')
+
+_TAG_RE = re.compile(rb'<a\b[^>]*>', re.I)
+_AFF_RE = re.compile(rb'\bdata-aff="([^"]*)"')
+_HREF_RE = re.compile(rb'\bhref="([^"]*)"')
+
+
+def locate(data):
+    """HTML（bytes）中の data-aff 付きアンカーについて {キー: [[href値のオフセット, 長さ], ...]} を返す"""
+    found = {}
+    for tag in _TAG_RE.finditer(data):
+        aff = _AFF_RE.search(tag.group(0))
+        href = _HREF_RE.search(tag.group(0))
+        if aff and href:
+            key = aff.group(1).decode('utf-8')
+            start = tag.start() + href.start(1)
+            found.setdefault(key, []).append([start, href.end(1) - href.start(1)])
+    return found
+
+
+def relpath(path):
+    return os.path.relpath(path, BASE_DIR).replace(os.sep, '/')
+
+
+def load(path=INDEX_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build(pages, urls):
+    """pages: {ファイルパス: 最終的な内容(bytes)} からインデックスを作る"""
+    keys = {}
+    for path, data in sorted(pages.items()):
+        for key, spots in locate(data).items():
+            keys.setdefault(key, {})[relpath(path)] = spots
+    return {'urls': dict(urls), 'keys': keys}
+
+
+def update_file(index, path, data):
+    """1ファイル分の位置を入れ替える（--changed で書き換えたファイル用）"""
+    rel = relpath(path)
+    for locations in index['keys'].values():
+        locations.pop(rel, None)
+    for key, spots in locate(data).items():
+        index['keys'].setdefault(key, {})[rel] = spots
+
+
+def save(index, path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def changed_keys(index, urls):
+    """インデックスを作ったときからURLが変わったキー -> (旧URL, 新URL)"""
+    old = index['urls']
+    return {key: (old.get(key, ''), urls.get(key, ''))
+            for key in set(old) | set(urls) if old.get(key, '') != urls.get(key, '')}
+
+
+def patch_file(path, spots_by_key, changes):
+    """changes（キー -> (旧URL, 新URL)）のURLだけを書き換えた内容(bytes)を返す（変更なしなら None）
+
+    記録したオフセットにその時点の旧URLがそのまま残っていればそこを置き換え、
+    ずれていれば（後段でファイルが書き換えられた）このファイルを data-aff で探し直す。
+    新URLが空のキーは書き換えない（href="#" に戻すことはしない）。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    wanted = {key: change for key, change in changes.items() if key in spots_by_key and change[1]}
+    if not wanted:
+        return None
+
+    edits = []
+    spots_ok = all(data[start:start + length] == html.escape(wanted[key][0]).encode('utf-8')
+                   for key in wanted for start, length in spots_by_key[key])
+    current = spots_by_key if spots_ok else locate(data)
+    for key, (old, new) in wanted.items():
+        for start, length in current.get(key, []):
+            edits.append((start, length, html.escape(new).encode('utf-8')))
+    if not edits:
+        return None
+
+    parts, last = [], 0
+    for start, length, value in sorted(edits):
+        parts.append(data[last:start])
+        parts.append(value)
+        last = start + length
+    parts.append(data[last:])
+    return b''.join(parts)
@@ -0,0 +1,188 @@
+"""アフィリエイトリンクの置換ルール（config/link_rules.json）と適用処理
+
+inject_affiliate_links.py と apply_official_urls.py が共通で使う。
+
+ルールは「ツール（slug）・リンク名（match）・config/affiliate_links.json のキー（key）」の組。
+リンク名の近くにあるアンカーを1回の走査で探し（common/ahocorasick.py）、href を設定URLにして
+data-aff="<key>" の目印を付ける。目印の付いたアンカーは次回から探索せず目印で直接引くので、
+再実行は URL が変わったアンカーだけを書き換える（変化が無ければファイルに触らない）。
+
+ルールファイルは読み込み結果とオートマトンを更新時刻ごとにキャッシュする（load）。
+"""
+import html
+import json
+import os
+import re
+import threading
+from bisect import bisect_left
+
+from common.ahocorasick import get_automaton
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RULES_PATH = os.path.join(BASE_DIR, 'config', 'link_rules.json')
+
+LINK_WINDOW = 500  # リンク名とアンカーの距離の上限（文字数）
+PLACEHOLDER_HREF = '#'
+
+_ANCHOR_RE = re.compile(r'<a\b[^>]*>|</a>', re.I)
+_ATTR_RE = '\\b{}="([^"]*)"'
+
+_lock = threading.Lock()
+_cache = {}
+
+
+class LinkRules:
+    def __init__(self, data):
+        self.tools = {slug: [(rule['match'], rule['key']) for rule in rules]
+                      for slug, rules in data.get('tools', {}).items()}
+        self.sim_providers = dict(data.get('sim_providers', {}))
+        self.automaton = get_automaton(match for rules in self.tools.values() for match, _ in rules)
+
+    def keys(self):
+        return ({key for rules in self.tools.values() for _, key in rules}
+                | set(self.sim_providers.values()))
+
+
+def load(path=RULES_PATH):
+    """ルールファイルを読み込む（更新時刻が同じならキャッシュを返す）"""
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding='utf-8') as f:
+            rules = LinkRules(json.load(f))
+        _cache[path] = (mtime, rules)
+        return rules
+
+
+def get_attr(tag, name):
+    m = re.search(_ATTR_RE.format(re.escape(name)), tag)
+    return html.unescape(m.group(1)) if m else None
+
+
+def set_attrs(tag, attrs):
+    """<a ...> タグの属性を (名前, 値) の順に設定する（既存は値だけ置き換え、無ければ末尾に足す）"""
+    for name, value in attrs:
+        attr = f'{name}="{html.escape(value)}"'
+        pattern = re.compile(_ATTR_RE.format(re.escape(name)))
+        if pattern.search(tag):
+            tag = pattern.sub(lambda _: attr, tag, count=1)
+        else:
+            tag = tag[:-1].rstrip() + f' {attr}>'
+    return tag
+
+
+def _scan(content, automaton):
+    """リンク名の出現位置と、アンカーの開始タグ・終了タグを文書順に集める"""
+    found = {}
+    for start, end, pattern in automaton.finditer(content):
+        found.setdefault(pattern, []).append((start, end))
+    marks = []  # (開始, 終了, タグ or None)。None は </a>
+    for m in _ANCHOR_RE.finditer(content):
+        tag = m.group(0)
+        marks.append((m.start(), m.end(), None if tag.lower() == '</a>' else tag))
+    return found, marks
+
+
+def _find_anchor(occurrences, marks, usable):
+    """リンク名の出現位置から対象アンカー（marks の添字）を決める
+
+    1. リンク名の後ろ LINK_WINDOW 文字以内で、</a> を挟まずに現れる最初の使えるアンカー
+       （カード見出しの下にあるボタン）
+    2. 無ければリンク名の前 LINK_WINDOW 文字以内で、</a> を挟まない直近の使えるアンカー
+       （リンク文字列そのものにリンク名が入っているアンカー）
+    """
+    starts = [start for start, _, _ in marks]
+    for start, end in occurrences:
+        i = bisect_left(starts, end)
+        while i < len(marks) and marks[i][0] - end <= LINK_WINDOW:
+            if marks[i][2] is None:
+                break
+            if usable(i):
+                return i
+            i += 1
+    for start, end in occurrences:
+        i = bisect_left(starts, start) - 1
+        while i >= 0 and start - marks[i][1] <= LINK_WINDOW:
+            if marks[i][2] is None:
+                break
+            if usable(i):
+                return i
+            i -= 1
+    return None
+
+
+def apply_rules(content, rules, urls, automaton):
+    """1ページ分のルールを適用し (新しい内容, [(match, key, 結果)]) を返す
+
+    結果は 'changed'（URLを書き換えた）/ 'marked'（URLは同じで目印だけ付けた）/
+    'unchanged' / 'missing'（アンカーが見つからない）/ 'no_url'（設定にURLが無い）。
+    対象にできるアンカーは、目印が無く href が "#" か設定にあるいずれかのURLのもの
+    （以前のスクリプトが別の案件のURLを入れてしまったアンカーもここで直る）。
+    """
+    found, marks = _scan(content, automaton)
+    tags = {i: tag for i, (_, _, tag) in enumerate(marks) if tag is not None}
+    by_key = {}
+    for i, tag in tags.items():
+        key = get_attr(tag, 'data-aff')
+        if key:
+            by_key.setdefault(key, []).append(i)
+
+    known = {PLACEHOLDER_HREF} | set(urls.values())
+    claimed = set()
+    replaced = {}
+    results = []
+    for match, key in rules:
+        url = urls.get(key)
+        if not url:
+            results.append((match, key, 'no_url'))
+            continue
+        targets = by_key.get(key)
+        if not targets:
+            def usable(i):
+                tag = tags[i]
+                return (i not in claimed and get_attr(tag, 'data-aff') is None
+                        and get_attr(tag, 'href') in known)
+            i = _find_anchor(found.get(match, []), marks, usable)
+            if i is None:
+                results.append((match, key, 'missing'))
+                continue
+            targets = [i]
+        status = 'unchanged'
+        for i in targets:
+            claimed.add(i)
+            old = replaced.get(i, tags[i])
+            new = set_attrs(old, [('href', url), ('data-aff', key)])
+            if new != old:
+                replaced[i] = new
+                status = 'changed' if get_attr(old, 'href') != url else 'marked'
+        results.append((match, key, status))
+
+    if not replaced:
+        return content, results
+    parts, last = [], 0
+    for i in sorted(replaced):
+        start, end, _ = marks[i]
+        parts.append(content[last:start])
+        parts.append(replaced[i])
+        last = end
+    parts.append(content[last:])
+    return ''.join(parts), results
+
+
+def rewrite_file(path, func, dry_run=False):
+    """func(content) -> (new_content, 結果) をファイルに適用し、内容が変わったときだけ書き込む
+
+    (書き込んだか, 結果, 適用後の内容) を返す。
+    """
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    new, result = func(content)
+    written = new != content
+    if written and not dry_run:
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(new)
+        os.replace(tmp, path)
+    return written, result, new
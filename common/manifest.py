@@ -0,0 +1,170 @@
+"""ビルドマニフェスト（output/tools/ 以下の生成物の一覧）
+
+output/tools/ にファイルを書くスクリプトは、書いた内容をここに記録する
+（write_page で書き込みと記録をまとめて行うか、書いた内容を record に渡す）。
+build_manifest テーブルにパス・スラッグ・サイズ・内容ハッシュ・更新時刻と、
+最後にデプロイしたときのハッシュを持つ:
+
+  sha256 IS NULL                  削除済み（デプロイで削除を反映したら行ごと消える）
+  sha256 IS NOT deployed_sha256   未デプロイの変更がある（pending）
+
+tools.file_path / deploy_status はマニフェストから同期する（sync_tools）:
+  output/tools/<slug>/index.html が無い      not_started
+  あるが未デプロイの変更がある              built
+  デプロイ済みの内容と同じ                  deployed
+
+どのツールが公開されているか・何をデプロイするかはツリーを走査せずにこのテーブルで引ける。
+既存の出力は migrations の初回適用時に scan で一度だけ取り込む。
+"""
+import contextlib
+import hashlib
+import os
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ROOT = 'output/tools/'
+
+
+def ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS build_manifest (
+        path TEXT PRIMARY KEY,
+        slug TEXT,
+        bytes INTEGER,
+        sha256 TEXT,
+        built_at DATETIME,
+        deployed_sha256 TEXT,
+        deployed_at DATETIME
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_build_manifest_slug ON build_manifest (slug)')
+
+
+def relpath(path):
+    if os.path.isabs(path):
+        path = os.path.relpath(path, BASE_DIR)
+    return path.replace(os.sep, '/')
+
+
+def slug_for(rel):
+    """output/tools/<slug>/... の <slug>（output/tools/ 直下のファイルは None）"""
+    if not rel.startswith(ROOT):
+        return None
+    parts = rel[len(ROOT):].split('/')
+    return parts[0] if len(parts) > 1 else None
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _transaction(conn, commit):
+    """commit=False なら呼び出し側のトランザクションの中で書く（マイグレーションから呼ぶとき）"""
+    return conn if commit else contextlib.nullcontext()
+
+
+def record(conn, pages, commit=True):
+    """pages: {パス: 書き込んだ内容(bytes / str)} を記録し、内容が変わった件数を返す"""
+    entries = []
+    for path, data in pages.items():
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        entries.append((path, len(data), hashlib.sha256(data).hexdigest()))
+    return record_digests(conn, entries, commit)
+
+
+def record_digests(conn, entries, commit=True):
+    """ハッシュ計算済みの [(パス, バイト数, sha256)] を記録する（別プロセスで描画したページ用）"""
+    ensure_table(conn)
+    previous = dict(conn.execute('SELECT path, sha256 FROM build_manifest'))
+    now = _now()
+    rows = [(rel, slug_for(rel), size, digest, now)
+            for rel, size, digest in ((relpath(path), size, digest) for path, size, digest in entries)
+            if previous.get(rel) != digest]
+    if rows:
+        with _transaction(conn, commit):
+            conn.executemany('''INSERT INTO build_manifest (path, slug, bytes, sha256, built_at)
+                                VALUES (?, ?, ?, ?, ?)
+                                ON CONFLICT(path) DO UPDATE SET bytes = excluded.bytes,
+                                    sha256 = excluded.sha256, built_at = excluded.built_at''', rows)
+        sync_tools(conn, {slug for _, slug, _, _, _ in rows if slug}, commit)
+    return len(rows)
+
+
+def write_page(conn, path, data):
+    """ファイルを書き込み（一時ファイル経由で置き換え）、マニフェストに記録する"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    record(conn, {path: data})
+
+
+def remove(conn, paths):
+    """削除したファイルを記録する（デプロイで削除を反映するまで行は残る）"""
+    ensure_table(conn)
+    rels = [relpath(path) for path in paths]
+    if not rels:
+        return
+    with conn:
+        conn.executemany('UPDATE build_manifest SET sha256 = NULL, bytes = NULL, built_at = ? WHERE path = ?',
+                         [(_now(), rel) for rel in rels])
+    sync_tools(conn, {slug_for(rel) for rel in rels if slug_for(rel)})
+
+
+def paths(conn, pattern=ROOT + '%'):
+    """記録されている（削除済みでない）パスのうち LIKE パターンに合うものの集合"""
+    ensure_table(conn)
+    return {path for path, in conn.execute(
+        'SELECT path FROM build_manifest WHERE sha256 IS NOT NULL AND path LIKE ?', (pattern,))}
+
+
+def scan(conn, root=ROOT, commit=True):
+    """ツリーを走査して全ファイルを記録する（マニフェスト導入時の取り込み用）"""
+    pages = {}
+    for dirpath, _, files in os.walk(os.path.join(BASE_DIR, root)):
+        for name in files:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                pages[path] = f.read()
+    return record(conn, pages, commit)
+
+
+def pending(conn):
+    """未デプロイの変更 [(パス, 削除か)]"""
+    ensure_table(conn)
+    return [(path, sha is None) for path, sha in conn.execute(
+        'SELECT path, sha256 FROM build_manifest WHERE sha256 IS NOT deployed_sha256 ORDER BY path')]
+
+
+def mark_deployed(conn, rels):
+    """デプロイしたパスを記録する（削除済みの行は消す）"""
+    ensure_table(conn)
+    now = _now()
+    with conn:
+        conn.executemany('DELETE FROM build_manifest WHERE path = ? AND sha256 IS NULL', [(rel,) for rel in rels])
+        conn.executemany('UPDATE build_manifest SET deployed_sha256 = sha256, deployed_at = ? WHERE path = ?',
+                         [(now, rel) for rel in rels])
+    sync_tools(conn, {slug_for(rel) for rel in rels if slug_for(rel)})
+
+
+def sync_tools(conn, slugs=None, commit=True):
+    """tools.file_path / deploy_status をマニフェストに合わせる（slugs を省略すると全ツール）"""
+    rows = conn.execute('''SELECT t.slug, t.file_path, t.deploy_status, m.path, m.sha256, m.deployed_sha256
+                           FROM tools t LEFT JOIN build_manifest m
+                             ON m.path = 'output/tools/' || t.slug || '/index.html' AND m.sha256 IS NOT NULL''')
+    updates = []
+    for slug, file_path, status, path, sha, deployed in rows:
+        if slugs is not None and slug not in slugs:
+            continue
+        new_status = 'not_started' if path is None else 'deployed' if sha == deployed else 'built'
+        if (file_path, status) != (path, new_status):
+            updates.append((path, new_status, slug))
+    if updates:
+        with _transaction(conn, commit):
+            conn.executemany('''UPDATE tools SET file_path = ?, deploy_status = ?, updated_at = CURRENT_TIMESTAMP
+                                WHERE slug = ?''', updates)
+    return len(updates)
@@ -0,0 +1,312 @@
+"""パイプラインのステップ別メトリクス計測
+
+in-process 実行中のステップについて以下を記録する:
+  wall_s / cpu_s           経過時間 / そのスレッドが使ったCPU時間
+  peak_rss_kb              ステップ単位では記録しない（None）。下記の run 単位の記録だけに入れる
+  bytes_read / written     ステップのスレッドが read / write したバイト数（io_counters）
+  rows_read / written      StepContext.db 経由で取得した行数 / total_changes の増分
+  files_touched            ステップが open したプロジェクト内ファイル（.py を除く）
+
+bytes_read / written は実際の I/O 量（ファイル・SQLite・ソケットの read / write）。
+Linux では /proc/thread-self/io のスレッド単位の値で、ステップが自分で起動したスレッドプール・
+プロセスプール（ページ・カードの並列描画など）の分と、mmap 経由の読み込みは入らない。
+それ以外の OS では psutil があればプロセス全体の値（並列実行中の他のステップの分も入るので、
+正確に見るなら --jobs 1）、どちらも無ければ None。
+
+最大RSS（ru_maxrss）はプロセス全体の最高水位で、どのステップが押し上げたのかは分からない。
+そのため DAG の後に step = RUN_STEP の run 単位の記録（run_record）を1件書き、そこにだけ入れる。
+
+記録は logs/pipeline_metrics.jsonl と pipeline_runs テーブルの両方に書く。
+サブプロセス実行時は wall_s のみ（他の項目は None）。
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+METRICS_PATH = os.path.join(BASE_DIR, 'logs', 'pipeline_metrics.jsonl')
+RUN_STEP = 'Pipeline run'  # run 単位の記録（全体の wall_s と最大RSS）の step 名
+
+_local = threading.local()
+_hook_installed = False
+_hook_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS pipeline_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT,
+        step TEXT,
+        status TEXT,
+        started_at DATETIME,
+        wall_s REAL,
+        cpu_s REAL,
+        peak_rss_kb INTEGER,
+        bytes_read INTEGER,
+        bytes_written INTEGER,
+        rows_read INTEGER,
+        rows_written INTEGER,
+        files_touched INTEGER
+    )''')
+
+
+class CountingConnection:
+    """sqlite3.Connection の代理。カーソルから取得した行数を rows_read に数える"""
+
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, 'rows_read', 0)
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self, self._conn.cursor(*args, **kwargs))
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name == 'rows_read':
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+
+class _CountingCursor:
+    def __init__(self, owner, cursor):
+        object.__setattr__(self, '_owner', owner)
+        object.__setattr__(self, '_cursor', cursor)
+
+    def execute(self, *args):
+        self._cursor.execute(*args)
+        return self
+
+    def executemany(self, *args):
+        self._cursor.executemany(*args)
+        return self
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._owner.rows_read += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._owner.rows_read += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._owner.rows_read += len(rows)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._cursor)
+        self._owner.rows_read += 1
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+def _audit(event, args):
+    if event != 'open':
+        return
+    files = getattr(_local, 'files', None)
+    if files is None:
+        return
+    path, mode, flags = args
+    if not isinstance(path, (str, bytes, os.PathLike)):
+        return
+    path = os.path.abspath(os.fsdecode(path))
+    if not path.startswith(BASE_DIR + os.sep) or path.endswith(('.py', '.pyc')):
+        return
+    if mode is None:
+        write = bool(flags & (os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT))
+    else:
+        write = any(ch in mode for ch in 'wax+')
+    files[path] = files.get(path, False) or write
+
+
+def _install_hook():
+    global _hook_installed
+    with _hook_lock:
+        if not _hook_installed:
+            sys.addaudithook(_audit)
+            _hook_installed = True
+
+
+def io_counters():
+    """(読んだバイト数, 書いたバイト数) の累計。取得できない環境では None
+
+    Linux は呼び出したスレッドの値、それ以外は psutil があればプロセス全体の値。
+    """
+    try:
+        with open('/proc/thread-self/io', 'rb') as f:
+            fields = dict(line.split(b':', 1) for line in f.read().splitlines() if b':' in line)
+        return int(fields[b'rchar']), int(fields[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        counters = psutil.Process().io_counters()
+    except Exception:
+        return None
+    return counters.read_bytes, counters.write_bytes
+
+
+def peak_rss_kb():
+    """プロセスの最大RSS（KB）。取得できない環境では None
+
+    子プロセス（--subprocess のステップ）があれば、その中で最大のものと比べて大きい方。
+    """
+    try:
+        import resource
+    except ImportError:
+        return _peak_rss_kb_windows()
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _peak_rss_kb_windows():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize // 1024
+    except Exception:
+        pass
+    return None
+
+
+class StepRecorder:
+    """1ステップ分の計測。with ブロック内（同じスレッド）の処理を計測する
+
+    rec = StepRecorder(run_id, name, conn)
+    with rec:
+        entry(ctx)
+    rec.record['wall_s'] ...
+    """
+
+    def __init__(self, run_id, step, conn=None):
+        self.conn = conn
+        self.record = {
+            'run_id': run_id,
+            'step': step,
+            'status': None,
+            'started_at': None,
+            'wall_s': None,
+            'cpu_s': None,
+            'peak_rss_kb': None,
+            'bytes_read': None,
+            'bytes_written': None,
+            'rows_read': None,
+            'rows_written': None,
+            'files_touched': None,
+        }
+
+    def __enter__(self):
+        _install_hook()
+        self.record['started_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._files = {}
+        _local.files = self._files
+        if self.conn is not None:
+            self._rows_read = self.conn.rows_read
+            self._changes = self.conn.total_changes
+        self._io = io_counters()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        r = self.record
+        r['wall_s'] = round(time.perf_counter() - self._wall, 4)
+        r['cpu_s'] = round(time.thread_time() - self._cpu, 4)
+        _local.files = None
+        if self.conn is not None:
+            r['rows_read'] = self.conn.rows_read - self._rows_read
+            r['rows_written'] = self.conn.total_changes - self._changes
+        io = io_counters()
+        if self._io is not None and io is not None:
+            r['bytes_read'], r['bytes_written'] = io[0] - self._io[0], io[1] - self._io[1]
+        r['files_touched'] = len(self._files)
+        r['files'] = sorted(os.path.relpath(p, BASE_DIR) for p in self._files)
+        return False
+
+
+def run_record(run_id, status, started_at, wall_s):
+    """run 全体の記録（step = RUN_STEP）。peak_rss_kb はここにだけ入れる"""
+    record = StepRecorder(run_id, RUN_STEP).record
+    record.update(status=status, started_at=started_at, wall_s=round(wall_s, 4), peak_rss_kb=peak_rss_kb())
+    return record
+
+
+def write(conn, records):
+    """メトリクスを JSONL と pipeline_runs テーブルに追記する（ワーカースレッドから呼んでよい）"""
+    os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+    with _write_lock, open(METRICS_PATH, 'a', encoding='utf-8') as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + '\n')
+
+    ensure_table(conn)
+    conn.executemany('''INSERT INTO pipeline_runs
+        (run_id, step, status, started_at, wall_s, cpu_s, peak_rss_kb,
+         bytes_read, bytes_written, rows_read, rows_written, files_touched)
+        VALUES (:run_id, :step, :status, :started_at, :wall_s, :cpu_s, :peak_rss_kb,
+                :bytes_read, :bytes_written, :rows_read, :rows_written, :files_touched)''',
+                     records)
+    conn.commit()
+
+
+def recent_runs(conn, limit):
+    """直近 limit 回の run_id について {step: [record, ...]}（新しい順）を返す"""
+    ensure_table(conn)
+    run_ids = [row[0] for row in conn.execute(
+        'SELECT run_id FROM pipeline_runs GROUP BY run_id ORDER BY MAX(id) DESC LIMIT ?', (limit,))]
+    if not run_ids:
+        return {}
+    placeholders = ','.join('?' * len(run_ids))
+    cur = conn.execute(f'''SELECT run_id, step, status, wall_s, cpu_s, peak_rss_kb, bytes_read,
+                                  bytes_written, rows_read, rows_written, files_touched
+                           FROM pipeline_runs WHERE run_id IN ({placeholders})
+                           ORDER BY id DESC''', run_ids)
+    columns = [d[0] for d in cur.description]
+    by_step = {}
+    for row in cur.fetchall():
+        rec = dict(zip(columns, row))
+        by_step.setdefault(rec['step'], []).append(rec)
+    return by_step
@@ -0,0 +1,120 @@
+"""DBスキーマのバージョン管理
+
+schema_version テーブルに適用済みのバージョンを記録し、MIGRATIONS を番号順に
+未適用のものだけ実行する。既存のDBもその場でアップグレードでき、作り直しは不要。
+
+マイグレーションを追加するときは MIGRATIONS の末尾に (番号, 名前, 関数) を足す。
+適用済みの番号・関数は後から変更しないこと。
+1つのマイグレーションは1トランザクションで適用する（途中で失敗したら丸ごと戻る）。
+関数の中では commit しないこと（manifest の関数は commit=False で呼ぶ）。
+"""
+from datetime import datetime
+
+from common import manifest
+
+
+def ensure_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at DATETIME
+    )''')
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_last_seen_at(conn):
+    if 'last_seen_at' not in _columns(conn, 'comparison_data'):
+        conn.execute('ALTER TABLE comparison_data ADD COLUMN last_seen_at DATETIME')
+
+
+def _index_current_plans(conn):
+    # comparison_generator.generate() / fetch_sim_ranking() / 画像生成の上位5件用。
+    # is_current = 1 の行だけの部分インデックスなので、履歴行が増えても大きくならない。
+    # WHERE と SELECT で使う列を全て含めてテーブル本体を読まずに済ませる（covering index）。
+    # is_current も列に入れないと SQLite は covering と判定しない。
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_comparison_current_price
+                    ON comparison_data (category, is_current, price, provider, plan_name,
+                                        data_gb, data_json)
+                    WHERE is_current = 1''')
+
+
+def _index_tools_by_category(conn):
+    # generate_site_index.get_deployed_tools() の ORDER BY category, name 用
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tools_category_name ON tools (category, name, slug)')
+
+
+def _index_current_plans_all_categories(conn):
+    # comparison_generator は全カテゴリの現行プランを1回で読み、データ更新日に scraped_at も使う
+    conn.execute('DROP INDEX IF EXISTS idx_comparison_current_price')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_comparison_current
+                    ON comparison_data (category, is_current, price, provider, plan_name,
+                                        data_gb, data_json, scraped_at)
+                    WHERE is_current = 1''')
+
+
+def _create_build_manifest(conn):
+    # 既にある出力を取り込み、tools.file_path / deploy_status をそれに合わせる
+    manifest.ensure_table(conn)
+    manifest.scan(conn, commit=False)
+    manifest.sync_tools(conn, commit=False)
+
+
+def _create_rendered_pages(conn):
+    # common/pages.py: テンプレートから描いたページの前回の内容ハッシュ（同じなら書き込まない）
+    conn.execute('''CREATE TABLE IF NOT EXISTS rendered_pages (
+        path TEXT PRIMARY KEY,
+        sha256 TEXT,
+        rendered_at DATETIME
+    )''')
+
+
+def _create_rendered_cards(conn):
+    # common/cards.py: カード画像の入力ハッシュと描いた画像（入力が同じなら描かない・使い回す）
+    conn.execute('''CREATE TABLE IF NOT EXISTS rendered_cards (
+        path TEXT PRIMARY KEY,
+        input_sha256 TEXT,
+        sha256 TEXT,
+        bytes INTEGER,
+        rendered_at DATETIME
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rendered_cards_input ON rendered_cards (input_sha256)')
+
+
+MIGRATIONS = [
+    (1, 'comparison_data.last_seen_at', _add_last_seen_at),
+    (2, 'index comparison_data current plans by price', _index_current_plans),
+    (3, 'index tools by category, name', _index_tools_by_category),
+    (4, 'index comparison_data current plans with scraped_at', _index_current_plans_all_categories),
+    (5, 'build_manifest', _create_build_manifest),
+    (6, 'rendered_pages', _create_rendered_pages),
+    (7, 'rendered_cards', _create_rendered_cards),
+]
+
+
+def current_version(conn):
+    ensure_table(conn)
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def migrate(conn):
+    """未適用のマイグレーションを順に適用し、適用した (番号, 名前) のリストを返す"""
+    version = current_version(conn)
+    applied = []
+    for number, name, func in MIGRATIONS:
+        if number <= version:
+            continue
+        with conn:
+            # DDL も含めて1トランザクションにする（sqlite3 は DML の前にしか BEGIN しない）
+            if not conn.in_transaction:
+                conn.execute('BEGIN')
+            func(conn)
+            conn.execute('INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                         (number, name, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        applied.append((number, name))
+    if applied:
+        conn.execute('ANALYZE')
+        conn.commit()
+    return applied
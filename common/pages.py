@@ -0,0 +1,84 @@
+"""テンプレートから多数の静的ページをまとめて書き出す
+
+ページは {'path': 出力先(BASE_DIR 相対), 'template': テンプレート名, 'context': 変数} の dict。
+前回描画した内容のハッシュを rendered_pages テーブル（common/migrations.py で作る）に持ち、
+描画結果が同じページはファイルに触らない（アフィリエイトリンク注入など後段で書き換えた内容も
+そのまま残る）。
+書き込んだページと削除したページはビルドマニフェスト（common/manifest.py）に記録する。
+
+ページ数が PARALLEL_MIN_PAGES 以上ならワーカープロセスに分けて描画する。
+ワーカーは spawn で起動するので、context は pickle できる値（dict / list / str / 数値）にすること。
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from common import manifest, templating
+
+BASE_DIR = templating.BASE_DIR
+PARALLEL_MIN_PAGES = 200
+BATCHES_PER_WORKER = 4
+
+
+def _render_batch(batch):
+    """(page, 前回ハッシュ) のリストを描画し、変わったものだけ書き込む（ワーカー側でも動く）"""
+    results = []
+    for page, previous in batch:
+        chunks = templating.get(page['template']).render_chunks(page['context'])
+        data = ''.join(chunks).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(BASE_DIR, page['path'])
+        written = digest != previous or not os.path.isfile(path)
+        if written:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        results.append({'path': page['path'], 'sha256': digest, 'bytes': len(data), 'written': written})
+    return results
+
+
+def render_pages(conn, pages, prune_prefix=None, workers=None):
+    """pages を描画して結果のリストを返す
+
+    prune_prefix（例: 'output/tools/sim-comparison/'）を渡すと、その下で前回は描画したが
+    今回の pages に無いページ（退役した事業者など）のファイルを削除する。
+    """
+    previous = dict(conn.execute('SELECT path, sha256 FROM rendered_pages'))
+    jobs = [(page, previous.get(page['path'])) for page in pages]
+
+    workers = workers or os.cpu_count() or 1
+    if len(jobs) < PARALLEL_MIN_PAGES or workers < 2:
+        results = _render_batch(jobs)
+    else:
+        size = max(1, len(jobs) // (workers * BATCHES_PER_WORKER))
+        batches = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            results = [r for batch in pool.map(_render_batch, batches) for r in batch]
+
+    removed = []
+    if prune_prefix:
+        current = {page['path'] for page in pages}
+        for path in previous:
+            if path.startswith(prune_prefix) and path not in current:
+                full = os.path.join(BASE_DIR, path)
+                if os.path.isfile(full):
+                    os.remove(full)
+                    try:
+                        os.removedirs(os.path.dirname(full))  # 空になったディレクトリだけ消える
+                    except OSError:
+                        pass
+                removed.append((path,))
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with conn:
+        conn.executemany('''INSERT INTO rendered_pages (path, sha256, rendered_at) VALUES (?, ?, ?)
+                            ON CONFLICT(path) DO UPDATE SET sha256 = excluded.sha256,
+                                                            rendered_at = excluded.rendered_at''',
+                         [(r['path'], r['sha256'], now) for r in results if r['written']])
+        conn.executemany('DELETE FROM rendered_pages WHERE path = ?', removed)
+    manifest.record_digests(conn, [(r['path'], r['bytes'], r['sha256']) for r in results if r['written']])
+    manifest.remove(conn, [path for path, in removed])
+    return results, [path for path, in removed]
@@ -0,0 +1,129 @@
+"""関連ツールのグラフを tools テーブルとページ本文から計算する
+
+各ツールの文書（名前・カテゴリ・アフィリエイトカテゴリ・ページの見出しや説明文）を
+文字2-gram の TF-IDF ベクトルにし、全ツール同士のコサイン類似度を行列積1回でまとめて求める。
+同じカテゴリ・同じアフィリエイトカテゴリのツールには加点し、スコア上位を関連ツールとする。
+
+IDF はカタログ全体（ページの無い候補ツールも含む）で計算し、リンク先にできるのは
+ページが存在するツール（candidates）だけ。同点はスラッグ順で決めるので結果は毎回同じ。
+
+DBのカテゴリは粒度がまちまちで（給与計算も BMI も calculator）、本文の類似度だけでは
+住宅ローン→持ち家vs賃貸のような編集上の定番の組が落ちる。EDITORIAL_PAIRS の組には
+上限のある加点をして、計算したグラフに入るようにする（入ったかは missing_editorial で確かめる）。
+"""
+import re
+
+import numpy as np
+
+RELATED_COUNT = 4
+# 本文の類似度への加点（DBのカテゴリは粒度がまちまちなので控えめにする）
+CATEGORY_WEIGHT = 0.02
+AFFILIATE_WEIGHT = 0.08
+NO_AFFILIATE = {'', 'なし'}
+
+# 編集上の定番の組 {ツール: [関連ツール]}（以前の手書きの RELATED の各ツール上位2件）。
+# 行側のツールから見たスコアに EDITORIAL_WEIGHT を足すだけで、枠は固定しない。
+# 本文の類似度がほぼ0の組も上位に届く程度の重みにし、それ以上の順位は類似度で決まる
+EDITORIAL_WEIGHT = 0.15
+EDITORIAL_PAIRS = {
+    'salary-calculator': ['tax-calculator', 'tax-return-checker'],
+    'tax-calculator': ['tax-return-checker', 'salary-calculator'],
+    'tax-return-checker': ['tax-calculator', 'furusato-tax'],
+    'furusato-tax': ['tax-calculator', 'tax-return-checker'],
+    'loan-calculator': ['rent-vs-buy', 'real-estate-yield'],
+    'investment-return': ['compound-interest', 'nisa-simulator'],
+    'nisa-simulator': ['investment-return', 'compound-interest'],
+    'compound-interest': ['investment-return', 'nisa-simulator'],
+    'dividend-yield': ['investment-return', 'nisa-simulator'],
+    'insurance-calculator': ['pension-calculator', 'retirement-fund'],
+    'pension-calculator': ['retirement-fund', 'retirement-calculator'],
+    'retirement-fund': ['pension-calculator', 'retirement-calculator'],
+    'retirement-calculator': ['pension-calculator', 'retirement-fund'],
+    'unemployment-benefit': ['salary-calculator', 'tax-calculator'],
+    'rent-vs-buy': ['loan-calculator', 'real-estate-yield'],
+    'real-estate-yield': ['rent-vs-buy', 'loan-calculator'],
+}
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def bigrams(text):
+    text = _SPACE_RE.sub('', text.lower())
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def tfidf_matrix(documents):
+    """文書のリストから L2 正規化済みの TF-IDF 行列（文書数 x 語彙数）を作る"""
+    vocab = {}
+    rows, cols, counts = [], [], []
+    for row, document in enumerate(documents):
+        grams = {}
+        for gram in bigrams(document):
+            grams[gram] = grams.get(gram, 0) + 1
+        for gram, count in grams.items():
+            rows.append(row)
+            cols.append(vocab.setdefault(gram, len(vocab)))
+            counts.append(count)
+
+    matrix = np.zeros((len(documents), max(len(vocab), 1)))
+    matrix[rows, cols] = counts
+    tf = np.log1p(matrix)
+    df = np.count_nonzero(matrix, axis=0)
+    idf = np.log((1 + len(documents)) / (1 + df)) + 1
+    # 「入力」「計算」などどのページにもある語が効きすぎないよう IDF は2乗して使う
+    weighted = tf * idf ** 2
+    norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+    return weighted / np.where(norms == 0, 1, norms)
+
+
+def score_matrix(tools, texts):
+    """tools: [(slug, name, category, affiliate_category)]、texts: {slug: ページ本文} -> スコア行列"""
+    documents = [' '.join([name or '', category or '', affiliate or '', texts.get(slug, '')])
+                 for slug, name, category, affiliate in tools]
+    vectors = tfidf_matrix(documents)
+    scores = vectors @ vectors.T
+
+    categories = np.array([category or '' for _, _, category, _ in tools], dtype=object)
+    affiliates = np.array([affiliate or '' for _, _, _, affiliate in tools], dtype=object)
+    has_affiliate = np.array([affiliate not in NO_AFFILIATE for affiliate in affiliates])
+    scores += CATEGORY_WEIGHT * (categories[:, None] == categories[None, :])
+    scores += AFFILIATE_WEIGHT * ((affiliates[:, None] == affiliates[None, :])
+                                  & has_affiliate[:, None] & has_affiliate[None, :])
+
+    index = {slug: i for i, (slug, _, _, _) in enumerate(tools)}
+    for slug, others in EDITORIAL_PAIRS.items():
+        for other in others:
+            if slug in index and other in index:
+                scores[index[slug], index[other]] += EDITORIAL_WEIGHT
+    return scores
+
+
+def related_graph(tools, texts, candidates, count=RELATED_COUNT):
+    """candidates（ページのあるスラッグ）の各ツールについて関連ツールのスラッグを上位 count 件返す"""
+    slugs = [slug for slug, _, _, _ in tools]
+    scores = score_matrix(tools, texts)
+    usable = np.array([slug in candidates for slug in slugs])
+    scores[:, ~usable] = -np.inf
+    np.fill_diagonal(scores, -np.inf)
+
+    # スコアの降順、同点はスラッグ順（lexsort は最後のキーが第1キー）
+    order_by_slug = np.argsort(np.array(slugs, dtype=object))
+    rank = np.empty(len(slugs), dtype=int)
+    rank[order_by_slug] = np.arange(len(slugs))
+    graph = {}
+    for i, slug in enumerate(slugs):
+        if slug not in candidates:
+            continue
+        order = np.lexsort((rank, -scores[i]))
+        graph[slug] = [slugs[j] for j in order[:count] if np.isfinite(scores[i, j])]
+    return graph
+
+
+def missing_editorial(graph):
+    """EDITORIAL_PAIRS の組のうち計算したグラフに入らなかった [(スラッグ, 関連ツール)]
+
+    両方のページがある組だけを見る（graph のキーがページのあるツール）。加点は上限付きなので、
+    本文が大きく変わって類似度が下がった組はここに出てくる。
+    """
+    return [(slug, other) for slug, others in sorted(EDITORIAL_PAIRS.items()) if slug in graph
+            for other in others if other in graph and other not in graph[slug]]
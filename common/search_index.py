@@ -0,0 +1,49 @@
+"""ツール一覧ページの検索インデックス（ビルド時に作る転置インデックス）
+
+ツール名・カテゴリ・説明文を正規化して文字1-gram / 2-gram に分け、
+gram -> 文書番号の昇順リスト を持つ JSON にする。ブラウザ側は検索語を同じ規則で
+gram に分けてリストの積集合を取るだけなので、DOM を走査せずに一瞬で引ける。
+
+正規化（ブラウザ側の norm() と同じ規則にすること）:
+  NFKC → 小文字 → カタカナをひらがなに → 空白を除く
+
+  {"v": 1, "docs": [[名前, URL, カテゴリ], ...], "grams": {"ねん": [0, 3], ...}}
+"""
+import hashlib
+import json
+import re
+import unicodedata
+
+VERSION = 1
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).lower()
+    # ァ(U+30A1)〜ヶ(U+30F6) をひらがなに寄せる（「ねんきん」でも「ネンキン」でも当たるように）
+    text = ''.join(chr(ord(ch) - 0x60) if 'ァ' <= ch <= 'ヶ' else ch for ch in text)
+    return _SPACE_RE.sub('', text)
+
+
+def grams(text):
+    text = normalize(text)
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def build(docs):
+    """docs: [{'name', 'url', 'category', 'description'}] -> インデックス（dict）"""
+    postings = {}
+    for number, doc in enumerate(docs):
+        for gram in grams(' '.join([doc['name'], doc['category'], doc.get('description', '')])):
+            postings.setdefault(gram, []).append(number)
+    return {
+        'v': VERSION,
+        'docs': [[doc['name'], doc['url'], doc['category']] for doc in docs],
+        'grams': dict(sorted(postings.items())),
+    }
+
+
+def dumps(index):
+    """(JSON 文字列, 内容ハッシュ先頭10桁) を返す（ファイル名に付けて長期キャッシュさせる）"""
+    data = json.dumps(index, ensure_ascii=False, separators=(',', ':'))
+    return data, hashlib.sha256(data.encode('utf-8')).hexdigest()[:10]
@@ -0,0 +1,397 @@
+"""HTMLテンプレート
+
+templates/ 以下のテンプレートファイルを Python 関数にコンパイルしてキャッシュし、
+出力はリストに追記して最後に1回だけ join する（文字列の += 連結をしない）。
+
+構文（Jinja の小さなサブセット）:
+  {{ expr }}              HTMLエスケープして出力。expr は Python の式（p.price は p['price'] でも可）
+  {{ expr|safe }}         エスケープしない。他のフィルター: comma（3桁区切り）, json（<script> 用）
+  {% if expr %} {% elif expr %} {% else %} {% endif %}
+  {% for x in expr %} {% endfor %}
+  {% include "partials/footer.html" %}   現在の変数をそのまま渡して埋め込む
+  {% extends "layout.html" %}            先頭に書くと layout の {% block %} を上書きする
+  {% block name %} {% endblock %}
+  {# コメント #}
+タグ直後の改行1つは出力しない（trim_blocks 相当）。
+
+dependencies(name) はテンプレートが include / extends しているファイルを含めた一覧を返す。
+build_state の fingerprint に 'templates' として渡すと、使っているテンプレートが
+変わったページだけが作り直される。
+"""
+import ast
+import builtins
+import json
+import os
+import re
+import threading
+from html import escape
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+
+_TOKEN_RE = re.compile(r'(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})', re.S)
+
+
+class TemplateError(Exception):
+    pass
+
+
+class Safe(str):
+    """エスケープ済み（そのまま出力してよい）文字列"""
+
+
+def _escape(value):
+    if isinstance(value, Safe):
+        return value
+    return escape('' if value is None else str(value))
+
+
+def _attr(obj, name):
+    """p.price を dict なら p['price']、それ以外は getattr として解決する"""
+    if isinstance(obj, dict) and name in obj:
+        return obj[name]
+    return getattr(obj, name)
+
+
+_MISSING = object()
+
+
+def _lookup(ctx, name):
+    value = ctx.get(name, _MISSING)
+    if value is _MISSING:
+        return getattr(builtins, name, None)
+    return value
+
+
+def _comma(value):
+    return f"{value:,.0f}"
+
+
+def _json(value):
+    # </script> で閉じられないよう "<" はエスケープする
+    return Safe(json.dumps(value, ensure_ascii=False, separators=(',', ':')).replace('<', '\\u003c'))
+
+
+FILTERS = {
+    'safe': Safe,
+    'comma': _comma,
+    'json': _json,
+}
+
+
+class _RenameLoopVars(ast.NodeTransformer):
+    """ループ変数をそのループ専用のローカル名に置き換える"""
+    def __init__(self, names):
+        self.names = names
+
+    def visit_Name(self, node):
+        if node.id in self.names:
+            return ast.copy_location(ast.Name(self.names[node.id], node.ctx), node)
+        return node
+
+
+class _AttrToLookup(ast.NodeTransformer):
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if isinstance(node.ctx, ast.Load):
+            return ast.copy_location(
+                ast.Call(func=ast.Name('_attr', ast.Load()), args=[node.value, ast.Constant(node.attr)],
+                         keywords=[]), node)
+        return node
+
+
+def _split_filters(source):
+    """'a|b|c' をトップレベルの | で分割する（文字列・括弧内は無視）"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(source):
+        if quote:
+            if ch == quote and source[i - 1] != '\\':
+                quote = None
+        elif ch in '\'"':
+            quote = ch
+        elif ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == '|' and depth == 0:
+            parts.append(source[start:i])
+            start = i + 1
+    parts.append(source[start:])
+    return [p.strip() for p in parts]
+
+
+class _Function:
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        self.indent = 1
+        self.names = set()
+        self.scopes = []  # 外側からの for ごとの {ループ変数名: ローカル名}
+        self.loops = 0
+
+    def local_names(self):
+        """今のループの内側で見えるループ変数 {名前: ローカル名}（内側のループが優先）"""
+        names = {}
+        for scope in self.scopes:
+            names.update(scope)
+        return names
+
+    def emit(self, line):
+        self.lines.append('    ' * self.indent + line)
+
+    def source(self):
+        prelude = ['    ' + f"{n} = _lookup(_ctx, {n!r})" for n in sorted(self.names)]
+        body = self.lines or ['    pass']
+        return '\n'.join([f"def {self.name}(_ctx, _w, _blocks):"] + prelude + body)
+
+
+class _Compiler:
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.functions = [_Function('_root')]
+        self.stack = []  # (種類, 出力先の関数)。block はブロック自身の関数、if/for は囲んでいる関数
+        self.blocks = []
+        self.extends = None
+        self.includes = []
+
+    @property
+    def fn(self):
+        return self.stack[-1][1] if self.stack else self.functions[0]
+
+    def error(self, msg):
+        return TemplateError(f"{self.name}: {msg}")
+
+    def expr(self, source):
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise self.error(f"invalid expression {source.strip()!r}: {e.msg}") from None
+        fn = self.fn
+        local = fn.local_names()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in local:
+                fn.names.add(node.id)
+        tree = _RenameLoopVars(local).visit(tree)
+        tree = ast.fix_missing_locations(_AttrToLookup().visit(tree))
+        return ast.unparse(tree)
+
+    def target(self, source):
+        """ループ変数にループごとのローカル名を割り当て、(代入先のコード, {名前: ローカル名}) を返す
+
+        ループの外で同じ名前を使っていても（ループの前後で）外側の値のまま見える。
+        """
+        try:
+            tree = ast.parse(source.strip(), mode='eval').body
+        except SyntaxError as e:
+            raise self.error(f"invalid loop target {source.strip()!r}: {e.msg}") from None
+        fn = self.fn
+        fn.loops += 1
+        names = {n.id: f"_l{fn.loops}_{n.id}" for n in ast.walk(tree) if isinstance(n, ast.Name)}
+        return ast.unparse(_RenameLoopVars(names).visit(tree)), names
+
+    def compile(self):
+        pos = 0
+        trim = False
+        for m in _TOKEN_RE.finditer(self.source):
+            self.text(self.source[pos:m.start()], trim)
+            pos = m.end()
+            token = m.group(0)
+            trim = False
+            if token.startswith('{{'):
+                self.output(token[2:-2])
+            elif token.startswith('{%'):
+                self.tag(token[2:-2].strip())
+                trim = True
+            else:
+                trim = True
+        self.text(self.source[pos:], trim)
+        if self.stack:
+            raise self.error(f"unclosed {{% {self.stack[-1][0]} %}}")
+        return '\n\n'.join(f.source() for f in self.functions + self.blocks)
+
+    def text(self, text, trim):
+        if trim and text.startswith('\n'):
+            text = text[1:]
+        if text and not (self.extends and not self.stack):
+            self.fn.emit(f"_w({text!r})")
+
+    def output(self, source):
+        parts = _split_filters(source)
+        code = self.expr(parts[0])
+        safe = False
+        for name in parts[1:]:
+            if name not in FILTERS:
+                raise self.error(f"unknown filter {name!r}")
+            code = f"_filters[{name!r}]({code})"
+            safe = safe or name in ('safe', 'json')
+        self.fn.emit(f"_w({code})" if safe else f"_w(_escape({code}))")
+
+    def tag(self, body):
+        word, _, rest = body.partition(' ')
+        rest = rest.strip()
+        fn = self.fn
+        if word == 'if':
+            fn.emit(f"if {self.expr(rest)}:")
+            fn.indent += 1
+            self.stack.append(('if', fn))
+        elif word in ('elif', 'else'):
+            if not self.stack or self.stack[-1][0] != 'if':
+                raise self.error(f"{{% {word} %}} outside {{% if %}}")
+            fn.indent -= 1
+            fn.emit(f"elif {self.expr(rest)}:" if word == 'elif' else "else:")
+            fn.indent += 1
+        elif word == 'for':
+            m = re.match(r'(.+?)\s+in\s+(.+)$', rest, re.S)
+            if not m:
+                raise self.error(f"invalid for: {body!r}")
+            iterable = self.expr(m.group(2))
+            target, names = self.target(m.group(1))
+            fn.emit(f"for {target} in {iterable}:")
+            fn.indent += 1
+            fn.scopes.append(names)
+            self.stack.append(('for', fn))
+        elif word in ('endif', 'endfor'):
+            kind = word[3:]
+            if not self.stack or self.stack[-1][0] != kind:
+                raise self.error(f"unexpected {{% {word} %}}")
+            self.stack.pop()
+            if kind == 'for':
+                fn.scopes.pop()
+            fn.indent -= 1
+        elif word == 'include':
+            name = self.literal(rest)
+            self.includes.append(name)
+            extra = ', '.join(f"{n!r}: {local}" for n, local in fn.local_names().items())
+            fn.emit(f"_include({name!r}, {{**_ctx, {extra}}}, _w)" if extra else f"_include({name!r}, _ctx, _w)")
+        elif word == 'extends':
+            if self.extends or any(f.lines for f in self.functions):
+                raise self.error("{% extends %} must be the first tag")
+            self.extends = self.literal(rest)
+        elif word == 'block':
+            if not re.fullmatch(r'\w+', rest):
+                raise self.error(f"invalid block name {rest!r}")
+            if not self.extends or self.stack:
+                fn.emit(f"_blocks.get({rest!r}, _block_{rest})(_ctx, _w, _blocks)")
+            block = _Function(f"_block_{rest}")
+            self.blocks.append(block)
+            self.stack.append(('block', block))
+        elif word == 'endblock':
+            if not self.stack or self.stack[-1][0] != 'block':
+                raise self.error("unexpected {% endblock %}")
+            self.stack.pop()
+        else:
+            raise self.error(f"unknown tag {{% {word} %}}")
+
+    def literal(self, source):
+        try:
+            value = ast.literal_eval(source)
+        except (ValueError, SyntaxError):
+            value = None
+        if not isinstance(value, str):
+            raise self.error(f"expected a quoted template name, got {source!r}")
+        return value
+
+
+class Template:
+    def __init__(self, env, name, path, source):
+        self.env = env
+        self.name = name
+        self.path = path
+        compiler = _Compiler(name, source)
+        code = compiler.compile()
+        self.extends = compiler.extends
+        self.includes = compiler.includes
+        namespace = {'_escape': _escape, '_attr': _attr, '_lookup': _lookup, '_filters': env.filters,
+                     '_include': env._include}
+        exec(compile(code, f"<template {name}>", 'exec'), namespace)
+        self._root = namespace['_root']
+        self.blocks = {b.name[len('_block_'):]: namespace[b.name] for b in compiler.blocks}
+
+    def _render_into(self, ctx, w, blocks):
+        if self.extends:
+            self.env.get(self.extends)._render_into(ctx, w, {**self.blocks, **blocks})
+        else:
+            self._root(ctx, w, blocks)
+
+    def render_chunks(self, ctx=None, **kwargs):
+        """出力断片のリストを返す（ファイルへはそのまま writelines できる）"""
+        out = []
+        self._render_into({**(ctx or {}), **kwargs}, out.append, {})
+        return out
+
+    def render(self, ctx=None, **kwargs):
+        return ''.join(self.render_chunks(ctx, **kwargs))
+
+
+class Environment:
+    def __init__(self, directory=TEMPLATES_DIR):
+        self.directory = directory
+        self.filters = dict(FILTERS)
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def path(self, name):
+        return os.path.join(self.directory, *name.split('/'))
+
+    def get(self, name):
+        """コンパイル済みテンプレート（プロセス内でキャッシュ）"""
+        template = self._cache.get(name)
+        if template is None:
+            with self._lock:
+                template = self._cache.get(name)
+                if template is None:
+                    path = self.path(name)
+                    with open(path, encoding='utf-8') as f:
+                        template = Template(self, name, path, f.read())
+                    self._cache[name] = template
+        return template
+
+    def _include(self, name, ctx, w):
+        self.get(name)._render_into(ctx, w, {})
+
+    def render(self, name, ctx=None, **kwargs):
+        return self.get(name).render(ctx, **kwargs)
+
+    def render_to_file(self, path, name, ctx=None, **kwargs):
+        """テンプレートを描画してファイルに書き、書いた文字数を返す"""
+        chunks = self.get(name).render_chunks(ctx, **kwargs)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(chunks)
+        return sum(map(len, chunks))
+
+    def dependencies(self, name):
+        """name が使うテンプレートファイル（自分自身・include・extends を再帰的に）のパス一覧"""
+        seen, order = set(), []
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            template = self.get(current)
+            order.append(template.path)
+            pending.extend(template.includes)
+            if template.extends:
+                pending.append(template.extends)
+        return sorted(order)
+
+
+_default = Environment()
+
+
+def get(name):
+    return _default.get(name)
+
+
+def render(name, ctx=None, **kwargs):
+    return _default.render(name, ctx, **kwargs)
+
+
+def render_to_file(path, name, ctx=None, **kwargs):
+    return _default.render_to_file(path, name, ctx, **kwargs)
+
+
+def dependencies(name):
+    return _default.dependencies(name)
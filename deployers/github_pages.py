@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
-"""GitHub Pages デプロイ自動化（git add → commit → push）"""
+"""GitHub Pages デプロイ自動化（git add → commit → push）
+
+output/tools/ はビルドマニフェスト（common/manifest.py）の未デプロイ分だけを add / rm し、
+push できたらデプロイ済みとして記録する。それ以外は git add -A でまとめてステージする。
+commit / push の要否は git diff --cached と origin/main..HEAD のコミット数で判断する。
+"""
 import subprocess
 import sys
 import os
 from datetime import datetime
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common import db, manifest
+
+# output/tools/ 以外（マニフェストの対象外）
+OTHER_PATHS = ['.', ':(exclude)output/tools/']
+GIT_ARGS_CHUNK = 200
 
 
 def run(cmd, **kwargs):
@@ -24,25 +36,37 @@ def main():
         print("ERROR: Not a git repository. Run 'git init' first.")
         return 1
 
-    # Check for changes
-    status = run(['git', 'status', '--porcelain'])
-    if not status.stdout.strip():
-        print("No changes to deploy.")
-        return 0
+    conn = db.get_connection()
+    pending = manifest.pending(conn)
+    print(f"Build manifest: {len(pending)} files pending")
 
     date_str = datetime.now().strftime('%Y-%m-%d %H:%M')
     msg = f"auto-deploy: {date_str}"
 
-    run(['git', 'add', '-A'])
-    result = run(['git', 'commit', '-m', msg])
-    if result.returncode != 0:
-        print("Commit failed or nothing to commit.")
-        return 1
+    built = [path for path, removed in pending if not removed]
+    removed = [path for path, removed in pending if removed]
+    for i in range(0, len(built), GIT_ARGS_CHUNK):
+        run(['git', 'add', '--', *built[i:i + GIT_ARGS_CHUNK]])
+    for i in range(0, len(removed), GIT_ARGS_CHUNK):
+        run(['git', 'rm', '--cached', '--ignore-unmatch', '-q', '--', *removed[i:i + GIT_ARGS_CHUNK]])
+    run(['git', 'add', '-A', '--', *OTHER_PATHS])
+    # ステージした変更があるときだけ commit し、origin/main より進んでいるときだけ push する
+    if run(['git', 'diff', '--cached', '--quiet']).returncode != 0:
+        result = run(['git', 'commit', '-m', msg])
+        if result.returncode != 0:
+            print("Commit failed.")
+            return 1
+    ahead = run(['git', 'rev-list', '--count', 'origin/main..HEAD'])
+    if ahead.returncode == 0 and int(ahead.stdout.strip() or 0) == 0:
+        manifest.mark_deployed(conn, [path for path, _ in pending])
+        print("Nothing to push.")
+        return 0
 
     result = run(['git', 'push'])
     if result.returncode != 0:
         print("Push failed. Check remote configuration.")
         return 1
+    manifest.mark_deployed(conn, [path for path, _ in pending])
 
     print(f"\nDeployed: {msg}")
     return 0
@@ -1,226 +1,249 @@
 #!/usr/bin/env python3
-"""格安SIM比較表HTML自動生成"""
+"""格安SIM比較表HTML自動生成
+
+comparison_data を1回のクエリで読み、以下を output/tools/sim-comparison/ に書き出す:
+  index.html                全プランの一覧
+  provider/<slug>/index.html  事業者別
+  data/<tier>/index.html      データ容量別（絞り込みチップと同じ区分）
+前回と内容が同じページは書き込まない。sitemap.xml の該当区間も更新する。
+"""
+import hashlib
 import sqlite3
 import os
+import re
+import sys
 import json
 from datetime import datetime
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'money_machine.db')
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output', 'tools', 'sim-comparison')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from common import db, manifest, migrations, pages
+from scrapers.sim_providers import PROVIDERS
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PAGE_DIR = 'sim-comparison'
+PAGE_DIR_PATH = f'output/tools/{PAGE_DIR}'  # BASE_DIR 相対（rendered_pages のキー）
+PROVIDER_DIR = 'provider'
+TIER_DIR = 'data'
+SITEMAP_PATH = os.path.join(BASE_DIR, 'output', 'tools', 'sitemap.xml')
+SITE_URL = 'https://ai-money-lab.github.io/benri-tools/'
+TEMPLATE = 'sim_comparison.html'
+
+PLANS_QUERY = """SELECT category, provider, plan_name, price, data_gb, data_json, scraped_at
+                 FROM comparison_data
+                 WHERE is_current = 1
+                 ORDER BY category, price, provider, plan_name"""
+
+PROVIDER_SLUGS = {spec['provider']: spec['slug'] for spec in PROVIDERS}
+
+GB_PRICE_NONE = 99999  # 容量0・料金0のプラン（GB単価を出さない）
+UNLIMITED_GB = 999
+
+# 絞り込みチップ: (キー, ラベル, 判定)
+FILTERS = [
+    ('1', '1GB以下', lambda gb: gb <= 1),
+    ('3', '〜3GB', lambda gb: 0 < gb <= 3),
+    ('5', '〜5GB', lambda gb: 0 < gb <= 5),
+    ('10', '〜10GB', lambda gb: 0 < gb <= 10),
+    ('20', '〜20GB', lambda gb: 0 < gb <= 20),
+    ('999', '20GB+/無制限', lambda gb: gb > 20),
+]
+SORT_KEYS = ['price', 'data_gb', 'gb_price', 'provider', 'plan_name']
+TIER_SLUGS = {'1': '1gb', '3': '3gb', '5': '5gb', '10': '10gb', '20': '20gb', '999': 'over-20gb'}
+
+
+def gb_price(plan):
+    if plan['data_gb'] <= 0 or plan['price'] <= 0:
+        return GB_PRICE_NONE
+    if plan['data_gb'] >= UNLIMITED_GB:
+        return round(plan['price'] / 100)
+    return round(plan['price'] / plan['data_gb'])
+
+
+def best_rows(plans, indices):
+    """indices の中で最安（料金）と GB単価最安の行番号リストを返す"""
+    priced = [i for i in indices if plans[i]['price'] > 0]
+    min_price = min((plans[i]['price'] for i in priced), default=None)
+    min_gb = min((plans[i]['gb_price'] for i in priced if plans[i]['data_gb'] > 0), default=None)
+    best = [i for i in priced if plans[i]['price'] == min_price]
+    good = [i for i in priced if min_gb is not None and min_gb < GB_PRICE_NONE
+            and plans[i]['data_gb'] > 0 and plans[i]['gb_price'] == min_gb]
+    return best, good
+
+
+def enrich(plans):
+    """表示用の値（特徴・GB単価・ラベル）をプランごとに1回だけ計算する"""
+    for p in plans:
+        info = json.loads(p['data_json'] or '{}')
+        p['feature'] = info.get('feature', '')
+        p['gb_price'] = gb_price(p)
+        p['data_label'] = '無制限' if p['data_gb'] >= UNLIMITED_GB else f"{p['data_gb']:g}GB"
+        p['gb_label'] = ('−' if p['data_gb'] >= UNLIMITED_GB or p['gb_price'] == GB_PRICE_NONE
+                         else f"{p['gb_price']}円/GB")
+
+
+def prepare(plans):
+    """並び順・絞り込み・最安行・統計をビルド時に計算する
+
+    plans は料金順（SQL の ORDER BY）のまま行番号として使う。ブラウザ側の JS は
+    ここで作った行番号の配列で行を並べ替え・表示切替するだけ。
+    """
+    rows = range(len(plans))
+    order = {key: sorted(rows, key=lambda i: plans[i][key]) for key in SORT_KEYS}
+    buckets = {key: [i for i in rows if test(plans[i]['data_gb'])] for key, _, test in FILTERS}
+    best = {key: best_rows(plans, idx) for key, idx in buckets.items()}
+    best['all'] = best_rows(plans, rows)
+
+    priced = [p['price'] for p in plans if p['price'] > 0]
+    stats = {
+        'providers': len({p['provider'] for p in plans}),
+        'plans': len(plans),
+        'min_price': min(priced) if priced else 0,
+        'avg_price': round(sum(priced) / len(priced)) if priced else 0,
+    }
+    return order, buckets, best, stats
+
 
-def generate():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def mark_best(plans, best):
+    """既定（全て）表示で最安・GB単価最安の行に付けるクラス"""
+    best_price, best_gb = set(best[0]), set(best[1])
+    for i, p in enumerate(plans):
+        p['classes'] = ' '.join(c for c, on in (('bp', i in best_price), ('bg', i in best_gb)) if on)
+
+
+def provider_slug(provider):
+    slug = PROVIDER_SLUGS.get(provider)
+    if slug:
+        return slug
+    ascii_slug = re.sub(r'[^a-z0-9]+', '-', provider.lower()).strip('-')
+    return ascii_slug or 'p-' + hashlib.sha1(provider.encode('utf-8')).hexdigest()[:8]
+
+
+def data_date(plans):
+    """ページに載るプランのうち最も新しい scraped_at（データの更新日）"""
+    latest = max((p['scraped_at'] for p in plans if p.get('scraped_at')), default=None)
+    return datetime.strptime(latest[:10], '%Y-%m-%d') if latest else datetime.now()
+
+
+def page(path, plans, root, nav, priority='0.8', **meta):
+    """1ページ分のテンプレート変数を作る（plans はこのページ用のコピー）"""
+    plans = [dict(p) for p in plans]
+    order, buckets, best, stats = prepare(plans)
+    mark_best(plans, best['all'])
+    updated = data_date(plans)
+    return {
+        'path': path,
+        'template': TEMPLATE,
+        'lastmod': updated.strftime('%Y-%m-%d'),
+        'priority': priority,
+        'context': dict(meta, today=updated.strftime('%Y年%m月%d日'), stats=stats, plans=plans,
+                        filters=[(key, label) for key, label, _ in FILTERS],
+                        index={'order': order, 'buckets': buckets, 'best': best},
+                        root=root, nav=nav),
+    }
+
+
+def build_pages(plans):
+    """一覧ページ＋事業者別・データ容量別ページの定義を作る"""
+    providers = {}
+    for p in plans:
+        providers.setdefault(p['provider'], []).append(p)
+    tiers = [(key, label, [p for p in plans if test(p['data_gb'])]) for key, label, test in FILTERS]
+    tiers = [(key, label, subset) for key, label, subset in tiers if subset]
+
+    nav = {
+        'providers': [(name, f"{PROVIDER_DIR}/{provider_slug(name)}/") for name in sorted(providers)],
+        'tiers': [(label, f"{TIER_DIR}/{TIER_SLUGS[key]}/") for key, label, _ in tiers],
+    }
+    n_providers = len(providers)
+    defs = [page(f"{PAGE_DIR_PATH}/index.html", plans, '', nav, priority='0.9',
+                  title='格安SIM全プラン比較【自動更新】最安プランを即発見',
+                  description=f'主要格安SIM{n_providers}社の全プランを料金・データ容量・GB単価で比較。自動更新で常に最新。あなたに最適なプランが見つかります。',
+                  og_title='格安SIM全プラン比較【自動更新】',
+                  og_description=f'主要{n_providers}社の格安SIMプランを一括比較。料金順・データ容量順・GB単価順で並べ替え可能。',
+                  heading='格安SIM 全プラン比較表',
+                  lead=f'主要{n_providers}社の料金プランを一括比較 — あなたに最適なプランが見つかります')]
+
+    for name, subset in providers.items():
+        cheapest = min(p['price'] for p in subset)
+        defs.append(page(
+            f"{PAGE_DIR_PATH}/{PROVIDER_DIR}/{provider_slug(name)}/index.html", subset, '../../', nav,
+            title=f'{name}の料金プラン一覧・比較【自動更新】',
+            description=f'{name}の全{len(subset)}プランを料金・データ容量・GB単価で比較。月額{cheapest:,.0f}円から。他社格安SIMとの比較も。',
+            og_title=f'{name}の料金プラン比較【自動更新】',
+            og_description=f'{name}の全{len(subset)}プランを一覧比較。',
+            heading=f'{name} 料金プラン比較',
+            lead=f'{name}の全{len(subset)}プランを料金・データ容量・GB単価で比較'))
+
+    for key, label, subset in tiers:
+        defs.append(page(
+            f"{PAGE_DIR_PATH}/{TIER_DIR}/{TIER_SLUGS[key]}/index.html", subset, '../../', nav,
+            title=f'データ容量{label}の格安SIM比較【自動更新】最安プランを即発見',
+            description=f'データ容量{label}の格安SIMプラン{len(subset)}件を料金・GB単価で比較。自動更新で常に最新。',
+            og_title=f'データ容量{label}の格安SIM比較【自動更新】',
+            og_description=f'データ容量{label}の格安SIMプラン{len(subset)}件を一括比較。',
+            heading=f'格安SIM比較 データ容量{label}',
+            lead=f'データ容量{label}のプラン{len(subset)}件を一括比較 — あなたに最適なプランが見つかります'))
+    return defs
+
+
+def update_sitemap(conn, pages):
+    """sitemap.xml の <!-- mm:sim-comparison --> 区間を生成ページの一覧で置き換える"""
+    start, end = f'  <!-- mm:{PAGE_DIR} -->\n', f'  <!-- /mm:{PAGE_DIR} -->\n'
+    entries = []
+    for pg in pages:
+        url = SITE_URL + pg['path'][len('output/tools/'):].removesuffix('index.html')
+        entries.append(f"  <url>\n    <loc>{url}</loc>\n    <lastmod>{pg['lastmod']}</lastmod>\n"
+                       f"    <changefreq>daily</changefreq>\n    <priority>{pg['priority']}</priority>\n  </url>\n")
+    section = start + ''.join(entries) + end
+
+    if os.path.isfile(SITEMAP_PATH):
+        with open(SITEMAP_PATH, encoding='utf-8') as f:
+            content = f.read()
+    else:
+        content = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n</urlset>\n')
+    if start in content and end in content:
+        new = content[:content.index(start)] + section + content[content.index(end) + len(end):]
+    else:
+        # 初回: 手書きの sim-comparison エントリを外して区間を末尾に足す
+        own = re.compile(r'  <url>\s*<loc>' + re.escape(SITE_URL + PAGE_DIR + '/') + r'</loc>.*?</url>\n', re.S)
+        new = own.sub('', content).replace('</urlset>', section + '</urlset>')
+    if new != content:
+        manifest.write_page(conn, SITEMAP_PATH, new)
+    return new != content
+
+
+def generate(ctx=None):
+    conn = ctx.db if ctx else db.get_connection()
     c = conn.cursor()
-    c.execute("SELECT * FROM comparison_data WHERE is_current = 1 AND category = 'sim' ORDER BY price ASC")
-    plans = [dict(row) for row in c.fetchall()]
-    conn.close()
+    c.row_factory = sqlite3.Row
+    # 全カテゴリを1回のクエリで取り、カテゴリ単位でページを作る（現状ページ定義があるのは sim のみ）
+    c.execute(PLANS_QUERY)
+    by_category = {}
+    for row in c:
+        by_category.setdefault(row['category'], []).append(dict(row))
+    plans = by_category.get('sim', [])
 
     if not plans:
         print("  No data found!")
         return
 
-    today = datetime.now().strftime('%Y年%m月%d日')
-
-    # Build table rows
-    rows_js = json.dumps(plans, ensure_ascii=False)
-
-    html = f'''<!DOCTYPE html>
-<html lang="ja">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>格安SIM全プラン比較【自動更新】最安プランを即発見</title>
-<meta name="description" content="主要格安SIM10社の全プランを料金・データ容量・GB単価で比較。自動更新で常に最新。あなたに最適なプランが見つかります。">
-<meta property="og:title" content="格安SIM全プラン比較【自動更新】">
-<meta property="og:description" content="主要10社の格安SIMプランを一括比較。料金順・データ容量順・GB単価順で並べ替え可能。">
-<meta property="og:type" content="website">
-<style>
-*{{margin:0;padding:0;box-sizing:border-box}}
-body{{font-family:-apple-system,BlinkMacSystemFont,"Segoe UI","Hiragino Sans",sans-serif;background:#f5f7fa;color:#333;line-height:1.6}}
-.container{{max-width:1200px;margin:0 auto;padding:16px}}
-header{{background:linear-gradient(135deg,#1a73e8,#0d47a1);color:#fff;padding:32px 16px;text-align:center;border-radius:0 0 16px 16px}}
-header h1{{font-size:clamp(1.4rem,4vw,2rem);margin-bottom:8px}}
-header p{{opacity:.9;font-size:.95rem}}
-.update-date{{font-size:.85rem;opacity:.7;margin-top:4px}}
-.controls{{background:#fff;border-radius:12px;padding:16px;margin:16px 0;box-shadow:0 2px 8px rgba(0,0,0,.08);display:flex;flex-wrap:wrap;gap:12px;align-items:center}}
-.controls label{{font-weight:600;font-size:.9rem;color:#555}}
-.controls select,.controls button{{padding:8px 16px;border:1px solid #ddd;border-radius:8px;font-size:.9rem;cursor:pointer;background:#fff}}
-.controls button{{background:#1a73e8;color:#fff;border:none;font-weight:600}}
-.controls button:hover{{background:#1557b0}}
-.filter-chips{{display:flex;flex-wrap:wrap;gap:8px;margin:12px 0}}
-.chip{{padding:6px 14px;border-radius:20px;border:1px solid #ddd;background:#fff;cursor:pointer;font-size:.85rem;transition:.2s}}
-.chip.active{{background:#1a73e8;color:#fff;border-color:#1a73e8}}
-.stats{{display:grid;grid-template-columns:repeat(auto-fit,minmax(140px,1fr));gap:12px;margin:16px 0}}
-.stat-card{{background:#fff;border-radius:12px;padding:16px;text-align:center;box-shadow:0 2px 8px rgba(0,0,0,.08)}}
-.stat-card .num{{font-size:1.8rem;font-weight:700;color:#1a73e8}}
-.stat-card .label{{font-size:.8rem;color:#888}}
-table{{width:100%;border-collapse:collapse;background:#fff;border-radius:12px;overflow:hidden;box-shadow:0 2px 8px rgba(0,0,0,.08)}}
-thead{{background:#1a73e8;color:#fff}}
-th{{padding:12px 8px;font-size:.85rem;cursor:pointer;white-space:nowrap;user-select:none}}
-th:hover{{background:#1557b0}}
-th .arrow{{margin-left:4px;font-size:.7rem}}
-td{{padding:10px 8px;border-bottom:1px solid #f0f0f0;font-size:.9rem;text-align:center}}
-tr:hover{{background:#f8f9ff}}
-.provider-name{{font-weight:600;color:#333}}
-.price{{font-weight:700;color:#1a73e8;font-size:1.05rem}}
-.badge{{display:inline-block;padding:2px 8px;border-radius:10px;font-size:.75rem;font-weight:600}}
-.badge-best{{background:#e8f5e9;color:#2e7d32}}
-.badge-good{{background:#fff3e0;color:#e65100}}
-.gb-price{{color:#666}}
-.btn-official{{display:inline-block;padding:6px 12px;background:#ff6d00;color:#fff;border-radius:6px;text-decoration:none;font-size:.8rem;font-weight:600;transition:.2s}}
-.btn-official:hover{{background:#e65100}}
-footer{{text-align:center;padding:24px 16px;color:#999;font-size:.8rem;margin-top:24px}}
-@media(max-width:768px){{
-  .controls{{flex-direction:column}}
-  table{{font-size:.8rem}}
-  td,th{{padding:8px 4px}}
-  .btn-official{{padding:4px 8px;font-size:.75rem}}
-}}
-</style>
-</head>
-<body>
-<header>
-<h1>格安SIM 全プラン比較表</h1>
-<p>主要10社の料金プランを一括比較 — あなたに最適なプランが見つかります</p>
-<div class="update-date">最終更新: {today} ｜ 自動更新データ</div>
-</header>
-<div class="container">
-<div class="stats" id="stats"></div>
-<div class="controls">
-<label>並び替え：</label>
-<select id="sortSelect" onchange="sortTable()">
-<option value="price">料金が安い順</option>
-<option value="data_gb">データ容量順</option>
-<option value="gb_price">GB単価が安い順</option>
-<option value="provider">会社名順</option>
-</select>
-</div>
-<div class="filter-chips" id="filterChips">
-<div class="chip active" onclick="filterData('all')">全て</div>
-<div class="chip" onclick="filterData(1)">1GB以下</div>
-<div class="chip" onclick="filterData(3)">〜3GB</div>
-<div class="chip" onclick="filterData(5)">〜5GB</div>
-<div class="chip" onclick="filterData(10)">〜10GB</div>
-<div class="chip" onclick="filterData(20)">〜20GB</div>
-<div class="chip" onclick="filterData(999)">20GB+/無制限</div>
-</div>
-<table>
-<thead>
-<tr>
-<th onclick="sortBy('provider')">会社名<span class="arrow"></span></th>
-<th onclick="sortBy('plan_name')">プラン名<span class="arrow"></span></th>
-<th onclick="sortBy('price')">月額料金<span class="arrow"></span></th>
-<th onclick="sortBy('data_gb')">データ容量<span class="arrow"></span></th>
-<th onclick="sortBy('gb_price')">GB単価<span class="arrow"></span></th>
-<th>特徴</th>
-<th>詳細</th>
-</tr>
-</thead>
-<tbody id="tableBody"></tbody>
-</table>
-<footer>
-<p>※ 表示価格は全て税込です。最新の正確な情報は各社公式サイトでご確認ください。</p>
-<p>※ キャンペーン価格・割引適用前の通常価格を掲載しています。</p>
-<p style="margin-top:8px">データ自動収集・更新 by Money Machine</p>
-</footer>
-</div>
-<script>
-const allPlans={json.dumps(plans, ensure_ascii=False)};
-let currentSort="price";
-let currentDir=1;
-let currentFilter="all";
-function init(){{
-  renderStats();
-  renderTable(allPlans);
-}}
-function renderStats(){{
-  const el=document.getElementById("stats");
-  const providers=new Set(allPlans.map(p=>p.provider));
-  const minPrice=Math.min(...allPlans.filter(p=>p.price>0).map(p=>p.price));
-  const avgPrice=Math.round(allPlans.filter(p=>p.price>0).reduce((a,b)=>a+b.price,0)/allPlans.filter(p=>p.price>0).length);
-  el.innerHTML=`
-    <div class="stat-card"><div class="num">${{providers.size}}</div><div class="label">社</div></div>
-    <div class="stat-card"><div class="num">${{allPlans.length}}</div><div class="label">プラン</div></div>
-    <div class="stat-card"><div class="num">${{minPrice.toLocaleString()}}円</div><div class="label">最安</div></div>
-    <div class="stat-card"><div class="num">${{avgPrice.toLocaleString()}}円</div><div class="label">平均</div></div>`;
-}}
-function getGbPrice(p){{
-  if(p.data_gb<=0||p.price<=0)return 99999;
-  if(p.data_gb>=999)return Math.round(p.price/100);
-  return Math.round(p.price/p.data_gb);
-}}
-function getFiltered(){{
-  let d=[...allPlans];
-  if(currentFilter!=="all"){{
-    if(currentFilter===1)d=d.filter(p=>p.data_gb<=1);
-    else if(currentFilter===999)d=d.filter(p=>p.data_gb>20);
-    else d=d.filter(p=>p.data_gb<=currentFilter&&p.data_gb>0);
-  }}
-  return d;
-}}
-function sortBy(key){{
-  if(currentSort===key)currentDir*=-1;
-  else{{currentSort=key;currentDir=1;}}
-  sortTable();
-}}
-function sortTable(){{
-  currentSort=document.getElementById("sortSelect").value||currentSort;
-  let data=getFiltered();
-  data.sort((a,b)=>{{
-    let va,vb;
-    if(currentSort==="gb_price"){{va=getGbPrice(a);vb=getGbPrice(b);}}
-    else if(currentSort==="price"||currentSort==="data_gb"){{va=a[currentSort];vb=b[currentSort];}}
-    else{{va=a[currentSort]||"";vb=b[currentSort]||"";if(typeof va==="string")return va.localeCompare(vb)*currentDir;}}
-    return(va-vb)*currentDir;
-  }});
-  renderTable(data);
-}}
-function filterData(f){{
-  currentFilter=f;
-  document.querySelectorAll(".chip").forEach(c=>c.classList.remove("active"));
-  event.target.classList.add("active");
-  sortTable();
-}}
-function renderTable(data){{
-  const minGbPrice=Math.min(...data.filter(p=>p.price>0&&p.data_gb>0).map(p=>getGbPrice(p)));
-  const minPrice=Math.min(...data.filter(p=>p.price>0).map(p=>p.price));
-  const tbody=document.getElementById("tableBody");
-  tbody.innerHTML=data.map(p=>{{
-    const gbp=getGbPrice(p);
-    const info=JSON.parse(p.data_json||"{{}}");
-    const dataLabel=p.data_gb>=999?"無制限":p.data_gb+"GB";
-    const gbLabel=p.data_gb>=999?"−":gbp+"円/GB";
-    let badges="";
-    if(p.price===minPrice&&p.price>0)badges+=`<span class="badge badge-best">最安</span> `;
-    if(gbp===minGbPrice&&gbp<99999)badges+=`<span class="badge badge-good">GB単価最安</span> `;
-    return`<tr>
-      <td class="provider-name">${{p.provider}}</td>
-      <td>${{p.plan_name}}</td>
-      <td class="price">${{p.price.toLocaleString()}}円</td>
-      <td>${{dataLabel}}</td>
-      <td class="gb-price">${{gbLabel}}</td>
-      <td style="text-align:left;font-size:.8rem">${{badges}}${{info.feature||""}}</td>
-      <td><a href="#" class="btn-official">公式サイト</a></td>
-    </tr>`;
-  }}).join("");
-}}
-init();
-</script>
-</body>
-</html>'''
-
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    out_path = os.path.join(OUTPUT_DIR, 'index.html')
-    with open(out_path, 'w', encoding='utf-8') as f:
-        f.write(html)
-
-    size = os.path.getsize(out_path)
-    print(f"  Generated: {out_path}")
-    print(f"  File size: {size:,} bytes")
+    enrich(plans)
+    page_defs = build_pages(plans)
+    results, removed = pages.render_pages(conn, page_defs, prune_prefix=PAGE_DIR_PATH + '/')
+    sitemap_changed = update_sitemap(conn, page_defs)
+
+    written = [r for r in results if r['written']]
+    print(f"  Pages: {len(results)} ({len(written)} written, {len(results) - len(written)} unchanged, "
+          f"{len(removed)} removed)")
+    for r in written:
+        print(f"  Generated: {r['path']} ({r['bytes']:,} bytes)")
+    print(f"  Sitemap: {'updated' if sitemap_changed else 'unchanged'}")
     print(f"  Plans: {len(plans)}")
 
 if __name__ == '__main__':
     print("=== SIM Comparison HTML Generator ===")
+    migrations.migrate(db.get_connection())
     generate()
     print("=== Done ===")
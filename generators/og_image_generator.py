@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""OGP画像の一括生成
+
+ビルドマニフェストに載っている output/tools/ の全ページについて、ページと同じディレクトリに
+og.png を描き、ページの <meta property="og:image"> をその画像に向ける（無ければ head に足す）。
+
+  格安SIM比較（一覧・事業者別・データ容量別）  見出しと最安3プラン（comparison_generator と同じページ定義）
+  それ以外（各ツール・サイトインデックス）      og:title（無ければ <title>）と og:description
+
+描画は common/cards.py（背景レイヤーを使い回し、枚数が多ければプロセスプールで並列）。
+文言・プランが前回と同じページは描き直さない。画像の URL には内容ハッシュを付けるので、
+画像が変わったときだけページの meta も書き換わる。
+"""
+import html
+import os
+import re
+import sqlite3
+import sys
+import time
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SITE_URL = 'https://ai-money-lab.github.io/benri-tools/'
+IMAGE_NAME = 'og.png'
+
+sys.path.insert(0, BASE_DIR)
+
+from common import cards, db, manifest, migrations
+from generators import comparison_generator
+
+# リストの先にある方を優先する（og: が無ければ <title> / description）
+TITLE_RES = [re.compile(r'<meta property="og:title" content="([^"]*)"'), re.compile(r'<title>(.*?)</title>', re.S)]
+DESCRIPTION_RES = [re.compile(r'<meta property="og:description" content="([^"]*)"'),
+                   re.compile(r'<meta name="description" content="([^"]*)"')]
+OG_IMAGE_RE = re.compile(r'<meta property="og:image" content="[^"]*">')
+OG_META_RE = re.compile(r'<meta property="og:[^"]*" content="[^"]*">')
+TWITTER_CARD_RE = re.compile(r'<meta name="twitter:card"')
+
+
+def image_path(page):
+    """ページ（BASE_DIR 相対）に対応する OGP 画像のパス"""
+    return page[:-len('index.html')] + IMAGE_NAME
+
+
+def meta_text(patterns, content):
+    for pattern in patterns:
+        m = pattern.search(content)
+        if m:
+            return html.unescape(m.group(1)).strip()
+    return ''
+
+
+def page_card(page, content):
+    return {'layout': 'og-tool', 'path': image_path(page),
+            'fields': {'title': meta_text(TITLE_RES, content), 'description': meta_text(DESCRIPTION_RES, content)}}
+
+
+def sim_cards(conn):
+    """格安SIM比較の各ページのカード {ページ: card}"""
+    c = conn.cursor()
+    c.row_factory = sqlite3.Row
+    plans = [dict(row) for row in c.execute(comparison_generator.PLANS_QUERY) if row['category'] == 'sim']
+    if not plans:
+        return {}
+    comparison_generator.enrich(plans)
+    result = {}
+    for pg in comparison_generator.build_pages(plans):
+        context = pg['context']
+        cheapest = sorted(context['plans'], key=lambda p: (p['price'] <= 0, p['price']))[:3]
+        fields = {
+            'heading': context['heading'], 'lead': context['lead'],
+            'plans': [[p['provider'], p['plan_name'], f"{p['price']:,.0f}円/月", p['data_label']]
+                      for p in cheapest],
+        }
+        # 日付は料金データの更新日（scraped_at）だけを入れる。実行日を入れると入力ハッシュが
+        # 毎日変わり、プランが同じでも全ページの画像を描き直すことになる
+        if any(p.get('scraped_at') for p in context['plans']):
+            updated = comparison_generator.data_date(context['plans'])
+            fields['date'] = f"{updated.year}年{updated.month}月{updated.day}日 データ更新"
+        result[pg['path']] = {'layout': 'og-sim', 'path': image_path(pg['path']), 'fields': fields}
+    return result
+
+
+def apply_meta(content, url):
+    """og:image を url に向けた内容を返す（twitter:card が無ければ大きい画像のカードにする）"""
+    tag = f'<meta property="og:image" content="{html.escape(url)}">'
+    if OG_IMAGE_RE.search(content):
+        return OG_IMAGE_RE.sub(lambda _: tag, content, count=1)
+    if not TWITTER_CARD_RE.search(content):
+        tag += '\n<meta name="twitter:card" content="summary_large_image">'
+    og = list(OG_META_RE.finditer(content))
+    if og:
+        return content[:og[-1].end()] + '\n' + tag + content[og[-1].end():]
+    if '</head>' not in content:
+        return None
+    return content.replace('</head>', tag + '\n</head>', 1)
+
+
+def generate(ctx=None):
+    conn = ctx.db if ctx else db.get_connection()
+    started = time.perf_counter()
+    page_paths = sorted(manifest.paths(conn, 'output/tools/%index.html'))
+    sims = sim_cards(conn)
+
+    contents, specs = {}, []
+    for page in page_paths:
+        with open(os.path.join(BASE_DIR, page), encoding='utf-8') as f:
+            contents[page] = f.read()
+        specs.append(sims.get(page) or page_card(page, contents[page]))
+
+    results = cards.render_cards(conn, specs)
+    manifest.record_digests(conn, [(r['path'], r['bytes'], r['sha256']) for r in results if r['written']])
+    rendered = time.perf_counter() - started
+
+    # ページが無くなった画像を消す
+    images = {path for path in manifest.paths(conn, manifest.ROOT + '%' + IMAGE_NAME)
+              if os.path.basename(path) == IMAGE_NAME}
+    stale = images - {spec['path'] for spec in specs}
+    for path in sorted(stale):
+        try:
+            os.remove(os.path.join(BASE_DIR, path))
+        except FileNotFoundError:
+            pass
+    manifest.remove(conn, stale)
+
+    updated = 0
+    for page, result in zip(page_paths, results):
+        url = SITE_URL + result['path'][len(manifest.ROOT):] + '?v=' + result['sha256'][:10]
+        new = apply_meta(contents[page], url)
+        if new is None:
+            print(f"  WARN: {page} (no </head>)")
+        elif new != contents[page]:
+            manifest.write_page(conn, os.path.join(BASE_DIR, page), new)
+            updated += 1
+
+    written = [r for r in results if r['written']]
+    print(f"  Images: {len(results)} ({len(written)} written, {len(results) - len(written)} unchanged, "
+          f"{len(stale)} removed) in {rendered:.2f}s")
+    for r in written:
+        print(f"  Generated: {r['path']} ({r['raw_bytes']:,} -> {r['bytes']:,} bytes)")
+    encoded = [r for r in results if r['raw_bytes'] is not None]
+    if encoded:
+        raw, size = sum(r['raw_bytes'] for r in encoded), sum(r['bytes'] for r in encoded)
+        print(f"  Encoded: {raw:,} -> {size:,} bytes (-{1 - size / raw:.0%}) for {len(encoded)} images")
+    print(f"  Pages: {updated} og:image updated")
+
+
+if __name__ == '__main__':
+    print("=== OG Image Generator ===")
+    migrations.migrate(db.get_connection())
+    generate()
+    print("=== Done ===")
@@ -1,170 +1,196 @@
 #!/usr/bin/env python3
-"""SNSランキング画像生成スクリプト"""
-import sqlite3
+"""SNS画像生成スクリプト
+
+描画は common/cards.py の登録済みレイアウトで行い（フォントは common/fonts.py で共有）、
+このスクリプトは DB からカードの中身と投稿文を作るだけ。カードの種類は CARDS に登録する:
+
+  sim-ranking     格安SIM 最安ランキング（上位5プラン）。daily_run.py が毎日描く
+  tool-highlight  今日のおすすめツール（ツールを1つ選ぶ）
+  og              output/tools/ の全ページの OGP 画像（generators/og_image_generator.py）
+
+画像のファイル名は日付入りだが、描く内容（上位プランや月など）が以前に描いた画像と同じなら
+新しいファイルは作らずにその画像を使い、social_posts.media_path もその画像を指す
+（価格が変わらない日は output/social/ にも git の履歴にも画像が増えない）。
+
+使い方:
+  python generators/social_image_generator.py                       # 日次分（sim-ranking）
+  python generators/social_image_generator.py tool-highlight og     # 指定したものだけ
+  python generators/social_image_generator.py --all --post          # SNS 投稿用を全部描き、投稿文を social_posts に下書き登録
+  python generators/social_image_generator.py --format webp         # PNG と並べて WebP も書き出す（avif も可）
+  python generators/social_image_generator.py --list                # 登録されているカードの一覧
+"""
+import argparse
 import os
+import random
 import sys
-from datetime import datetime
-
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'money_machine.db')
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '..', 'output', 'social')
-
-def find_japanese_font():
-    """日本語フォントを自動検出"""
-    font_candidates = [
-        # Windows
-        "C:/Windows/Fonts/msgothic.ttc",
-        "C:/Windows/Fonts/meiryo.ttc",
-        "C:/Windows/Fonts/YuGothR.ttc",
-        "C:/Windows/Fonts/YuGothM.ttc",
-        "C:/Windows/Fonts/yugothic.ttf",
-        # Mac
-        "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
-        "/System/Library/Fonts/Hiragino Sans GB.ttc",
-        "/Library/Fonts/Arial Unicode.ttf",
-        # Linux
-        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-        "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
-        "/usr/share/fonts/OTF/NotoSansCJK-Regular.ttc",
-        "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
-        "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
-        "/usr/share/fonts/ipa-gothic/ipag.ttf",
-        "/usr/share/fonts/truetype/ipafont-gothic/ipag.ttf",
-    ]
-    for path in font_candidates:
-        if os.path.exists(path):
-            return path
-    return None
-
-def generate():
-    try:
-        from PIL import Image, ImageDraw, ImageFont
-    except ImportError:
-        print("  WARNING: Pillow not installed. Run: pip install Pillow")
-        print("  Skipping image generation.")
-        return
-
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("""SELECT provider, plan_name, price, data_gb
-                 FROM comparison_data
-                 WHERE is_current = 1 AND category = 'sim' AND price > 0
-                 ORDER BY price ASC LIMIT 5""")
-    top5 = [dict(row) for row in c.fetchall()]
-    conn.close()
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+OUTPUT_DIR = os.path.join(BASE_DIR, 'output', 'social')
+SITE_URL = 'https://ai-money-lab.github.io/benri-tools/'
+
+sys.path.insert(0, BASE_DIR)
+
+from common import cards, db, fonts, migrations
+
+RANKING_QUERY = """SELECT provider, plan_name, price, data_gb
+                   FROM comparison_data
+                   WHERE is_current = 1 AND category = 'sim' AND price > 0
+                   ORDER BY price ASC LIMIT 5"""
+
+
+def fetch_sim_ranking(conn):
+    """料金の安い順に上位5プラン"""
+    return [dict(zip(('provider', 'plan_name', 'price', 'data_gb'), row)) for row in conn.execute(RANKING_QUERY)]
+
+
+def fetch_random_tool(conn):
+    rows = conn.execute('SELECT name, slug, category FROM tools').fetchall()
+    return dict(zip(('name', 'slug', 'category'), random.choice(rows))) if rows else None
+
+
+def insert_social_post(conn, content_type, content_text, media_path, scheduled_at):
+    """social_posts に下書きを1件登録して id を返す"""
+    with conn:
+        cur = conn.execute('''INSERT INTO social_posts
+                              (platform, content_type, content_text, media_path, status, scheduled_at)
+                              VALUES ('twitter', ?, ?, ?, 'draft', ?)''',
+                           (content_type, content_text, media_path, scheduled_at))
+    return cur.lastrowid
 
+
+def image_path(today, name):
+    return os.path.relpath(os.path.join(OUTPUT_DIR, f"{today.strftime('%Y-%m-%d')}_{name}.png"), BASE_DIR)
+
+
+def sim_ranking(conn, today):
+    """(カード, 投稿文)。プランが無ければ None"""
+    top5 = fetch_sim_ranking(conn)
     if not top5:
         print("  No data for ranking image.")
-        return
-
-    # Image setup
-    W, H = 1200, 675
-    img = Image.new('RGB', (W, H), '#FFFFFF')
-    draw = ImageDraw.Draw(img)
-
-    # Find font
-    font_path = find_japanese_font()
-
-    if font_path:
-        font_title = ImageFont.truetype(font_path, 36)
-        font_sub = ImageFont.truetype(font_path, 24)
-        font_rank = ImageFont.truetype(font_path, 32)
-        font_price = ImageFont.truetype(font_path, 28)
-        font_small = ImageFont.truetype(font_path, 18)
-    else:
-        print("  WARNING: No Japanese font found. Using default (English only).")
-        font_title = ImageFont.load_default()
-        font_sub = font_title
-        font_rank = font_title
-        font_price = font_title
-        font_small = font_title
-
-    # Header bar
-    draw.rectangle([(0, 0), (W, 90)], fill='#0d1b3e')
-    today = datetime.now()
-    title_text = "格安SIM 最安ランキング"
-    date_text = f"{today.year}年{today.month}月最新版"
-
-    # Center title
-    try:
-        bbox = draw.textbbox((0, 0), title_text, font=font_title)
-        tw = bbox[2] - bbox[0]
-    except:
-        tw = len(title_text) * 36
-    draw.text(((W - tw) // 2, 22), title_text, fill='#FFFFFF', font=font_title)
+        return None
+    card = {'layout': 'sim-ranking', 'path': image_path(today, 'sim_ranking'), 'reuse': True, 'fields': {
+        'date': f"{today.year}年{today.month}月最新版",
+        'plans': [[p['provider'], p['plan_name'], f"月額 {int(p['price']):,}円",
+                   f"{p['data_gb']}GB" if p['data_gb'] < 999 else "無制限"] for p in top5],
+    }}
+    lines = [f"{i}. {p['provider']} {p['plan_name']} ... {int(p['price']):,}円/月" for i, p in enumerate(top5[:3], 1)]
+    text = (f"【格安SIM月額ランキング】{today.strftime('%Y-%m-%d')} 更新\n\n"
+            + "\n".join(lines) + "\n\n"
+            f"全ランキング・比較ツールはこちら\n{SITE_URL}sim-comparison/\n\n"
+            "#格安SIM #スマホ料金 #通信費節約 #携帯乗り換え")
+    return card, text
+
+
+def tool_highlight(conn, today):
+    tool = fetch_random_tool(conn)
+    if not tool:
+        print("  No tools for highlight image.")
+        return None
+    url = f"{SITE_URL}{tool['slug']}/"
+    card = {'layout': 'tool-highlight', 'path': image_path(today, 'tool_highlight'), 'reuse': True, 'fields': {
+        'name': tool['name'], 'category': tool['category'], 'url': url, 'date': today.strftime('%Y-%m-%d'),
+    }}
+    text = (f"【無料ツール紹介】{tool['name']}\n\n"
+            f"{tool['category']}カテゴリの便利ツールです。\n"
+            "ブラウザだけで使えて、インストール不要。\n\n"
+            f"{url}\n\n"
+            "#無料ツール #家計管理 #節約 #マネーツール")
+    return card, text
+
+
+# 名前: (カードと投稿文を作る関数, 投稿予定時刻の何時間後か)
+CARDS = {
+    'sim-ranking': (sim_ranking, 1),
+    'tool-highlight': (tool_highlight, 3),
+}
+DAILY = ['sim-ranking']
+
+
+def run(conn, names, post=False, ctx=None, formats=()):
+    """names のカードを描き、post なら投稿文を social_posts に登録する。描いた枚数を返す
+
+    formats（'webp' / 'avif'）を渡すと PNG と並べてその形式でも書き出す。
+    """
+    if 'og' in names:
+        from generators import og_image_generator
+        og_image_generator.generate(ctx)
+    names = [name for name in names if name != 'og']
+    if not names:
+        return 0
 
-    # Date subtitle
     try:
-        bbox2 = draw.textbbox((0, 0), date_text, font=font_small)
-        tw2 = bbox2[2] - bbox2[0]
-    except:
-        tw2 = len(date_text) * 18
-    draw.text(((W - tw2) // 2, 68), date_text, fill='#aabbcc', font=font_small)
-
-    # Rankings
-    medals = ['🥇', '🥈', '🥉', '4.', '5.']
-    # Since emoji rendering may not work, use text alternatives
-    rank_labels = ['1位', '2位', '3位', '4位', '5位']
-    rank_colors = ['#FFD700', '#C0C0C0', '#CD7F32', '#666666', '#666666']
-    bg_colors = ['#FFF8E1', '#F5F5F5', '#FFF3E0', '#FAFAFA', '#FAFAFA']
-
-    y_start = 110
-    row_h = 100
-
-    for i, plan in enumerate(top5):
-        y = y_start + i * row_h
-
-        # Row background
-        draw.rectangle([(40, y), (W - 40, y + row_h - 10)], fill=bg_colors[i], outline='#E0E0E0')
-
-        # Rank circle
-        cx, cy = 100, y + (row_h - 10) // 2
-        r = 28
-        draw.ellipse([(cx - r, cy - r), (cx + r, cy + r)], fill=rank_colors[i])
-        try:
-            bbox_r = draw.textbbox((0, 0), rank_labels[i], font=font_sub)
-            rw = bbox_r[2] - bbox_r[0]
-            rh = bbox_r[3] - bbox_r[1]
-        except:
-            rw, rh = 48, 24
-        draw.text((cx - rw // 2, cy - rh // 2 - 2), rank_labels[i], fill='#FFFFFF', font=font_sub)
-
-        # Provider name
-        draw.text((160, y + 12), plan['provider'], fill='#1a1a1a', font=font_rank)
-
-        # Plan name
-        draw.text((160, y + 52), plan['plan_name'], fill='#666666', font=font_small)
-
-        # Price
-        price_text = f"月額 {int(plan['price']):,}円"
-        try:
-            bbox_p = draw.textbbox((0, 0), price_text, font=font_price)
-            pw = bbox_p[2] - bbox_p[0]
-        except:
-            pw = len(price_text) * 28
-        draw.text((W - 80 - pw, y + 25), price_text, fill='#1a73e8', font=font_price)
-
-        # Data
-        data_text = f"{plan['data_gb']}GB" if plan['data_gb'] < 999 else "無制限"
-        draw.text((W - 80 - pw, y + 60), data_text, fill='#888888', font=font_small)
-
-    # Footer
-    draw.rectangle([(0, H - 50), (W, H)], fill='#f5f5f5')
-    footer_text = "※税込価格 ｜ 最新情報は公式サイトをご確認ください"
-    draw.text((40, H - 38), footer_text, fill='#999999', font=font_small)
-
-    # Save
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    filename = f"{today.strftime('%Y-%m-%d')}_sim_ranking.png"
-    out_path = os.path.join(OUTPUT_DIR, filename)
-    img.save(out_path, 'PNG')
-
-    size = os.path.getsize(out_path)
-    print(f"  Generated: {out_path}")
-    print(f"  File size: {size:,} bytes")
-    print(f"  Resolution: {W}x{H}")
+        import PIL  # noqa: F401
+    except ImportError:
+        print("  WARNING: Pillow not installed. Run: pip install Pillow")
+        print("  Skipping image generation.")
+        return 0
+    if not fonts.font_path():
+        print("  WARNING: No Japanese font found. Using default (English only).")
 
-if __name__ == '__main__':
+    now = datetime.now()
+    made = []
+    for name in names:
+        built = CARDS[name][0](conn, now)
+        if built:
+            made.append((name, *built))
+    results = cards.render_cards(conn, [card for _, card, _ in made], formats=formats)
+    for (name, card, text), result in zip(made, results):
+        if result['path'] != card['path']:
+            print(f"  Reused: {result['path']} (inputs unchanged, {card['path']} not written)")
+        else:
+            print(f"  {'Generated' if result['written'] else 'Unchanged'}: {os.path.join(BASE_DIR, result['path'])}")
+            print(f"  File size: {size_report(result)}")
+            for fmt, size in result['extras'].items():
+                print(f"  {fmt.upper()}: {size:,} bytes")
+        if post:
+            scheduled_at = (now + timedelta(hours=CARDS[name][1])).strftime('%Y-%m-%d %H:%M:%S')
+            post_id = insert_social_post(conn, name, text, result['path'].replace(os.sep, '/'), scheduled_at)
+            print(f"  -> social_posts に登録 (id={post_id})")
+    return len(results)
+
+
+def size_report(result):
+    """「減色・最適化前 -> 後」のバイト数（描かなかった画像は今のバイト数だけ）"""
+    if result['raw_bytes'] is None:
+        return f"{result['bytes']:,} bytes"
+    saved = 1 - result['bytes'] / result['raw_bytes']
+    return f"{result['raw_bytes']:,} -> {result['bytes']:,} bytes (-{saved:.0%})"
+
+
+def generate(ctx=None):
+    """daily_run.py から呼ばれる日次分"""
+    run(ctx.db if ctx else db.get_connection(), DAILY, ctx=ctx)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SNS・OGP 画像の生成')
+    parser.add_argument('names', nargs='*', metavar='CARD', help=f"{', '.join([*CARDS, 'og'])}（省略時は日次分）")
+    parser.add_argument('--all', action='store_true', help='登録されている全カード（og を除く）')
+    parser.add_argument('--post', action='store_true', help='投稿文を social_posts に下書き登録する')
+    parser.add_argument('--format', action='append', default=[], choices=list(cards.EXTRA_FORMATS),
+                        help='PNG と並べてこの形式でも書き出す（複数指定可）')
+    parser.add_argument('--list', action='store_true', help='カードの一覧を表示して終了')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in [*CARDS, 'og']:
+            print(f"  {name}{' (daily)' if name in DAILY else ''}")
+        return 0
+    names = list(CARDS) if args.all else args.names or DAILY
+    unknown = [name for name in names if name not in CARDS and name != 'og']
+    if unknown:
+        parser.error(f"unknown card: {', '.join(unknown)}")
+    unsupported = [fmt for fmt in args.format if fmt not in cards.available_formats()]
+    if unsupported:
+        parser.error(f"this Pillow cannot write: {', '.join(unsupported)}")
     print("=== Social Image Generator ===")
-    generate()
+    conn = db.get_connection()
+    migrations.migrate(conn)
+    run(conn, names, args.post, formats=args.format)
     print("=== Done ===")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
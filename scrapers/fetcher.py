@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""非同期HTTPフェッチ層
+
+asyncio で複数URLを同時に取得する。実際のHTTP通信は requests.Session を
+asyncio.to_thread で呼び出して行い、Session のコネクションプール（keep-alive）を
+全リクエストで共有する。
+
+- ホストごとの同時接続数を PER_HOST_LIMIT に制限
+- 全体の締め切り（deadline 秒）を過ぎたリクエストは打ち切ってエラー扱い。
+  各リクエストの timeout も締め切りまでの残り時間に縮めるので、ワーカースレッドも
+  締め切り後すぐに終わり、asyncio.run の終了処理で待たされない
+- 失敗は例外を投げずに FetchResult.error に入れて返す（呼び出し側でフォールバック）
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+REQUEST_TIMEOUT = 10
+MIN_TIMEOUT = 0.1  # 締め切り間際に始まったリクエストにも最低限与える timeout（秒）
+PER_HOST_LIMIT = 2
+POOL_SIZE = 16
+USER_AGENT = 'Mozilla/5.0 (compatible; MoneyMachineBot/1.0; +https://ai-money-lab.github.io/benri-tools/)'
+
+
+class FetchResult:
+    def __init__(self, url, status=None, text=None, headers=None, error=None, elapsed=0.0):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.headers = headers or {}
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None and self.status is not None and 200 <= self.status < 400
+
+
+class Fetcher:
+    """共有コネクションプール付きの非同期フェッチャー
+
+    fetcher = Fetcher()
+    results = asyncio.run(fetcher.fetch_all(urls, deadline=20))
+    """
+
+    def __init__(self, per_host=PER_HOST_LIMIT, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = timeout
+        self.per_host = per_host
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._host_limits = {}
+
+    def _get(self, url, headers=None, deadline_at=None):
+        started = time.perf_counter()
+        timeout = self.timeout
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                return FetchResult(url, error="deadline exceeded before request started")
+            timeout = min(timeout, max(remaining, MIN_TIMEOUT))
+        try:
+            resp = self.session.get(url, headers=headers, timeout=timeout)
+            resp.encoding = resp.encoding if resp.encoding and resp.encoding.lower() != 'iso-8859-1' \
+                else resp.apparent_encoding
+            return FetchResult(url, resp.status_code, resp.text, dict(resp.headers),
+                               elapsed=time.perf_counter() - started)
+        except Exception as e:
+            return FetchResult(url, error=f"{type(e).__name__}: {e}", elapsed=time.perf_counter() - started)
+
+    async def fetch(self, url, headers=None, deadline_at=None):
+        """deadline_at は time.monotonic() 基準の締め切り時刻。リクエストの timeout を残り時間に縮める"""
+        host = urlsplit(url).netloc
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with limit:
+            return await asyncio.to_thread(self._get, url, headers, deadline_at)
+
+    async def fetch_all(self, urls, deadline, headers=None):
+        """{url: FetchResult} を返す。deadline 秒以内に終わらなかったURLはエラー扱い
+
+        headers は {url: 追加ヘッダー} で、URLごとに条件付きリクエスト等に使う。
+        """
+        headers = headers or {}
+        deadline_at = time.monotonic() + deadline
+        tasks = {url: asyncio.create_task(self.fetch(url, headers.get(url), deadline_at)) for url in urls}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=deadline)
+        results = {}
+        for url, task in tasks.items():
+            if task.done():
+                results[url] = task.result()
+            else:
+                task.cancel()
+                results[url] = FetchResult(url, error=f"deadline exceeded ({deadline}s)", elapsed=deadline)
+        return results
+
+    def close(self):
+        self.session.close()
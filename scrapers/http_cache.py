@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""取得したページのディスクキャッシュ（data/http_cache/）
+
+URL ごとに <sha256(url)>.json を1ファイル保存する:
+  url / etag / last_modified / body_sha256 / body / prices（解析済みの {plan_name: price}）
+
+- 次回の取得では If-None-Match / If-Modified-Since を付けて条件付きリクエストにする
+- 304、または本文のハッシュが前回と同じなら解析をせず prices を再利用する
+- 合計サイズが max_bytes を超えたら、最後に使われたのが古い順に削除する
+"""
+import hashlib
+import json
+import os
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_DIR = os.path.join(BASE_DIR, 'data', 'http_cache')
+MAX_BYTES = 20 * 1024 * 1024
+
+
+def body_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = {'not_modified': 0, 'same_body': 0, 'miss': 0, 'evicted': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        """キャッシュ済みエントリ（無ければ None）。読んだエントリは最終利用時刻を更新する"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def lookup(self, entry, result):
+        """取得結果から再利用できる prices を返す。解析が必要なら None
+
+        304 か、本文ハッシュが前回と同じならヒット。
+        """
+        if entry is None or 'prices' not in entry:
+            self.stats['miss'] += 1
+            return None
+        if result.status == 304:
+            self.stats['not_modified'] += 1
+            return entry['prices']
+        if result.text is not None and body_hash(result.text) == entry.get('body_sha256'):
+            self.stats['same_body'] += 1
+            return entry['prices']
+        self.stats['miss'] += 1
+        return None
+
+    def put(self, key, result, prices):
+        headers = {k.lower(): v for k, v in result.headers.items()}
+        entry = {
+            'url': result.url,
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'body_sha256': body_hash(result.text),
+            'body': result.text,
+            'prices': prices,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def evict(self):
+        """合計サイズが max_bytes 以下になるまで、最終利用の古いエントリから削除する"""
+        if not os.path.isdir(self.directory):
+            return 0
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.json') and os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.stats['evicted'] += 1
+        return total
+
+    def summary(self, total_bytes):
+        s = self.stats
+        return (f"HTTP cache: {s['not_modified'] + s['same_body']} hit "
+                f"({s['not_modified']} not modified, {s['same_body']} same body), "
+                f"{s['miss']} miss, {s['evicted']} evicted, {total_bytes / 1024:.0f}KB on disk")
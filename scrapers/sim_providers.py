@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""格安SIM各社の料金ページ定義とパーサー
+
+PROVIDERS の1要素が1社分のパーサー定義:
+  provider  comparison_data.provider に入れる名前（FALLBACK_DATA と同じ表記）
+  slug      フィクスチャのファイル名（fixtures/sim/<slug>.html）
+  url       料金ページ
+  plans     [(plan_name, ラベル正規表現), ...]
+            ページ本文でラベルの直後 PRICE_WINDOW 文字以内にある「N円」をそのプランの料金とみなす
+  catalog   FALLBACK_DATA に無い事業者だけ: {plan_name: (data_gb, data_json)}
+
+独自の解析が必要な事業者は 'parse': 関数(text) -> {plan_name: price} で差し替えられる。
+"""
+import json
+import re
+import unicodedata
+
+PRICE_WINDOW = 160
+_PRICE_RE = re.compile(r'(\d{1,3}(?:,\d{3})+|\d+)\s*円')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _info(call, feature):
+    return json.dumps({"call": call, "feature": feature}, ensure_ascii=False)
+
+
+PROVIDERS = [
+    {"provider": "楽天モバイル", "slug": "rakuten",
+     "url": "https://network.mobile.rakuten.co.jp/fee/saikyo-plan/",
+     "plans": [("Rakuten最強プラン 〜3GB", r"3GBまで"),
+               ("Rakuten最強プラン 3〜20GB", r"20GBまで"),
+               ("Rakuten最強プラン 20GB〜無制限", r"20GB超過後|無制限")]},
+    {"provider": "ahamo", "slug": "ahamo",
+     "url": "https://ahamo.com/plan/",
+     "plans": [("ahamo 20GB", r"ahamo\s*20GB|月\s*20GB"),
+               ("ahamo大盛り 100GB", r"大盛り")]},
+    {"provider": "LINEMO", "slug": "linemo",
+     "url": "https://www.linemo.jp/plan/",
+     "plans": [("ミニプラン 3GB", r"ミニプラン"),
+               ("スマホプラン 20GB", r"スマホプラン"),
+               ("ベストプラン 3GB", r"ベストプラン(?!V)")]},
+    {"provider": "povo", "slug": "povo",
+     "url": "https://povo.jp/spec/",
+     "plans": [("povo2.0 基本料", r"基本料"),
+               ("povo2.0 3GB/30日", r"3GB\s*[(（/]?\s*30日"),
+               ("povo2.0 20GB/30日", r"20GB\s*[(（/]?\s*30日"),
+               ("povo2.0 60GB/90日", r"60GB\s*[(（/]?\s*90日")]},
+    {"provider": "UQモバイル", "slug": "uqmobile",
+     "url": "https://www.uqwimax.jp/mobile/plan/",
+     "plans": [("ミニミニプラン 4GB", r"ミニミニプラン"),
+               ("トクトクプラン 15GB", r"トクトクプラン"),
+               ("コミコミプラン 20GB", r"コミコミプラン")]},
+    {"provider": "ワイモバイル", "slug": "ymobile",
+     "url": "https://www.ymobile.jp/plan/",
+     "plans": [("シンプル2 S 4GB", r"シンプル2\s*S"),
+               ("シンプル2 M 20GB", r"シンプル2\s*M"),
+               ("シンプル2 L 30GB", r"シンプル2\s*L")]},
+    {"provider": "IIJmio", "slug": "iijmio",
+     "url": "https://www.iijmio.jp/gigaplan/",
+     "plans": [("2ギガプラン", r"2ギガ"),
+               ("5ギガプラン", r"5ギガ"),
+               ("10ギガプラン", r"10ギガ"),
+               ("15ギガプラン", r"15ギガ"),
+               ("20ギガプラン", r"20ギガ")]},
+    {"provider": "mineo", "slug": "mineo",
+     "url": "https://mineo.jp/charge/",
+     "plans": [("マイピタ 1GB", r"マイピタ\s*1GB|(?<!\d)1GB"),
+               ("マイピタ 5GB", r"マイピタ\s*5GB|(?<!\d)5GB"),
+               ("マイピタ 10GB", r"マイピタ\s*10GB|10GB"),
+               ("マイピタ 20GB", r"マイピタ\s*20GB|20GB"),
+               ("マイそく スタンダード", r"スタンダード")]},
+    {"provider": "日本通信SIM", "slug": "nihontsushin",
+     "url": "https://www.nihontsushin.com/",
+     "plans": [("合理的シンプル290 1GB", r"シンプル290"),
+               ("合理的みんなのプラン 10GB", r"みんなのプラン"),
+               ("合理的30GBプラン", r"30GBプラン")]},
+    {"provider": "NUROモバイル", "slug": "nuro",
+     "url": "https://mobile.nuro.jp/plan/",
+     "plans": [("VSプラン 3GB", r"VSプラン"),
+               ("VMプラン 5GB", r"VMプラン"),
+               ("VLプラン 10GB", r"VLプラン"),
+               ("NEOプラン 20GB", r"NEOプラン(?!W)"),
+               ("NEOプランW 40GB", r"NEOプランW")]},
+    # 以下は FALLBACK_DATA に無い事業者。取得できた日だけプランが載る
+    {"provider": "BIGLOBEモバイル", "slug": "biglobe",
+     "url": "https://join.biglobe.ne.jp/mobile/plan/",
+     "plans": [("プランR 1ギガ", r"1ギガ"),
+               ("プランR 3ギガ", r"3ギガ"),
+               ("プランR 6ギガ", r"6ギガ")],
+     "catalog": {"プランR 1ギガ": (1.0, _info("別途オプション", "ドコモ/au回線、エンタメフリー対応")),
+                 "プランR 3ギガ": (3.0, _info("別途オプション", "ドコモ/au回線、エンタメフリー対応")),
+                 "プランR 6ギガ": (6.0, _info("別途オプション", "ドコモ/au回線、エンタメフリー対応"))}},
+    {"provider": "J:COMモバイル", "slug": "jcom",
+     "url": "https://www.jcom.co.jp/service/mobile/plan/",
+     "plans": [("データ盛 1GB", r"(?<!\d)1GB"),
+               ("データ盛 5GB", r"(?<!\d)5GB"),
+               ("データ盛 10GB", r"10GB"),
+               ("データ盛 20GB", r"20GB")],
+     "catalog": {"データ盛 1GB": (1.0, _info("別途オプション", "au回線、J:COMセット割")),
+                 "データ盛 5GB": (5.0, _info("別途オプション", "au回線、J:COMセット割")),
+                 "データ盛 10GB": (10.0, _info("別途オプション", "au回線、J:COMセット割")),
+                 "データ盛 20GB": (20.0, _info("別途オプション", "au回線、J:COMセット割"))}},
+    {"provider": "LIBMO", "slug": "libmo",
+     "url": "https://www.libmo.jp/price/",
+     "plans": [("なっとくプラン 3GB", r"(?<!\d)3GB"),
+               ("なっとくプラン 8GB", r"8GB"),
+               ("なっとくプラン 20GB", r"20GB"),
+               ("なっとくプラン 30GB", r"30GB")],
+     "catalog": {"なっとくプラン 3GB": (3.0, _info("別途オプション", "ドコモ回線、TOKAIグループ")),
+                 "なっとくプラン 8GB": (8.0, _info("別途オプション", "ドコモ回線、TOKAIグループ")),
+                 "なっとくプラン 20GB": (20.0, _info("別途オプション", "ドコモ回線、TOKAIグループ")),
+                 "なっとくプラン 30GB": (30.0, _info("別途オプション", "ドコモ回線、TOKAIグループ"))}},
+]
+
+
+def page_text(html):
+    """HTML から比較用のプレーンテキストを作る（全角数字・記号は NFKC で半角に寄せる）"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript']):
+        tag.decompose()
+    text = unicodedata.normalize('NFKC', soup.get_text(' '))
+    return _SPACE_RE.sub(' ', text)
+
+
+def price_after(text, label, window=PRICE_WINDOW):
+    """label にマッチした位置から window 文字以内の最初の「N円」を整数で返す。無ければ None"""
+    for m in re.finditer(label, text):
+        p = _PRICE_RE.search(text, m.end(), m.end() + window)
+        if p:
+            return int(p.group(1).replace(',', ''))
+    return None
+
+
+def parse(spec, html):
+    """1社分のページを解析して {plan_name: price} を返す（見つからないプランは含めない）"""
+    text = page_text(html)
+    if 'parse' in spec:
+        return spec['parse'](text)
+    prices = {}
+    for plan_name, label in spec['plans']:
+        price = price_after(text, label)
+        if price is not None:
+            prices[plan_name] = price
+    return prices
@@ -1,11 +1,33 @@
 #!/usr/bin/env python3
-"""格安SIM料金データ収集スクリプト（フォールバック辞書優先）"""
-import sqlite3
+"""格安SIM料金データ収集スクリプト
+
+各社の料金ページ（sim_providers.PROVIDERS）を並行取得して解析し、
+取得・解析できなかった事業者やプランは FALLBACK_DATA で補う。
+
+  python scrapers/sim_scraper.py                  各社ページを取得
+  python scrapers/sim_scraper.py --offline        FALLBACK_DATA のみ（通信しない）
+  python scrapers/sim_scraper.py --fixtures DIR   DIR/<slug>.html をローカルHTTPサーバーから取得
+"""
+import argparse
+import asyncio
+import functools
 import os
 import json
+import sys
+import threading
+import time
 from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'money_machine.db')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common import db, migrations
+from http_cache import HttpCache
+from sim_providers import PROVIDERS, parse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'sim')
+FETCH_DEADLINE = 30  # 全社分の取得の締め切り（秒）
+FALLBACK_SOURCE = 'fallback_dictionary'
 
 # 2025-2026年時点の主要格安SIM料金データ（税込）
 FALLBACK_DATA = [
@@ -93,25 +115,194 @@ FALLBACK_DATA = [
      "data_json": json.dumps({"call": "別途オプション", "feature": "大容量、NEOデータフリー"}, ensure_ascii=False)},
 ]
 
-def run_scraper():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def upsert_plans(conn, plans, category='sim', now=None, keep_providers=()):
+    """プラン一覧を (category, provider, plan_name) 単位で差分反映する
+
+    - 料金・容量・詳細が同じプラン: last_seen_at だけ更新（source_url は実際に取得できた時だけ更新し、
+      フォールバックで補った回に実URLを FALLBACK_SOURCE で上書きしない）
+    - 変わったプラン: 旧行を is_current = 0 で閉じ、新しい行を追加
+    - 今回見つからなかったプラン: is_current = 0 で退役
+      （keep_providers に含まれる事業者は取得失敗扱いで、既存の行をそのまま残す）
+    全て1トランザクション内の executemany で行い、{件数種別: 件数} を返す。
+    スキーマは最新（migrations.migrate 済み）である前提。
+    """
+    now = now or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    current = {}
+    duplicates = []
+    for row in conn.execute(
+            """SELECT id, provider, plan_name, price, data_gb, data_json
+               FROM comparison_data
+               WHERE category = ? AND is_current = 1
+               ORDER BY id DESC""", (category,)):
+        key = (row[1], row[2])
+        if key in current:
+            duplicates.append((row[0],))  # 旧方式で重複した行は古い方を閉じる
+        else:
+            current[key] = row
+
+    seen, changed, inserts = [], [], []
+    incoming = set()
+    for plan in plans:
+        key = (plan['provider'], plan['plan_name'])
+        incoming.add(key)
+        values = (plan['price'], plan['data_gb'], plan['data_json'])
+        row = current.get(key)
+        if row is not None and (row[3], row[4], row[5]) == values:
+            source_url = None if plan['source_url'] == FALLBACK_SOURCE else plan['source_url']
+            seen.append((now, source_url, row[0]))
+            continue
+        if row is not None:
+            changed.append((row[0],))
+        inserts.append((category, plan['provider'], plan['plan_name'], plan['price'], plan['data_gb'],
+                        plan['data_json'], plan['source_url'], now, now))
+    retired = [(row[0],) for key, row in current.items()
+               if key not in incoming and key[0] not in keep_providers]
+
+    with conn:
+        conn.executemany('UPDATE comparison_data SET last_seen_at = ?, source_url = COALESCE(?, source_url) '
+                         'WHERE id = ?', seen)
+        conn.executemany('UPDATE comparison_data SET is_current = 0 WHERE id = ?',
+                         changed + retired + duplicates)
+        conn.executemany('''INSERT INTO comparison_data
+                            (category, provider, plan_name, price, data_gb, data_json, source_url,
+                             scraped_at, last_seen_at, is_current)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)''', inserts)
+
+    return {
+        'unchanged': len(seen),
+        'changed': len(changed),
+        'new': len(inserts) - len(changed),
+        'retired': len(retired),
+    }
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_fixtures(directory):
+    """directory を配信するローカルHTTPサーバーを別スレッドで起動し (server, base_url) を返す"""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def fetch_pages(urls, deadline=FETCH_DEADLINE, headers=None):
+    """urls を並行取得して {url: FetchResult} を返す。headers は {url: 追加ヘッダー}"""
+    from fetcher import Fetcher
 
-    # 既存データをis_current=0に
-    c.execute("UPDATE comparison_data SET is_current = 0 WHERE category = 'sim'")
+    fetcher = Fetcher()
+    try:
+        return asyncio.run(fetcher.fetch_all(urls, deadline, headers))
+    finally:
+        fetcher.close()
 
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    inserted = 0
 
+def collect_plans(offline=False, fixtures=None, deadline=FETCH_DEADLINE):
+    """各社ページを取得・解析し (plans, keep_providers) を返す
+
+    ページが取れなかった事業者・料金が読めなかったプランは FALLBACK_DATA の値を使う。
+    FALLBACK_DATA にも無い事業者が取得失敗した場合は keep_providers に入れ、既存の行を残す。
+    取得は HttpCache を使った条件付きリクエストで、変わっていないページは解析しない。
+    """
+    fallback = {}
     for plan in FALLBACK_DATA:
-        c.execute('''INSERT INTO comparison_data
-                     (category, provider, plan_name, price, data_gb, data_json, source_url, scraped_at, is_current)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)''',
-                  ('sim', plan['provider'], plan['plan_name'], plan['price'],
-                   plan['data_gb'], plan['data_json'], 'fallback_dictionary', now))
-        inserted += 1
+        fallback.setdefault(plan['provider'], []).append(plan)
+
+    urls, keys = {}, {}
+    server = None
+    if not offline:
+        if fixtures:
+            server, base = serve_fixtures(fixtures)
+            urls = {spec['provider']: f"{base}/{spec['slug']}.html" for spec in PROVIDERS}
+            # ポートは毎回変わるので、キャッシュのキーはファイル名にする
+            keys = {spec['provider']: f"fixture:{spec['slug']}" for spec in PROVIDERS}
+        else:
+            urls = {spec['provider']: spec['url'] for spec in PROVIDERS}
+            keys = dict(urls)
+
+    cache = HttpCache()
+    entries = {provider: cache.get(key) for provider, key in keys.items()}
+    results = {}
+    if urls:
+        headers = {urls[provider]: cache.conditional_headers(entry) for provider, entry in entries.items()}
+        started = time.perf_counter()
+        try:
+            results = fetch_pages(list(urls.values()), deadline, headers)
+        except ImportError as e:
+            print(f"  WARNING: {e} - using fallback data")
+        elapsed = time.perf_counter() - started
+        if server:
+            server.shutdown()
+        slowest = max((r.elapsed for r in results.values()), default=0)
+        print(f"  Fetched {len(results)} pages in {elapsed:.2f}s (slowest {slowest:.2f}s)")
+
+    plans, keep_providers = [], set()
+    for spec in PROVIDERS:
+        provider = spec['provider']
+        known = {p['plan_name']: p for p in fallback.pop(provider, [])}
+        for plan_name, (data_gb, data_json) in spec.get('catalog', {}).items():
+            known.setdefault(plan_name, {'provider': provider, 'plan_name': plan_name, 'price': None,
+                                         'data_gb': data_gb, 'data_json': data_json})
+
+        result = results.get(urls.get(provider))
+        prices, reason = {}, 'offline' if offline else 'not fetched'
+        if result is not None and result.ok:
+            cached = cache.lookup(entries.get(provider), result)
+            if cached is not None:
+                prices, reason = cached, 'no prices found (cached)'
+            else:
+                try:
+                    prices = parse(spec, result.text)
+                    reason = 'no prices found'
+                    cache.put(keys[provider], result, prices)
+                except Exception as e:
+                    reason = f"parse error: {e}"
+        elif result is not None:
+            reason = result.error or f"HTTP {result.status}"
+
+        parsed = 0
+        for plan_name, plan in known.items():
+            price = prices.get(plan_name)
+            if price is not None and _plausible(price, plan['price']):
+                plans.append(dict(plan, price=price, source_url=spec['url']))
+                parsed += 1
+            elif plan['price'] is not None:
+                plans.append(dict(plan, source_url=FALLBACK_SOURCE))
+        if parsed == 0 and not any(p['price'] is not None for p in known.values()):
+            keep_providers.add(provider)
+        if not offline:
+            status = f"{parsed}/{len(known)} parsed" if parsed else f"fallback ({reason})"
+            print(f"  {provider}: {status}")
+
+    if urls:
+        print(f"  {cache.summary(cache.evict())}")
+
+    # PROVIDERS に定義の無い事業者は FALLBACK_DATA のまま
+    for rest in fallback.values():
+        plans.extend(dict(plan, source_url=FALLBACK_SOURCE) for plan in rest)
+    return plans, keep_providers
 
-    conn.commit()
+
+def _plausible(price, reference):
+    """読み取った料金が前回値（FALLBACK_DATA）から大きく外れていないか"""
+    if reference is None:
+        return 100 <= price <= 20000
+    if reference == 0:
+        return price == 0
+    return reference / 2 <= price <= reference * 2
+
+
+def run_scraper(ctx=None, offline=False, fixtures=None):
+    """各社の料金を comparison_data に差分反映する。ctx があればその DB 接続を使う"""
+    plans, keep_providers = collect_plans(offline=offline, fixtures=fixtures)
+
+    conn = ctx.db if ctx else db.get_connection()
+    c = conn.cursor()
+    counts = upsert_plans(conn, plans, keep_providers=keep_providers)
 
     # 確認
     c.execute("SELECT COUNT(*) FROM comparison_data WHERE is_current = 1 AND category = 'sim'")
@@ -119,12 +310,20 @@ def run_scraper():
     c.execute("SELECT COUNT(DISTINCT provider) FROM comparison_data WHERE is_current = 1 AND category = 'sim'")
     providers = c.fetchone()[0]
 
-    conn.close()
-
-    print(f"  Inserted: {inserted} plans")
+    fetched = sum(1 for plan in plans if plan['source_url'] != FALLBACK_SOURCE)
+    print(f"  Plans: {len(plans)} ({fetched} from provider pages, {len(plans) - fetched} fallback)")
+    print(f"  Unchanged: {counts['unchanged']}, changed: {counts['changed']}, "
+          f"new: {counts['new']}, retired: {counts['retired']}")
     print(f"  Current active: {current} plans from {providers} providers")
 
 if __name__ == '__main__':
-    print("=== SIM Scraper (Fallback Data) ===")
-    run_scraper()
+    parser = argparse.ArgumentParser(description='格安SIM料金データ収集')
+    parser.add_argument('--offline', action='store_true', help='通信せず FALLBACK_DATA だけを反映する')
+    parser.add_argument('--fixtures', nargs='?', const=FIXTURES_DIR, metavar='DIR',
+                        help='保存済みHTMLをローカルHTTPサーバーから取得する（既定: scrapers/fixtures/sim）')
+    args = parser.parse_args()
+
+    print("=== SIM Scraper ===")
+    migrations.migrate(db.get_connection())  # daily_run では実行前に migrate_db 済み
+    run_scraper(offline=args.offline, fixtures=args.fixtures)
     print("=== Done ===")
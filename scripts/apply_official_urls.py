@@ -1,328 +1,53 @@
 #!/usr/bin/env python3
-"""全ツールのhref="#"を公式サイトURLに一括置換するスクリプト"""
-import os
-import re
-import json
-
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-TOOLS_DIR = os.path.join(BASE_DIR, 'output', 'tools')
-CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'affiliate_links.json')
-
-with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-    config = json.load(f)
-
-def get_url(key):
-    return config.get(key, {}).get('url', '#')
-
-def replace_in_file(filepath, replacements):
-    """replacements: list of (old_str, new_str)"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    changed = 0
-    for old, new in replacements:
-        if old in content:
-            content = content.replace(old, new, 1)
-            changed += 1
-
-    if changed:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-    return changed
-
-def fix_salary_calculator():
-    fp = os.path.join(TOOLS_DIR, 'salary-calculator', 'index.html')
-    return replace_in_file(fp, [
-        # LHH転職エージェント - 1つ目のhref="#"
-        ('年収アップを目指すなら【LHH転職エージェント】</div>\n    <div class="af-text">アデコグループのハイクラス転職支援。年収・働き方・やりがいすべてにこだわる転職を無料サポート。</div>\n    <a href="#"',
-         f'年収アップを目指すなら【LHH転職エージェント】</div>\n    <div class="af-text">アデコグループのハイクラス転職支援。年収・働き方・やりがいすべてにこだわる転職を無料サポート。</div>\n    <a href="{get_url("lhh_agent")}"'),
-        # ピタテン - 2つ目のhref="#"
-        ('未経験からでも正社員転職【ピタテン】</div>\n    <div class="af-text">面談実施で手厚いサポート。未経験でも年収UP・正社員転職の実績多数。</div>\n    <a href="#"',
-         f'未経験からでも正社員転職【ピタテン】</div>\n    <div class="af-text">面談実施で手厚いサポート。未経験でも年収UP・正社員転職の実績多数。</div>\n    <a href="{get_url("pitaten")}"'),
-    ])
-
-def fix_unemployment_benefit():
-    fp = os.path.join(TOOLS_DIR, 'unemployment-benefit', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    # ピタテン
-    content = content.replace(
-        'ピタテン</span></div>\n          <p class="af-desc">',
-        'ピタテン</span></div>\n          <p class="af-desc">'
-    )
-    # Find patterns near the text markers
-    # Pattern: find href="#" near ピタテン
-    content = re.sub(
-        r'(転職支援サービス【ピタテン】.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("pitaten")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(20代.*?UZUZ.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("uzuz")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_insurance_calculator():
-    fp = os.path.join(TOOLS_DIR, 'insurance-calculator', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(マネードクター.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(保険見直しラボ.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("hoken_minaoshi_lab")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_investment_return():
-    fp = os.path.join(TOOLS_DIR, 'investment-return', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(SBI証券.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("sbi_securities")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(マネードクター.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
+"""全ツールのhref="#"を公式サイトURLに一括置換するスクリプト
 
-def fix_loan_calculator():
-    fp = os.path.join(TOOLS_DIR, 'loan-calculator', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(モゲチェック.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("mogecheck")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(保険スクエア.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("hoken_square_bang")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    # Also handle case where href is in the same tag as text
-    content = content.replace(
-        'モゲチェック】</a>', f'モゲチェック】</a>'
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
+置換ルールは inject_affiliate_links.py と共通の config/link_rules.json を使う。
+--official を付けると config/affiliate_links.json の url ではなく official_url
+（ASPのリンクではない各社の公式サイト）を設定する。
 
-def fix_dividend_yield():
-    fp = os.path.join(TOOLS_DIR, 'dividend-yield', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(高配当株投資.*?SBI証券.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("sbi_securities")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(配当投資.*?マネードクター.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_pension_calculator():
-    fp = os.path.join(TOOLS_DIR, 'pension-calculator', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(老後の資金計画.*?マネードクター.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(iDeCo.*?SBI証券.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("sbi_securities")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_nisa_simulator():
-    fp = os.path.join(TOOLS_DIR, 'nisa-simulator', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(SBI証券.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("sbi_securities")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(WealthNavi.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("wealthnavi")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_retirement_calculator():
-    fp = os.path.join(TOOLS_DIR, 'retirement-calculator', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(マネードクター.*?)<a href="#">',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}">',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(SBI証券.*?)<a href="#">',
-        lambda m: m.group(1) + f'<a href="{get_url("sbi_securities")}">',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_retirement_fund():
-    fp = os.path.join(TOOLS_DIR, 'retirement-fund', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(老後の資産運用.*?マネードクター.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(新NISA.*?SBI証券.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("sbi_securities")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_tax_calculator():
-    fp = os.path.join(TOOLS_DIR, 'tax-calculator', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(マネーフォワード.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("money_forward")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(税理士ドットコム.*?)<a href="#"',
-        lambda m: m.group(1) + f'<a href="{get_url("zeirishi_dot_com")}"',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_real_estate_yield():
-    fp = os.path.join(TOOLS_DIR, 'real-estate-yield', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-    content = re.sub(
-        r'(RENOSY.*?)<a href="#">',
-        lambda m: m.group(1) + f'<a href="{get_url("renosy")}">',
-        content, count=1, flags=re.DOTALL
-    )
-    content = re.sub(
-        r'(マネードクター.*?)<a href="#">',
-        lambda m: m.group(1) + f'<a href="{get_url("money_doctor")}">',
-        content, count=1, flags=re.DOTALL
-    )
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 2
-
-def fix_sim_comparison():
-    """SIM比較ツール: JavaScriptテンプレート内のリンクをプロバイダー別に動的化"""
-    fp = os.path.join(TOOLS_DIR, 'sim-comparison', 'index.html')
-    with open(fp, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # プロバイダー→URL のマッピングを構築
-    sim_map = {
-        'povo': get_url('sim_povo'),
-        'LINEMO': get_url('sim_linemo'),
-        'IIJmio': get_url('sim_iijmio'),
-        '楽天モバイル': get_url('sim_rakuten'),
-        'mineo': get_url('sim_mineo'),
-        'ahamo': get_url('sim_ahamo'),
-        'UQモバイル': get_url('sim_uqmobile'),
-        'ワイモバイル': get_url('sim_ymobile'),
-        'NUROモバイル': get_url('sim_nuro_mobile'),
-        'BIGLOBEモバイル': get_url('sim_biglobe'),
-        'J:COMモバイル': get_url('sim_jcom'),
-        'LIBMO': get_url('sim_libmo'),
-        '日本通信SIM': config.get('sim_nihon_tsushin', {}).get('url', '#'),
-    }
-    default_url = get_url('sim_default')
-
-    js_map = json.dumps(sim_map, ensure_ascii=False)
+使い方:
+  python scripts/apply_official_urls.py              # url を適用
+  python scripts/apply_official_urls.py --official   # official_url を適用
+  python scripts/apply_official_urls.py --dry-run
+"""
+import os
+import sys
 
-    # allPlansの直後にURLマッピングを挿入
-    content = content.replace(
-        'let currentSort="price";',
-        f'const affiliateUrls={js_map};\nconst defaultSimUrl="{default_url}";\nlet currentSort="price";'
-    )
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, 'scripts'))
 
-    # href="#" を動的URLに変更
-    content = content.replace(
-        '<a href="#" class="btn-official">公式サイト</a>',
-        '<a href="${affiliateUrls[p.provider]||defaultSimUrl}" class="btn-official" target="_blank" rel="nofollow noopener">公式サイト</a>'
-    )
+import inject_affiliate_links
+from common import db, link_index, manifest
 
-    with open(fp, 'w', encoding='utf-8') as f:
-        f.write(content)
-    return 1
 
+def official_config(config):
+    """url を official_url で置き換えた設定（official_url が無い案件は url のまま）"""
+    return {key: dict(value, url=value.get('official_url') or value.get('url', ''))
+            if isinstance(value, dict) else value
+            for key, value in config.items()}
 
-def main():
-    total = 0
-    fixes = [
-        ('salary-calculator', fix_salary_calculator),
-        ('unemployment-benefit', fix_unemployment_benefit),
-        ('insurance-calculator', fix_insurance_calculator),
-        ('investment-return', fix_investment_return),
-        ('loan-calculator', fix_loan_calculator),
-        ('dividend-yield', fix_dividend_yield),
-        ('pension-calculator', fix_pension_calculator),
-        ('nisa-simulator', fix_nisa_simulator),
-        ('retirement-calculator', fix_retirement_calculator),
-        ('retirement-fund', fix_retirement_fund),
-        ('tax-calculator', fix_tax_calculator),
-        ('real-estate-yield', fix_real_estate_yield),
-        ('sim-comparison', fix_sim_comparison),
-    ]
 
-    for name, func in fixes:
-        try:
-            n = func()
-            print(f"  OK: {name} ({n} links)")
-            total += n
-        except Exception as e:
-            print(f"  ERROR: {name} - {e}")
+def main(official=False, dry_run=False):
+    config = inject_affiliate_links.load_config()
+    if official:
+        config = official_config(config)
 
-    print(f"\nTotal: {total} links updated across {len(fixes)} tools")
+    pages = {}
+    print("[Tools]")
+    tools = inject_affiliate_links.inject_tool_links(config, dry_run, pages=pages)
+    print("\n[SIM Comparison]")
+    sim = inject_affiliate_links.inject_sim_links(config, dry_run, pages=pages)
+    if not dry_run:
+        # 逆引きインデックスには実際に書いたURL（--official なら公式サイト）を残す。
+        # 次の inject_affiliate_links.py --changed はこれと url の差分を見て張り直す
+        data = {path: content.encode('utf-8') for path, content in pages.items()}
+        link_index.save(link_index.build(data, inject_affiliate_links.config_urls(config)))
+        manifest.record(db.get_connection(), data)
+    print(f"\nTotal: {tools + sim} links {'would be ' if dry_run else ''}updated")
 
 
 if __name__ == '__main__':
     print("=== Applying Official URLs to All Tools ===\n")
-    main()
+    main(official='--official' in sys.argv, dry_run='--dry-run' in sys.argv)
     print("\n=== Done ===")
@@ -4,59 +4,231 @@
 06:00 に Task Scheduler から呼び出される。
 1. SIMデータ収集
 2. HTML生成（格安SIM比較表）
-3. アフィリエイトリンク再注入
-4. 関連リンク再注入（初回のみ）
+3. 関連ツールの注入・更新（関連が変わったページだけ）
+4. アフィリエイトリンク再注入
 5. サイトインデックス再生成
-6. SNS画像生成
-7. Git auto-commit & push (GitHub Pages デプロイ)
-8. ステータスチェック
+6. OGP画像の一括生成（output/tools/ の全ページ分、og:image の更新）
+7. 出力HTMLの縮小（CSS/JS/HTML、関連リンクのスタイルは共有CSSへ）
+8. SNS画像生成
+9. Git auto-commit & push (GitHub Pages デプロイ)
+10. ステータスチェック
+
+各ステップは inputs / outputs（DBテーブル・output/配下・設定ファイル）を宣言し、
+依存関係のDAGとして実行する。依存の無いステップはワーカープールで並列に走るため、
+全体の所要時間は全ステップの合計ではなくクリティカルパスになる。
+上流ステップが失敗・タイムアウトしたら、その下流のステップは実行せず blocked として記録する
+（--resume でまとめて再実行できる）。
+
+各ステップはデフォルトで同一プロセス内で実行する（モジュールを一度だけ import し、
+エントリポイントに DB 接続・設定・フォントキャッシュを持つ StepContext を渡す）。
+--subprocess を付けると従来通りステップごとに別プロセスで起動する。
+どちらのモードでも TIMEOUT_SEC を過ぎたステップは TIMEOUT（失敗）になるが、in-process では
+スレッドを止められないため待つのをやめるだけで、止まったステップはバックグラウンドに残る。
+
+使い方:
+  python scripts/daily_run.py               # 並列・in-process 実行（デフォルト4ワーカー）
+  python scripts/daily_run.py --jobs 1      # 逐次実行
+  python scripts/daily_run.py --subprocess  # ステップごとにサブプロセスで隔離実行
+  python scripts/daily_run.py --force       # 入力が変わっていなくても全ステップを再実行
+  python scripts/daily_run.py --resume      # 直前の run の失敗・未完了ステップだけを再実行
+  python scripts/daily_run.py --resume 20260301-060000-4242   # run id を指定して再開
+
+ステップごとの時間・I/O と run 全体の時間・最大RSS は logs/pipeline_metrics.jsonl と
+pipeline_runs テーブルに記録される（common/metrics.py）。推移は scripts/status.py で確認できる。
+各 run には run id が振られ、ステップが終わるたびにその記録がチェックポイントになる
+（common/checkpoints.py）。--resume は成功済みステップの成果物をそのまま使い、
+失敗・未完了のステップ（Git auto-deploy を含む）とその下流だけを実行する。
 """
+import argparse
+import importlib.util
+import io
 import subprocess
 import sys
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
 sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common import build_state, checkpoints, db, fonts, manifest, metrics, migrations
+
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
 DATE_STR = datetime.now().strftime('%Y-%m-%d')
 LOG_FILE = os.path.join(LOG_DIR, f'daily_{DATE_STR}.log')
-
+# 同じ秒に起動した run（手動実行とスケジューラの重なり等）が混ざらないよう PID を付ける
+RUN_ID = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+DB_PATH = os.path.join(BASE_DIR, 'data', 'money_machine.db')
+CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'affiliate_links.json')
+
+# script はサブプロセス実行時のコマンド、entry は in-process 実行時に呼ぶ関数名。
+# entry は StepContext を1引数で受け取り、失敗時は非0の終了コードを返す。
+# fingerprint は common/build_state.py の仕様。前回成功時と同じならスキップする
+# （無いステップは毎回実行）。フィンガープリントは成功後に取り直して保存するので、
+# 自分の入力を書き換えるステップ（リンク注入など）も翌日は一致する。下流のステップが
+# 書き換える入力（output/tools/ のページ）もあるため、DAG を回し終えたら成功した全ステップの
+# フィンガープリントをもう一度取り直す（入力が変わらなければ次の run は全部スキップになる）。
+# inputs / outputs のリソース名:
+#   db/<table>        SQLiteテーブル（"db" は全テーブル）
+#   output/...        output/ 配下のファイル・ディレクトリ
+#   config/...        設定ファイル
+# 後続ステップが先行ステップの outputs を読む・同じ場所に書く・先行ステップの
+# inputs を上書きする場合に依存辺を張る（宣言順が同じリソースへのアクセス順）。
 STEPS = [
-    ('SIM scraping',
-     [sys.executable, os.path.join(BASE_DIR, 'scrapers', 'sim_scraper.py')]),
-
-    ('HTML generation',
-     [sys.executable, os.path.join(BASE_DIR, 'generators', 'comparison_generator.py')]),
+    {
+        'name': 'SIM scraping',
+        'script': 'scrapers/sim_scraper.py',
+        'entry': 'run_scraper',
+        'inputs': [],
+        'outputs': ['db/comparison_data'],
+        # 各社ページは日々変わりうるので1日1回は取得し直す
+        'fingerprint': {'files': ['scrapers/sim_scraper.py', 'scrapers/sim_providers.py',
+                                  'scrapers/fetcher.py'],
+                        'stamp': '%Y-%m-%d'},
+    },
+    {
+        'name': 'HTML generation',
+        'script': 'generators/comparison_generator.py',
+        'entry': 'generate',
+        'inputs': ['db/comparison_data'],
+        'outputs': ['output/tools/sim-comparison', 'output/tools/sitemap.xml'],
+        'fingerprint': {
+            'queries': ["SELECT category, provider, plan_name, price, data_gb, data_json, scraped_at "
+                        "FROM comparison_data WHERE is_current = 1 "
+                        "ORDER BY category, price, provider, plan_name"],
+            'files': ['generators/comparison_generator.py', 'common/pages.py',
+                      'scrapers/sim_providers.py'],
+            'templates': ['sim_comparison.html'],
+        },
+    },
+    {
+        'name': 'Related links',
+        'script': 'scripts/inject_related_links.py',
+        'entry': 'main',
+        'inputs': ['db/tools', 'output/tools'],
+        'outputs': ['output/tools'],
+        'fingerprint': {
+            'queries': ['SELECT slug, name, category, affiliate_category FROM tools ORDER BY slug'],
+            'files': ['scripts/inject_related_links.py', 'common/related.py', 'output/tools/*/index.html'],
+        },
+    },
+    {
+        'name': 'Affiliate link injection',
+        'script': 'scripts/inject_affiliate_links.py',
+        'entry': 'main',
+        'inputs': ['config/affiliate_links.json', 'config/link_rules.json', 'output/tools'],
+        'outputs': ['output/tools'],
+        'fingerprint': {
+            'files': ['config/affiliate_links.json', 'config/link_rules.json',
+                      'scripts/inject_affiliate_links.py', 'common/link_rules.py',
+                      'common/ahocorasick.py', 'common/link_index.py',
+                      'output/tools/*/index.html', 'output/tools/sim-comparison/*/*/index.html'],
+        },
+    },
+    {
+        'name': 'Site index',
+        'script': 'scripts/generate_site_index.py',
+        'entry': 'main',
+        'inputs': ['db/tools', 'output/tools'],
+        'outputs': ['output/tools/index.html'],
+        'fingerprint': {
+            # ページの sha256 も含める（検索インデックスに各ページの説明文を入れるため）
+            'queries': ['SELECT t.name, t.slug, t.category, m.sha256 FROM tools t '
+                        'JOIN build_manifest m ON m.path = t.file_path '
+                        'WHERE m.sha256 IS NOT NULL ORDER BY t.category, t.name'],
+            'files': ['scripts/generate_site_index.py', 'common/search_index.py'],
+            'templates': ['site_index.html'],
+        },
+    },
+    {
+        'name': 'OG images',
+        'script': 'generators/og_image_generator.py',
+        'entry': 'generate',
+        'inputs': ['db/comparison_data', 'db/tools', 'output/tools'],
+        'outputs': ['output/tools'],
+        'fingerprint': {
+            # 画像の文言はページの og:title / og:description と SIM のプランから取る
+            'queries': ["SELECT category, provider, plan_name, price, data_gb, data_json, scraped_at "
+                        "FROM comparison_data WHERE is_current = 1 "
+                        "ORDER BY category, price, provider, plan_name"],
+            'files': ['generators/og_image_generator.py', 'generators/comparison_generator.py',
+                      'common/cards.py', 'common/fonts.py', 'output/tools/**/index.html'],
+        },
+    },
+    {
+        # output/tools/ を書き換えるステップより後に宣言する（DAG 上で最後に走る）
+        'name': 'Minify output',
+        'script': 'scripts/minify_output.py',
+        'entry': 'main',
+        'inputs': ['output/tools'],
+        'outputs': ['output/tools'],
+        'fingerprint': {
+            'files': ['scripts/minify_output.py', 'output/tools/**/*.html'],
+        },
+    },
+    {
+        'name': 'Social image generation',
+        'script': 'generators/social_image_generator.py',
+        'entry': 'generate',
+        'inputs': ['db/comparison_data'],
+        'outputs': ['output/social'],
+        'fingerprint': {
+            'queries': ["SELECT provider, plan_name, price, data_gb FROM comparison_data "
+                        "WHERE is_current = 1 AND category = 'sim' AND price > 0 "
+                        "ORDER BY price ASC LIMIT 5"],
+            'files': ['generators/social_image_generator.py', 'common/cards.py', 'common/fonts.py'],
+            'stamp': '%Y-%m',
+        },
+    },
+    {
+        'name': 'Status',
+        'script': 'scripts/status.py',
+        'entry': 'main',
+        'inputs': ['db', 'output'],
+        'outputs': [],
+    },
+]
 
-    ('Affiliate link injection',
-     [sys.executable, os.path.join(BASE_DIR, 'scripts', 'inject_affiliate_links.py')]),
+MAX_WORKERS = 4
 
-    ('Site index',
-     [sys.executable, os.path.join(BASE_DIR, 'scripts', 'generate_site_index.py')]),
+DEPLOY_STEP = 'Git auto-deploy'
 
-    ('Social image generation',
-     [sys.executable, os.path.join(BASE_DIR, 'generators', 'social_image_generator.py')]),
+# git auto-deploy で add する対象（output/ と config/ のみ - 安全のため）
+DEPLOY_PATHS = ['output/', 'config/', 'data/x_post_queue.json']
+# output/tools/ の変更はビルドマニフェストの未デプロイ分から取るので git status では見ない
+STATUS_PATHS = [*DEPLOY_PATHS, ':(exclude)output/tools/']
+GIT_ARGS_CHUNK = 200  # git add に一度に渡すパス数（コマンドライン長の上限対策）
+TIMEOUT_SEC = 300
+STEP_THREAD_PREFIX = 'step: '  # in-process のステップを実行するスレッド名（stuck_steps で探す）
 
-    ('Status',
-     [sys.executable, os.path.join(BASE_DIR, 'scripts', 'status.py')]),
-]
 
-TIMEOUT_SEC = 300
+_LOG_LOCK = threading.Lock()
 
 
 def log(msg, fh):
     line = f"[{datetime.now().strftime('%H:%M:%S')}] {msg}"
-    print(line)
-    fh.write(line + '\n')
-    fh.flush()
+    with _LOG_LOCK:
+        print(line)
+        fh.write(line + '\n')
+        fh.flush()
+
+
+def log_block(text, fh):
+    """ステップの出力をまとめて書き込む（並列実行時に行が混ざらないように）"""
+    with _LOG_LOCK:
+        fh.write(text + '\n')
+        fh.flush()
 
 
 def run_step(name, cmd, fh):
     log(f"{name} ... start", fh)
+    started = time.perf_counter()
     try:
         result = subprocess.run(
             cmd,
@@ -68,13 +240,13 @@ def run_step(name, cmd, fh):
             errors='replace',
         )
         if result.stdout:
-            fh.write(result.stdout + '\n')
+            log_block(result.stdout, fh)
         if result.returncode != 0:
             log(f"{name} ... WARN (exit {result.returncode})", fh)
             if result.stderr:
-                fh.write(result.stderr + '\n')
+                log_block(result.stderr, fh)
             return False
-        log(f"{name} ... OK", fh)
+        log(f"{name} ... OK ({time.perf_counter() - started:.1f}s)", fh)
         return True
     except subprocess.TimeoutExpired:
         log(f"{name} ... TIMEOUT ({TIMEOUT_SEC}s)", fh)
@@ -87,60 +259,399 @@ def run_step(name, cmd, fh):
         return False
 
 
+class _ThreadLocalStream:
+    """スレッドごとに出力先を切り替える stdout / stderr の代理オブジェクト
+
+    in-process 実行中のステップの print() をステップ単位のバッファに集め、
+    並列実行しても各ステップのログがまとまって書き込まれるようにする。
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        self._local.buffer = buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer or self._stream).write(text)
+
+    def flush(self):
+        buffer = getattr(self._local, 'buffer', None)
+        (buffer or self._stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class StepContext:
+    """in-process 実行時に各ステップへ渡す共有コンテキスト
+
+    - db: ワーカースレッドごとに1本の SQLite 接続（同じスレッドのステップ間で再利用）。
+          common.db の設定（WAL 等）済みで、取得行数を数えるため metrics.CountingConnection で包んである
+    - config: config/affiliate_links.json の内容
+    - font(path, size): 読み込み済み FreeTypeFont（common/fonts.py のプロセス共有キャッシュ）
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._config = None
+
+    @property
+    def db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = metrics.CountingConnection(db.connect(DB_PATH))
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @property
+    def config(self):
+        with self._lock:
+            if self._config is None:
+                with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                    self._config = json.load(f)
+            return self._config
+
+    def font(self, path, size):
+        return fonts.load(path, size)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+def load_step_modules(steps, fh):
+    """各ステップのモジュールを一度だけ import し、(モジュール辞書, import所要秒) を返す
+
+    import に失敗したモジュールは None になり、そのステップだけが失敗扱いになる。
+    """
+    modules = {}
+    started = time.perf_counter()
+    for step in steps:
+        path = os.path.join(BASE_DIR, step['script'])
+        if path in modules:
+            continue
+        module_name = 'mm_step_' + os.path.splitext(os.path.basename(path))[0]
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        except Exception as e:
+            log(f"{step['name']} ... import failed: {e}", fh)
+            module = None
+        modules[path] = module
+    return modules, time.perf_counter() - started
+
+
+def measure_interpreter_startup():
+    """サブプロセス実行時に1ステップあたり掛かるインタプリタ起動時間を実測する"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], cwd=BASE_DIR, capture_output=True)
+    return time.perf_counter() - started
+
+
+def run_step_inprocess(step, module, ctx, stdout, stderr, fh, recorder):
+    """ステップのエントリ関数を同一プロセス内で呼び出す（run_step の in-process 版）
+
+    エントリ関数はステップ専用のスレッドで実行し、TIMEOUT_SEC を過ぎたら待つのをやめて
+    TIMEOUT（失敗）とする。スレッドは外から止められないので、そのステップはバックグラウンドで
+    走り続ける（デーモンスレッドなのでプロセス終了時に打ち切られる）。その間に書き込みが
+    重ならないよう、下流のステップは実行せず（_schedule）、Git auto-deploy もしない（stuck_steps）。
+    確実に止める必要があるときは --subprocess で実行する。
+    エントリ関数の実行区間は recorder（metrics.StepRecorder）で計測する。
+    """
+    name = step['name']
+    if module is None:
+        log(f"{name} ... SKIP (module not loaded)", fh)
+        return False
+    log(f"{name} ... start", fh)
+    started = time.perf_counter()
+    out, err = io.StringIO(), io.StringIO()
+    outcome = {'code': None, 'failed': None}
+
+    def call():
+        stdout.capture(out)
+        stderr.capture(err)
+        # ステップのスレッドの接続（ctx.db）で取得行数を数える
+        recorder.conn = ctx.db
+        try:
+            with recorder:
+                outcome['code'] = getattr(module, step['entry'])(ctx)
+        except SystemExit as e:
+            outcome['code'] = e.code
+        except Exception as e:
+            err.write(f"{type(e).__name__}: {e}\n")
+            outcome['failed'] = f"ERROR: {e}"
+        finally:
+            stdout.release()
+            stderr.release()
+
+    worker = threading.Thread(target=call, name=STEP_THREAD_PREFIX + name, daemon=True)
+    worker.start()
+    worker.join(TIMEOUT_SEC)
+    elapsed = time.perf_counter() - started
+    if worker.is_alive():
+        log(f"{name} ... TIMEOUT ({TIMEOUT_SEC}s)", fh)
+        recorder.record['status'] = 'timeout'
+        return False
+
+    code, failed = outcome['code'], outcome['failed']
+    if out.getvalue():
+        log_block(out.getvalue(), fh)
+    if failed is None and code not in (None, 0):
+        failed = f"WARN (exit {code})"
+    if failed:
+        log(f"{name} ... {failed}", fh)
+        if err.getvalue():
+            log_block(err.getvalue(), fh)
+        return False
+    log(f"{name} ... OK ({elapsed:.1f}s)", fh)
+    return True
+
+
+def stuck_steps():
+    """タイムアウトした後もまだ走っている in-process ステップの名前"""
+    return sorted(thread.name[len(STEP_THREAD_PREFIX):] for thread in threading.enumerate()
+                  if thread.name.startswith(STEP_THREAD_PREFIX) and thread.is_alive())
+
+
+def _overlaps(resources_a, resources_b):
+    """リソース名の集合同士が重なるか（一方が他方の親パスでも重なりとみなす）"""
+    for a in resources_a:
+        for b in resources_b:
+            if a == b or a.startswith(b + '/') or b.startswith(a + '/'):
+                return True
+    return False
+
+
+def build_dag(steps):
+    """宣言された inputs / outputs から {ステップ名: 依存ステップ名の集合} を作る"""
+    deps = {step['name']: set() for step in steps}
+    for i, later in enumerate(steps):
+        for earlier in steps[:i]:
+            if (_overlaps(later['inputs'], earlier['outputs'])
+                    or _overlaps(later['outputs'], earlier['outputs'])
+                    or _overlaps(later['outputs'], earlier['inputs'])):
+                deps[later['name']].add(earlier['name'])
+    return deps
+
+
+def _schedule(deps, by_name, run, fh, jobs, done=(), block=None):
+    """依存が解決したステップから順にプールへ投入し、{名前: 成否} を返す
+
+    done のステップ（再開時の成功済みステップ）は実行せず成功扱いにする。
+    依存先が失敗したステップは実行せず失敗扱いにし、block(step, 失敗した依存先) を呼ぶ
+    （その下流も同様に連鎖する）。
+    """
+    pending = {name: needs for name, needs in deps.items() if name not in done}
+    running = {}
+    results = {name: True for name in done if name in deps}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            # 失敗した依存先を持つステップは失敗扱いにする（下流へは次の周回で連鎖する）
+            blocked = {name: {n for n in needs if results.get(n) is False} for name, needs in pending.items()}
+            blocked = {name: failed for name, failed in blocked.items() if failed}
+            for name, failed in blocked.items():
+                del pending[name]
+                results[name] = False
+                if block:
+                    block(by_name[name], failed)
+            if blocked:
+                continue
+            ready = [name for name, needs in pending.items() if needs.issubset(results)]
+            for name in ready:
+                del pending[name]
+                running[pool.submit(run, by_name[name])] = name
+            if not running:
+                # 宣言ミスで循環した場合でも残りを落とさず逐次実行する
+                name = next(iter(pending))
+                log(f"{name} ... WARN (unresolved dependencies: {sorted(pending[name])})", fh)
+                pending[name] = set()
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
+
+
+def is_up_to_date(step, ctx):
+    """フィンガープリントが前回成功時と一致し、出力が揃っていれば True"""
+    spec = step.get('fingerprint')
+    if not spec or not build_state.outputs_exist(step['outputs']):
+        return False
+    stored = build_state.get(ctx.db, step['name'])
+    return stored is not None and stored == build_state.fingerprint(ctx.db, spec)
+
+
+def refresh_fingerprints(steps, results, ctx):
+    """成功したステップのフィンガープリントを DAG 完了時点の入力で取り直す
+
+    関連リンク・アフィリエイト・OGP・縮小は、上流のステップが入力に含めているページを
+    後から書き換える。ステップ直後の値のままだと翌 run で上流から順に1段ずつしか
+    一致しないので、全ステップが終わった状態を基準にする。
+    """
+    for step in steps:
+        if results.get(step['name']) and step.get('fingerprint'):
+            build_state.record(ctx.db, step['name'], build_state.fingerprint(ctx.db, step['fingerprint']))
+
+
+def run_dag(steps, fh, run_id=RUN_ID, jobs=MAX_WORKERS, inprocess=True, force=False, done=()):
+    """依存関係を満たしたステップから順にワーカープールで実行し、{名前: 成否} を返す
+
+    各ステップの結果は完了時に pipeline_runs へ記録する（--resume のチェックポイント）。
+    """
+    deps = build_dag(steps)
+    by_name = {step['name']: step for step in steps}
+    durations = {}
+    executed = []
+    ctx = StepContext()
+
+    if inprocess:
+        modules, import_sec = load_step_modules(steps, fh)
+        startup_sec = measure_interpreter_startup()
+        stdout, stderr = _ThreadLocalStream(sys.stdout), _ThreadLocalStream(sys.stderr)
+        sys.stdout, sys.stderr = stdout, stderr
+
+    def _run(step):
+        started = time.perf_counter()
+        recorder = metrics.StepRecorder(run_id, step['name'], ctx.db)
+        record = recorder.record
+        record['started_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if not force and is_up_to_date(step, ctx):
+            log(f"{step['name']} ... SKIP (inputs unchanged)", fh)
+            ok, record['status'] = True, 'skipped'
+        else:
+            executed.append(step['name'])
+            if inprocess:
+                module = modules[os.path.join(BASE_DIR, step['script'])]
+                ok = run_step_inprocess(step, module, ctx, stdout, stderr, fh, recorder)
+            else:
+                ok = run_step(step['name'], [sys.executable, os.path.join(BASE_DIR, step['script'])], fh)
+            if ok and step.get('fingerprint'):
+                build_state.record(ctx.db, step['name'], build_state.fingerprint(ctx.db, step['fingerprint']))
+            # タイムアウトは run_step_inprocess が 'timeout' を入れている
+            record['status'] = record['status'] or ('ok' if ok else 'failed')
+        durations[step['name']] = time.perf_counter() - started
+        if record['wall_s'] is None:
+            record['wall_s'] = round(durations[step['name']], 4)
+        metrics.write(ctx.db, [record])
+        return ok
+
+    def _block(step, failed):
+        log(f"{step['name']} ... SKIP (upstream failed: {', '.join(sorted(failed))})", fh)
+        record = metrics.StepRecorder(run_id, step['name']).record
+        record.update(status='blocked', started_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), wall_s=0.0)
+        metrics.write(ctx.db, [record])
+
+    started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    started = time.perf_counter()
+    try:
+        results = _schedule(deps, by_name, _run, fh, jobs, done, block=_block)
+        refresh_fingerprints(steps, results, ctx)
+    finally:
+        if inprocess:
+            sys.stdout, sys.stderr = stdout._stream, stderr._stream
+        ctx.close()
+
+    wall = time.perf_counter() - started
+    metrics.write(db.get_connection(DB_PATH),
+                  [metrics.run_record(run_id, 'ok' if all(results.values()) else 'failed', started_at, wall)])
+    log(f"Pipeline wall time: {wall:.1f}s (sum of steps {sum(durations.values()):.1f}s, "
+        f"{max(1, jobs)} workers)", fh)
+    if inprocess:
+        log(f"In-process mode: saved ~{len(executed) * startup_sec:.2f}s of interpreter startup "
+            f"({len(executed)} launches x {startup_sec * 1000:.0f}ms), "
+            f"shared module import {import_sec:.2f}s", fh)
+    return results
+
+
+def _git(args, **kwargs):
+    return subprocess.run(['git', *args], cwd=BASE_DIR, capture_output=True, text=True,
+                          encoding='utf-8', errors='replace', **kwargs)
+
+
+def has_staged_changes():
+    """インデックスに HEAD からの変更があれば True（git diff --cached --quiet の終了コード）"""
+    return _git(['diff', '--cached', '--quiet']).returncode != 0
+
+
+def commits_ahead():
+    """HEAD が origin/main より何コミット進んでいるか（origin/main が無ければ None）"""
+    result = _git(['rev-list', '--count', 'origin/main..HEAD'])
+    if result.returncode != 0:
+        return None
+    return int(result.stdout.strip() or 0)
+
+
 def git_auto_deploy(fh):
-    """変更があれば git commit + push で GitHub Pages にデプロイ"""
+    """変更があれば git commit + push で GitHub Pages にデプロイ
+
+    output/tools/ はビルドマニフェスト（common/manifest.py）の未デプロイ分だけを add / rm し、
+    push できたらデプロイ済みとして記録する。それ以外の対象は git status で確認する。
+    origin/main より進んだコミットが残っていれば、新しい変更が無くても push する。
+    """
     log("Git auto-deploy ... start", fh)
     try:
-        # 変更チェック
-        status = subprocess.run(
-            ['git', 'status', '--porcelain'],
-            capture_output=True, text=True, cwd=BASE_DIR,
-            encoding='utf-8', errors='replace',
-        )
+        conn = db.get_connection(DB_PATH)
+        pending = manifest.pending(conn)
+
+        # 変更チェック（デプロイ対象のパスのみ。ログ等の変更ではコミットしない）
+        status = _git(['status', '--porcelain', '--', *STATUS_PATHS])
         changes = [
             line for line in status.stdout.strip().split('\n')
             if line and not any(x in line for x in ['.env', 'credentials', 'settings.local', 'money_machine.db'])
         ]
 
-        if not changes:
+        # 前回 push できなかったコミット（タイムアウト後の --resume 等）が残っていれば push だけ行う
+        ahead = commits_ahead()
+        if not changes and not pending and not ahead:
             log("Git auto-deploy ... SKIP (no changes)", fh)
             return True
 
-        log(f"  {len(changes)} files changed", fh)
-
-        # git add (output/ と config/ のみ - 安全のため)
-        subprocess.run(
-            ['git', 'add', 'output/', 'config/', 'data/x_post_queue.json'],
-            cwd=BASE_DIR, capture_output=True, text=True,
-            encoding='utf-8', errors='replace',
-        )
-
-        # commit
-        msg = f"auto: daily update {DATE_STR}"
-        result = subprocess.run(
-            ['git', 'commit', '-m', msg],
-            cwd=BASE_DIR, capture_output=True, text=True,
-            encoding='utf-8', errors='replace',
-        )
-        if result.returncode != 0:
-            if 'nothing to commit' in result.stdout:
-                log("Git auto-deploy ... SKIP (nothing staged)", fh)
-                return True
-            log(f"Git auto-deploy ... WARN (commit failed): {result.stderr}", fh)
-            return False
-
-        fh.write(result.stdout + '\n')
+        log(f"  {len(changes)} files changed, {len(pending)} built files pending"
+            + (f", {ahead} commits not pushed" if ahead else ''), fh)
+
+        # git add（削除したページはインデックスからも外す）
+        built = [path for path, removed in pending if not removed]
+        removed = [path for path, removed in pending if removed]
+        for i in range(0, len(built), GIT_ARGS_CHUNK):
+            _git(['add', '--', *built[i:i + GIT_ARGS_CHUNK]])
+        for i in range(0, len(removed), GIT_ARGS_CHUNK):
+            _git(['rm', '--cached', '--ignore-unmatch', '-q', '--', *removed[i:i + GIT_ARGS_CHUNK]])
+        _git(['add', '--', *STATUS_PATHS])
+
+        # commit（ステージした変更がある場合だけ。git の出力文言には頼らない）
+        if has_staged_changes():
+            msg = f"auto: daily update {DATE_STR}"
+            result = _git(['commit', '-m', msg])
+            if result.returncode != 0:
+                log(f"Git auto-deploy ... WARN (commit failed): {result.stderr}", fh)
+                return False
+            fh.write(result.stdout + '\n')
 
-        # push
-        result = subprocess.run(
-            ['git', 'push', 'origin', 'main'],
-            cwd=BASE_DIR, capture_output=True, text=True,
-            timeout=60, encoding='utf-8', errors='replace',
-        )
+        # push（origin/main より進んだコミットがある場合だけ）
+        if commits_ahead() == 0:
+            # 未デプロイ扱いの内容も既に origin にある
+            manifest.mark_deployed(conn, [path for path, _ in pending])
+            log("Git auto-deploy ... SKIP (nothing to push)", fh)
+            return True
+        result = _git(['push', 'origin', 'main'], timeout=60)
         if result.returncode != 0:
             log(f"Git auto-deploy ... WARN (push failed): {result.stderr}", fh)
             return False
 
+        manifest.mark_deployed(conn, [path for path, _ in pending])
         log("Git auto-deploy ... OK", fh)
         return True
 
@@ -203,24 +714,97 @@ def check_x_queue(fh):
         log(f"X queue check ... ERROR: {e}", fh)
 
 
+def record_checkpoint(run_id, step, ok, started, wall):
+    """DAG 外のステージ（Git auto-deploy）のチェックポイントを記録する"""
+    metrics.write(db.get_connection(DB_PATH),
+                  [{'run_id': run_id, 'step': step, 'status': 'ok' if ok else 'failed',
+                    'started_at': started, 'wall_s': round(wall, 4),
+                    'cpu_s': None, 'peak_rss_kb': None, 'bytes_read': None,
+                    'bytes_written': None, 'rows_read': None, 'rows_written': None,
+                    'files_touched': None}])
+
+
+def resolve_resume(resume, steps):
+    """--resume の値から (run_id, 再実行不要なステップ集合) を求める
+
+    失敗・未完了のステップの下流は、成功済みでも新しい入力で作り直すため再実行する。
+    DAG のステップを1つでも再実行するなら Git auto-deploy もやり直す。
+    """
+    conn = db.get_connection(DB_PATH)
+    run_id = checkpoints.latest_run_id(conn) if resume == 'latest' else resume
+    if run_id is None:
+        return RUN_ID, set()
+    done = checkpoints.completed_steps(conn, run_id)
+
+    deps = build_dag(steps)
+    stale = {name for name in deps if name not in done}
+    changed = True
+    while changed:
+        changed = False
+        for name, needs in deps.items():
+            if name not in stale and needs & stale:
+                stale.add(name)
+                changed = True
+    done -= stale
+    if stale:
+        done.discard(DEPLOY_STEP)
+    return run_id, done
+
+
+def migrate_db(fh):
+    """既存DBのスキーマを最新バージョンに上げる"""
+    applied = migrations.migrate(db.get_connection(DB_PATH))
+    for number, name in applied:
+        log(f"Schema migration {number}: {name}", fh)
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Money Machine daily pipeline')
+    parser.add_argument('--jobs', type=int, default=MAX_WORKERS,
+                        help=f'number of parallel workers (default: {MAX_WORKERS})')
+    parser.add_argument('--subprocess', action='store_true',
+                        help='run each step in its own interpreter (isolation fallback)')
+    parser.add_argument('--force', action='store_true',
+                        help='ignore build state and run every step')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                        help='continue a run from its first failed or unfinished step '
+                             '(default: the latest run)')
+    args = parser.parse_args()
+
     os.makedirs(LOG_DIR, exist_ok=True)
-    ok_count = 0
     total = len(STEPS) + 1  # +1 for git deploy
+    run_id, done = resolve_resume(args.resume, STEPS) if args.resume else (RUN_ID, set())
 
     with open(LOG_FILE, 'a', encoding='utf-8') as fh:
-        log(f"===== Money Machine Daily: {DATE_STR} =====", fh)
+        log(f"===== Money Machine Daily: {DATE_STR} (run {run_id}) =====", fh)
+        if args.resume:
+            log(f"Resuming run {run_id}: {len(done)} steps already done"
+                + (f" ({', '.join(sorted(done))})" if done else ''), fh)
 
-        for name, cmd in STEPS:
-            if run_step(name, cmd, fh):
-                ok_count += 1
+        migrate_db(fh)
+        results = run_dag(STEPS, fh, run_id=run_id, jobs=args.jobs,
+                          inprocess=not args.subprocess, force=args.force, done=done)
+        ok_count = sum(1 for ok in results.values() if ok)
 
         # X投稿キュー残数チェック
         check_x_queue(fh)
 
         # Git deploy (after all generation steps)
-        if git_auto_deploy(fh):
+        stuck = stuck_steps()
+        if DEPLOY_STEP in done:
+            log(f"{DEPLOY_STEP} ... SKIP (already done in run {run_id})", fh)
             ok_count += 1
+        elif stuck:
+            # タイムアウトしたステップがまだ output/ や DB に書いているかもしれないのでデプロイしない
+            log(f"{DEPLOY_STEP} ... SKIP (timed-out steps still running: {', '.join(stuck)})", fh)
+            record_checkpoint(run_id, DEPLOY_STEP, False, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 0.0)
+        else:
+            started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            t0 = time.perf_counter()
+            deployed = git_auto_deploy(fh)
+            record_checkpoint(run_id, DEPLOY_STEP, deployed, started, time.perf_counter() - t0)
+            if deployed:
+                ok_count += 1
 
         log(f"===== Done: {ok_count}/{total} succeeded =====", fh)
 
@@ -2,14 +2,28 @@
 """Money Machine サイトインデックスページ生成
 DBのtoolsテーブルから公開済みツール一覧を取得し、
 output/tools/index.html にランディングページを出力する。
+公開済みかどうかはビルドマニフェスト（common/manifest.py）で判定する。
+
+検索用に、ツール名・カテゴリ・各ページの説明文から作った転置インデックス
+（common/search_index.py）を内容ハッシュ付きの output/tools/assets/search-index.<hash>.json に
+書き出す。ページは検索欄を使ったときに初めてそれを読み込む。
 """
-import sqlite3
+import html
 import os
+import re
+import sys
 from datetime import datetime
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-DB_PATH = os.path.join(BASE_DIR, 'data', 'money_machine.db')
 OUTPUT_PATH = os.path.join(BASE_DIR, 'output', 'tools', 'index.html')
+ASSETS_DIR = os.path.join(BASE_DIR, 'output', 'tools', 'assets')
+TEMPLATE = 'site_index.html'
+
+sys.path.insert(0, BASE_DIR)
+
+from common import db, manifest, search_index, templating
+
+DESCRIPTION_RE = re.compile(r'<meta name="description" content="([^"]*)"')
 
 CATEGORY_LABELS = {
     'calculator': '計算機',
@@ -34,21 +48,16 @@ CATEGORY_ICONS = {
 }
 
 
-def get_deployed_tools():
-    """ディスク上にindex.htmlが存在するツールをDBから取得"""
-    conn = sqlite3.connect(DB_PATH)
+def get_deployed_tools(conn=None):
+    """ビルドマニフェストに index.html が記録されているツールをDBから取得"""
+    conn = conn or db.get_connection()
+    manifest.ensure_table(conn)
     c = conn.cursor()
-    c.execute('SELECT name, slug, category FROM tools ORDER BY category, name')
-    all_tools = c.fetchall()
-    conn.close()
-
-    tools_dir = os.path.join(BASE_DIR, 'output', 'tools')
-    deployed = []
-    for name, slug, category in all_tools:
-        idx = os.path.join(tools_dir, slug, 'index.html')
-        if os.path.isfile(idx):
-            deployed.append((name, slug, category))
-    return deployed
+    c.execute('''SELECT t.name, t.slug, t.category FROM tools t
+                 JOIN build_manifest m ON m.path = t.file_path
+                 WHERE m.sha256 IS NOT NULL
+                 ORDER BY t.category, t.name''')
+    return c.fetchall()
 
 
 def group_by_category(tools):
@@ -59,78 +68,66 @@ def group_by_category(tools):
     return groups
 
 
-def generate_html(groups, total_count):
+def page_description(slug):
+    """ツールページの meta description（検索インデックス用。無ければ空文字）"""
+    try:
+        with open(os.path.join(BASE_DIR, 'output', 'tools', slug, 'index.html'), encoding='utf-8') as f:
+            m = DESCRIPTION_RE.search(f.read())
+    except OSError:
+        return ''
+    return html.unescape(m.group(1)) if m else ''
+
+
+def write_search_index(conn, tools):
+    """検索インデックスを書き出し、ページからの相対URLを返す（古いハッシュのファイルは消す）"""
+    docs = [{'name': name, 'url': f'{slug}/index.html',
+             'category': CATEGORY_LABELS.get(category, CATEGORY_LABELS['calculator']),
+             'description': page_description(slug)}
+            for name, slug, category in tools]
+    data, digest = search_index.dumps(search_index.build(docs))
+    path = os.path.join(ASSETS_DIR, f'search-index.{digest}.json')
+    rel = manifest.relpath(path)
+    old = manifest.paths(conn, 'output/tools/assets/search-index.%') - {rel}
+    if rel not in manifest.paths(conn, rel):
+        manifest.write_page(conn, path, data)
+    for stale in sorted(old):
+        try:
+            os.remove(os.path.join(BASE_DIR, stale))
+        except FileNotFoundError:
+            pass
+    manifest.remove(conn, old)
+    return os.path.relpath(path, os.path.dirname(OUTPUT_PATH)).replace(os.sep, '/')
+
+
+def generate_html(groups, total_count, search_url):
     now = datetime.now().strftime('%Y-%m-%d')
-
-    cards_html = ''
-    for cat, tools in sorted(groups.items(), key=lambda x: -len(x[1])):
-        label = CATEGORY_LABELS.get(cat, cat)
-        icon = CATEGORY_ICONS.get(cat, '🔧')
-        cards_html += f'<h2 class="cat-title">{icon} {label}</h2>\n<div class="grid">\n'
-        for name, slug in tools:
-            cards_html += f'''  <a href="{slug}/index.html" class="card">
-    <span class="card-name">{name}</span>
-    <span class="card-arrow">→</span>
-  </a>
-'''
-        cards_html += '</div>\n'
-
-    html = f'''<!DOCTYPE html>
-<html lang="ja">
-<head>
-<meta charset="UTF-8">
-<meta name="viewport" content="width=device-width, initial-scale=1.0">
-<title>無料お金ツール集 | Money Machine</title>
-<meta name="description" content="年収計算・ローンシミュレーション・投資リターン計算など、お金に関する無料ツールを{total_count}個公開中。">
-<style>
-*{{margin:0;padding:0;box-sizing:border-box}}
-body{{font-family:-apple-system,BlinkMacSystemFont,"Segoe UI","Hiragino Sans",sans-serif;background:#f5f7fa;color:#1a1a2e;line-height:1.6}}
-.header{{background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:#fff;padding:2.5rem 1rem;text-align:center}}
-.header h1{{font-size:1.8rem;margin-bottom:.4rem}}
-.header p{{opacity:.9;font-size:.95rem}}
-.container{{max-width:900px;margin:0 auto;padding:1.5rem 1rem 3rem}}
-.cat-title{{font-size:1.2rem;margin:2rem 0 .8rem;padding-bottom:.4rem;border-bottom:2px solid #667eea}}
-.grid{{display:grid;grid-template-columns:repeat(auto-fill,minmax(260px,1fr));gap:.75rem}}
-.card{{display:flex;justify-content:space-between;align-items:center;background:#fff;border-radius:10px;padding:1rem 1.2rem;text-decoration:none;color:#1a1a2e;box-shadow:0 1px 3px rgba(0,0,0,.08);transition:transform .15s,box-shadow .15s}}
-.card:hover{{transform:translateY(-2px);box-shadow:0 4px 12px rgba(102,126,234,.2)}}
-.card-name{{font-weight:600;font-size:.95rem}}
-.card-arrow{{color:#667eea;font-size:1.2rem}}
-.footer{{text-align:center;padding:2rem 1rem;font-size:.8rem;color:#888}}
-</style>
-</head>
-<body>
-<div class="header">
-  <h1>無料お金ツール集</h1>
-  <p>全{total_count}ツール公開中 ・ スマホ対応 ・ 登録不要</p>
-</div>
-<div class="container">
-{cards_html}
-</div>
-<div class="footer">
-  <p>最終更新: {now} | Money Machine</p>
-</div>
-</body>
-</html>'''
-    return html
-
-
-def main():
-    tools = get_deployed_tools()
+    categories = [{'label': CATEGORY_LABELS.get(cat, cat), 'icon': CATEGORY_ICONS.get(cat, '🔧'), 'tools': tools}
+                  for cat, tools in sorted(groups.items(), key=lambda x: -len(x[1]))]
+    return templating.render(
+        TEMPLATE,
+        title='無料お金ツール集 | Money Machine',
+        description=f'年収計算・ローンシミュレーション・投資リターン計算など、お金に関する無料ツールを{total_count}個公開中。',
+        total_count=total_count, categories=categories, now=now, search_url=search_url)
+
+
+def main(ctx=None):
+    conn = ctx.db if ctx else db.get_connection()
+    tools = get_deployed_tools(conn)
     if not tools:
         print("No deployed tools found.")
         return
 
     groups = group_by_category(tools)
     total = len(tools)
-    html = generate_html(groups, total)
+    search_url = write_search_index(conn, tools)
+    page = generate_html(groups, total, search_url)
 
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        f.write(html)
+    manifest.write_page(conn, OUTPUT_PATH, page)
 
     print(f"Generated: {OUTPUT_PATH}")
     print(f"  Tools: {total}")
     print(f"  Categories: {len(groups)}")
+    print(f"  Search index: {search_url}")
 
 
 if __name__ == '__main__':
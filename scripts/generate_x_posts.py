@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 """X(Twitter)投稿テンプレート生成 - ツール紹介投稿を自動生成"""
-import sys, os, json, sqlite3, random
+import sys, os, json, random
 from datetime import datetime, timedelta
 sys.stdout.reconfigure(encoding='utf-8')
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-DB_PATH = os.path.join(BASE_DIR, 'data', 'money_machine.db')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'output', 'social')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -112,8 +111,13 @@ TOOL_POSTS = {
 }
 
 
+sys.path.insert(0, BASE_DIR)
+
+from common import db
+
+
 def main():
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.get_connection()
     c = conn.cursor()
     today = datetime.now().strftime('%Y-%m-%d')
 
@@ -137,7 +141,6 @@ def main():
                    datetime.now().isoformat()))
 
     conn.commit()
-    conn.close()
 
     # Save posts to JSON for reference
     output_path = os.path.join(OUTPUT_DIR, f'{today}_x_posts.json')
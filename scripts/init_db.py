@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
 """Money Machine DB初期化スクリプト"""
-import sqlite3
 import os
+import sys
 from datetime import datetime
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'money_machine.db')
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DB_PATH = os.path.join(BASE_DIR, 'data', 'money_machine.db')
+
+sys.path.insert(0, BASE_DIR)
+
+from common import db, migrations
 
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = db.connect(DB_PATH)
     c = conn.cursor()
 
     # 1. keywords
@@ -53,7 +58,8 @@ def init_db():
         data_json TEXT,
         source_url TEXT,
         scraped_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        is_current BOOLEAN DEFAULT 1
+        is_current BOOLEAN DEFAULT 1,
+        last_seen_at DATETIME
     )''')
 
     # 4. social_posts
@@ -159,6 +165,10 @@ def init_db():
 
     conn.commit()
 
+    # インデックス等はマイグレーションで管理（既存DBは daily_run 起動時に同じ処理で追いつく）
+    for number, name in migrations.migrate(conn):
+        print(f"  migration {number}: {name}")
+
     # 確認
     for table in ['keywords', 'tools', 'comparison_data', 'social_posts', 'revenue', 'templates']:
         c.execute(f'SELECT COUNT(*) FROM {table}')
@@ -3,98 +3,36 @@
 
 config/affiliate_links.json のURLを読み取り、
 全ツールの href="#" プレースホルダーを実際のアフィリエイトURLに置換する。
+どのリンクをどのキーにするかは config/link_rules.json（common/link_rules.py）。
+置換したアンカーには data-aff="<キー>" を付けるので、再実行はURLが変わったリンクだけを
+書き換え、変化の無いファイルには書き込まない。
 
 使い方:
   1. config/affiliate_links.json の各 "url" フィールドにASPから取得したURLを貼付
   2. python scripts/inject_affiliate_links.py を実行
   3. python scripts/inject_affiliate_links.py --dry-run で変更内容のプレビュー
+
+URLを差し替えただけなら --changed で、前回の注入時に作った逆引きインデックス
+（data/affiliate_index.json, common/link_index.py）からURLが変わったキーの入っている
+ファイルだけを書き換えられる。
 """
+import glob
+import html
 import json
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common import db, link_index, link_rules, manifest
+
 CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'affiliate_links.json')
 TOOLS_DIR = os.path.join(BASE_DIR, 'output', 'tools')
 
-# ツール別のリンク定義: (ファイル, 検索パターン, configキー)
-# 検索パターンは href="#" の直前のテキスト or クラス名で特定
-TOOL_LINK_MAP = {
-    'salary-calculator': [
-        {'match': 'LHH転職エージェント', 'key': 'lhh_agent'},
-        {'match': 'FREENANCE', 'key': 'freenance'},
-    ],
-    'unemployment-benefit': [
-        {'match': 'ピタテン', 'key': 'pitaten'},
-        {'match': 'UZUZ', 'key': 'uzuz'},
-    ],
-    'insurance-calculator': [
-        {'match': 'マネードクター', 'key': 'money_doctor'},
-        {'match': '保険見直しラボ', 'key': 'hoken_minaoshi_lab'},
-    ],
-    'investment-return': [
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-        {'match': 'DMM FX', 'key': 'dmm_fx'},
-    ],
-    'loan-calculator': [
-        {'match': 'モゲチェック', 'key': 'mogecheck'},
-        {'match': 'ファミリー工房', 'key': 'family_koubou'},
-    ],
-    'dividend-yield': [
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-        {'match': 'DMM FX', 'key': 'dmm_fx'},
-    ],
-    'pension-calculator': [
-        {'match': 'マネードクター', 'key': 'money_doctor'},
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-    ],
-    'nisa-simulator': [
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-        {'match': 'DMM FX', 'key': 'dmm_fx'},
-    ],
-    'compound-interest': [
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-        {'match': 'DMM FX', 'key': 'dmm_fx'},
-    ],
-    'retirement-calculator': [
-        {'match': 'マネードクター', 'key': 'money_doctor'},
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-    ],
-    'retirement-fund': [
-        {'match': 'マネードクター', 'key': 'money_doctor'},
-        {'match': 'SBI証券', 'key': 'sbi_securities'},
-    ],
-    'tax-calculator': [
-        {'match': 'マネーフォワード', 'key': 'money_forward'},
-        {'match': 'FREENANCE', 'key': 'freenance'},
-    ],
-    'real-estate-yield': [
-        {'match': 'リショップナビ', 'key': 'reshop_navi'},
-        {'match': 'ハピすむ', 'key': 'hapisumu'},
-    ],
-    'rent-vs-buy': [
-        {'match': 'モゲチェック', 'key': 'mogecheck'},
-        {'match': 'ファミリー工房', 'key': 'family_koubou'},
-    ],
-}
-
-# SIM比較のプロバイダー→configキーのマッピング
-SIM_PROVIDER_MAP = {
-    'povo': 'sim_povo',
-    'LINEMO': 'sim_linemo',
-    'IIJmio': 'sim_iijmio',
-    '楽天モバイル': 'sim_rakuten',
-    'mineo': 'sim_mineo',
-    'ahamo': 'sim_ahamo',
-    'UQモバイル': 'sim_uqmobile',
-    'ワイモバイル': 'sim_ymobile',
-    'NUROモバイル': 'sim_nuro_mobile',
-    'BIGLOBEモバイル': 'sim_biglobe',
-    'J:COMモバイル': 'sim_jcom',
-    'LIBMO': 'sim_libmo',
-    '日本通信SIM': 'sim_default',
-}
+LINK_WORKERS = 8
 
 
 def load_config():
@@ -102,111 +40,169 @@ def load_config():
         return json.load(f)
 
 
-def inject_tool_links(config, dry_run=False):
-    """通常ツール（sim-comparison以外）のリンク置換"""
-    changes = 0
-    for slug, links in TOOL_LINK_MAP.items():
-        filepath = os.path.join(TOOLS_DIR, slug, 'index.html')
-        if not os.path.isfile(filepath):
-            print(f"  SKIP: {slug} (file not found)")
-            continue
+def config_urls(config):
+    return {key: v['url'] for key, v in config.items() if isinstance(v, dict) and v.get('url')}
 
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
 
-        original = content
-        for link_def in links:
-            key = link_def['key']
-            match_text = link_def['match']
-            url = config.get(key, {}).get('url', '')
+def inject_tool_links(config, dry_run=False, rules=None, pages=None):
+    """通常ツール（sim-comparison以外）のリンク置換（ルールは config/link_rules.json）
 
-            if not url:
-                print(f"  SKIP: {slug} [{match_text}] - URL not set in config ({key})")
-                continue
+    pages に dict を渡すと {ファイルパス: 適用後の内容} を入れて返す（逆引きインデックス用）。
+    """
+    rules = rules or link_rules.load()
+    urls = config_urls(config)
 
-            # href="#" の直前100文字以内にmatch_textがあるパターンを探す
-            # 方法: match_textを含むブロック内の href="#" を置換
-            pattern = re.compile(
-                r'((?:(?!<a\b).){0,500}' + re.escape(match_text) + r'(?:(?!</a>).){0,500})href="#"',
-                re.DOTALL
-            )
-            new_content = pattern.sub(lambda m: m.group(0).replace('href="#"', f'href="{url}"'), content, count=1)
-
-            if new_content == content:
-                # 逆パターン: href="#" が match_text より前にある場合
-                pattern2 = re.compile(
-                    r'href="#"((?:(?!</a>).){0,500}' + re.escape(match_text) + r')',
-                    re.DOTALL
-                )
-                new_content = pattern2.sub(f'href="{url}"\\1', content, count=1)
-
-            if new_content != content:
-                content = new_content
-                changes += 1
-                print(f"  OK: {slug} [{match_text}] -> {key}")
-            else:
-                print(f"  WARN: {slug} [{match_text}] - pattern not found")
-
-        if content != original and not dry_run:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+    def process(slug):
+        filepath = os.path.join(TOOLS_DIR, slug, 'index.html')
+        if not os.path.isfile(filepath):
+            return slug, None, None, None
+        return (slug, filepath) + link_rules.rewrite_file(
+            filepath, lambda content: link_rules.apply_rules(content, rules.tools[slug], urls, rules.automaton),
+            dry_run)
 
+    changes = 0
+    with ThreadPoolExecutor(max_workers=LINK_WORKERS) as pool:
+        for slug, filepath, written, results, content in pool.map(process, rules.tools):
+            if results is None:
+                print(f"  SKIP: {slug} (file not found)")
+                continue
+            if pages is not None:
+                pages[filepath] = content
+            for match_text, key, status in results:
+                if status == 'changed':
+                    changes += 1
+                    print(f"  OK: {slug} [{match_text}] -> {key}")
+                elif status == 'marked':
+                    print(f"  MARK: {slug} [{match_text}] -> {key} (URL unchanged)")
+                elif status == 'no_url':
+                    print(f"  SKIP: {slug} [{match_text}] - URL not set in config ({key})")
+                elif status == 'missing':
+                    print(f"  WARN: {slug} [{match_text}] - pattern not found")
     return changes
 
 
-def inject_sim_links(config, dry_run=False):
-    """sim-comparison のリンク置換（JavaScript内のテンプレートリテラル修正）"""
-    filepath = os.path.join(TOOLS_DIR, 'sim-comparison', 'index.html')
-    if not os.path.isfile(filepath):
-        print("  SKIP: sim-comparison (file not found)")
-        return 0
+SIM_ROW_LINK = re.compile(
+    r'(<tr data-provider="([^"]*)"[^>]*>(?:(?!</tr>).)*?)(<a\b[^>]*class="btn-official"[^>]*>)公式サイト</a>',
+    re.S)
+SIM_LINK_ATTRS = [('target', '_blank'), ('rel', 'nofollow noopener')]
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
 
-    # URL マッピングを構築
-    url_map = {}
-    for provider, key in SIM_PROVIDER_MAP.items():
-        url = config.get(key, {}).get('url', '')
-        if url:
-            url_map[provider] = url
+def link_sim_rows(content, url_map, default):
+    """表の各行の公式サイトボタンを事業者のURLにする。(新しい内容, 書き換えた行数, 行数)"""
+    changed = rows = 0
 
-    default_url = config.get('sim_default', {}).get('url', '')
+    def replace(m):
+        nonlocal changed, rows
+        rows += 1
+        key, url = url_map.get(html.unescape(m.group(2)), default)
+        if not url:
+            return m.group(0)
+        tag = link_rules.set_attrs(m.group(3), [('href', url), ('data-aff', key)] + SIM_LINK_ATTRS)
+        if tag == m.group(3):
+            return m.group(0)
+        changed += 1
+        return f'{m.group(1)}{tag}公式サイト</a>'
 
-    if not url_map and not default_url:
-        print("  SKIP: sim-comparison - no SIM URLs configured")
-        return 0
+    return SIM_ROW_LINK.sub(replace, content), (changed, rows)
 
-    # JavaScriptにprovider→URLマッピングオブジェクトを注入
-    # href="#" をプロバイダーに応じた動的URLに変更
-    js_map = json.dumps(url_map, ensure_ascii=False)
 
-    # 既存の href="#" を動的リンクに変更
-    old_link = '<a href="#" class="btn-official">公式サイト</a>'
-    new_link = f'<a href="${{affiliateUrls[p.provider]||\\"{default_url}\\"}}" class="btn-official" target="_blank" rel="nofollow noopener">公式サイト</a>'
+def inject_sim_links(config, dry_run=False, rules=None, pages=None):
+    """sim-comparison 以下の全ページのリンク置換（各行 data-provider に応じた公式サイトURL）
 
-    if old_link in content:
-        # マッピングオブジェクトを allPlans の直後に挿入
-        content = content.replace(
-            'let currentSort="price";',
-            f'const affiliateUrls={js_map};\nlet currentSort="price";'
-        )
-        content = content.replace(old_link, new_link)
-
-        if not dry_run:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-
-        active = len(url_map)
-        print(f"  OK: sim-comparison - {active} providers mapped, default={'set' if default_url else 'none'}")
-        return 1
+    一覧ページに加えて事業者別・データ容量別ページ（provider/*/, data/*/）も対象。
+    URL が設定と同じ行は書き換えないので、設定を変えたときは変わった行のあるページだけが書き込まれる。
+    """
+    rules = rules or link_rules.load()
+    sim_dir = os.path.join(TOOLS_DIR, 'sim-comparison')
+    filepaths = sorted(glob.glob(os.path.join(sim_dir, '**', 'index.html'), recursive=True))
+    if not filepaths:
+        print("  SKIP: sim-comparison (file not found)")
+        return 0
 
-    print("  WARN: sim-comparison - pattern not found (already replaced?)")
-    return 0
+    # URL マッピングを構築（事業者名 -> (キー, URL)。載っていない事業者は sim_default）
+    urls = config_urls(config)
+    url_map = {provider: (key, urls[key]) for provider, key in rules.sim_providers.items() if key in urls}
+    default_url = urls.get('sim_default', '')
+    default = ('sim_default', default_url)
 
+    if not url_map and not default_url:
+        print("  SKIP: sim-comparison - no SIM URLs configured")
+        return 0
 
-def main():
-    dry_run = '--dry-run' in sys.argv
+    with ThreadPoolExecutor(max_workers=LINK_WORKERS) as pool:
+        results = list(pool.map(
+            lambda path: link_rules.rewrite_file(
+                path, lambda content: link_sim_rows(content, url_map, default), dry_run),
+            filepaths))
+
+    written_pages = rows = 0
+    for filepath, (written, (changed, total), content) in zip(filepaths, results):
+        if pages is not None:
+            pages[filepath] = content
+        if written:
+            written_pages += 1
+            rows += changed
+            print(f"  OK: {os.path.relpath(filepath, TOOLS_DIR)} - {changed}/{total} rows")
+    print(f"  sim-comparison: {written_pages}/{len(filepaths)} pages, {rows} rows updated, "
+          f"{len(url_map)} providers mapped, default={'set' if default_url else 'none'}")
+    return rows
+
+
+def inject_changed(config, dry_run=False, conn=None):
+    """逆引きインデックスを使い、URLが変わったキーの入っているファイルだけを書き換える
+
+    インデックスが無いときと、URLが未設定だったキー（アンカーにまだ目印が無い）に
+    URLが入ったときは None を返す（全体の注入が必要）。
+    """
+    index = link_index.load()
+    if index is None:
+        print("  No index yet (data/affiliate_index.json) - running full injection")
+        return None
+    urls = config_urls(config)
+    changes = link_index.changed_keys(index, urls)
+    if not changes:
+        print("  No URL changes since the last injection")
+        return 0
+    rule_keys = link_rules.load().keys()
+    new_keys = sorted(key for key, (old, new) in changes.items() if not old and new and key in rule_keys)
+    if new_keys:
+        print(f"  Newly configured keys: {', '.join(new_keys)} - running full injection")
+        return None
+
+    files = {}
+    for key in changes:
+        for rel, spots in index['keys'].get(key, {}).items():
+            files.setdefault(rel, {})[key] = spots
+    updated = 0
+    written = {}
+    for rel, spots_by_key in sorted(files.items()):
+        path = os.path.join(BASE_DIR, rel)
+        if not os.path.isfile(path):
+            print(f"  SKIP: {rel} (file not found)")
+            continue
+        data = link_index.patch_file(path, spots_by_key, changes)
+        if data is None:
+            continue
+        if not dry_run:
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            link_index.update_file(index, path, data)
+            written[path] = data
+        updated += 1
+        print(f"  OK: {rel} [{', '.join(sorted(spots_by_key))}]")
+    if not dry_run:
+        # URLを外したキー（新URLが空）は書き換えていないので、旧URLのまま記録しておく
+        index['urls'] = {**{key: old for key, (old, new) in changes.items() if not new and old},
+                         **urls}
+        link_index.save(index)
+        manifest.record(conn or db.get_connection(), written)
+    print(f"  {len(changes)} keys changed, {updated} files {'would be ' if dry_run else ''}updated")
+    return updated
+
+
+def main(ctx=None, dry_run=False, changed_only=False):
 
     if dry_run:
         print("=== DRY RUN (no files will be modified) ===\n")
@@ -214,7 +210,7 @@ def main():
     print("=== Affiliate Link Injection ===")
     print(f"Config: {CONFIG_PATH}\n")
 
-    config = load_config()
+    config = ctx.config if ctx else load_config()
 
     # 設定済みURL数をカウント
     set_count = sum(1 for k, v in config.items() if isinstance(v, dict) and v.get('url'))
@@ -226,11 +222,25 @@ def main():
         print("See _HOWTO field in the config file for instructions.")
         return 1
 
+    if changed_only:
+        print("[Changed URLs]")
+        updated = inject_changed(config, dry_run, ctx.db if ctx else None)
+        if updated is not None:
+            print(f"\n=== Done: {updated} files {'would be ' if dry_run else ''}updated ===")
+            return 0
+        print()
+
+    pages = {}
     print("[Tools]")
-    tool_changes = inject_tool_links(config, dry_run)
+    tool_changes = inject_tool_links(config, dry_run, pages=pages)
 
     print("\n[SIM Comparison]")
-    sim_changes = inject_sim_links(config, dry_run)
+    sim_changes = inject_sim_links(config, dry_run, pages=pages)
+
+    if not dry_run:
+        data = {path: content.encode('utf-8') for path, content in pages.items()}
+        link_index.save(link_index.build(data, config_urls(config)))
+        manifest.record(ctx.db if ctx else db.get_connection(), data)
 
     total_changes = tool_changes + sim_changes
     print(f"\n=== Done: {total_changes} links {'would be ' if dry_run else ''}updated ===")
@@ -238,4 +248,4 @@ def main():
 
 
 if __name__ == '__main__':
-    sys.exit(main())
+    sys.exit(main(dry_run='--dry-run' in sys.argv, changed_only='--changed' in sys.argv))
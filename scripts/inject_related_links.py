@@ -1,117 +1,180 @@
 #!/usr/bin/env python3
-"""全ツールに「関連ツール」セクションを一括注入"""
-import os, re
+"""全ツールに「関連ツール」セクションを注入・更新する
 
-BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output', 'tools'))
+関連ツールは tools テーブル（カテゴリ・アフィリエイトカテゴリ）とページ本文の類似度から
+計算する（common/related.py）。カタログ全体で計算し、リンク先はページのあるツールだけ。
+編集上の定番の組（related.EDITORIAL_PAIRS）には加点し、計算結果に入らなければ WARN を出す。
+
+セクションは <!-- mm:related-tools --> ... <!-- /mm:related-tools --> で囲み、次回からは
+その区間だけを差し替える。関連ツール（リンク先と表示名）が変わったページだけを書き込む。
+目印の無い旧形式のセクション（<div class="related-tools">）は同じ位置で目印付きに置き換える。
+
+使い方:
+  python scripts/inject_related_links.py            # 注入・更新
+  python scripts/inject_related_links.py --dry-run  # 書き換えるページの表示だけ
+"""
+import html
+import os
+import re
+import sys
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TOOLS_DIR = os.path.join(BASE_DIR, 'output', 'tools')
 SITE = 'https://ai-money-lab.github.io/benri-tools'
 
-TOOLS = {
-    'salary-calculator': '年収手取り計算機',
-    'tax-calculator': '副業税金シミュレーター',
-    'tax-return-checker': '確定申告要否チェッカー',
-    'furusato-tax': 'ふるさと納税上限額計算機',
-    'loan-calculator': '住宅ローン計算機',
-    'investment-return': '投資リターン計算機',
-    'nisa-simulator': '積立NISAシミュレーター',
-    'compound-interest': '複利計算シミュレーター',
-    'dividend-yield': '配当金利回り計算機',
-    'insurance-calculator': '生命保険必要額シミュレーター',
-    'pension-calculator': '年金受給額シミュレーター',
-    'retirement-fund': '老後資金シミュレーター',
-    'retirement-calculator': '退職金計算シミュレーター',
-    'unemployment-benefit': '失業保険計算機',
-    'rent-vs-buy': '持ち家vs賃貸比較',
-    'real-estate-yield': '不動産投資利回り計算機',
-    'sim-comparison': '格安SIM比較表',
-}
-
-RELATED = {
-    'salary-calculator': ['tax-calculator', 'tax-return-checker', 'pension-calculator', 'unemployment-benefit'],
-    'tax-calculator': ['tax-return-checker', 'salary-calculator', 'furusato-tax', 'nisa-simulator'],
-    'tax-return-checker': ['tax-calculator', 'furusato-tax', 'salary-calculator', 'nisa-simulator'],
-    'furusato-tax': ['tax-calculator', 'tax-return-checker', 'salary-calculator', 'nisa-simulator'],
-    'loan-calculator': ['rent-vs-buy', 'real-estate-yield', 'insurance-calculator', 'salary-calculator'],
-    'investment-return': ['compound-interest', 'nisa-simulator', 'dividend-yield', 'retirement-fund'],
-    'nisa-simulator': ['investment-return', 'compound-interest', 'dividend-yield', 'tax-calculator'],
-    'compound-interest': ['investment-return', 'nisa-simulator', 'dividend-yield', 'retirement-fund'],
-    'dividend-yield': ['investment-return', 'nisa-simulator', 'compound-interest', 'retirement-fund'],
-    'insurance-calculator': ['pension-calculator', 'retirement-fund', 'salary-calculator', 'loan-calculator'],
-    'pension-calculator': ['retirement-fund', 'retirement-calculator', 'salary-calculator', 'insurance-calculator'],
-    'retirement-fund': ['pension-calculator', 'retirement-calculator', 'compound-interest', 'nisa-simulator'],
-    'retirement-calculator': ['pension-calculator', 'retirement-fund', 'salary-calculator', 'tax-calculator'],
-    'unemployment-benefit': ['salary-calculator', 'tax-calculator', 'pension-calculator', 'insurance-calculator'],
-    'rent-vs-buy': ['loan-calculator', 'real-estate-yield', 'insurance-calculator', 'salary-calculator'],
-    'real-estate-yield': ['rent-vs-buy', 'loan-calculator', 'investment-return', 'compound-interest'],
-    'sim-comparison': ['salary-calculator', 'furusato-tax', 'tax-calculator', 'insurance-calculator'],
-}
+sys.path.insert(0, BASE_DIR)
+
+from common import db, manifest, related
+
+TOOLS_QUERY = 'SELECT slug, name, category, affiliate_category FROM tools ORDER BY slug'
+
+MARK_START = '<!-- mm:related-tools -->'
+MARK_END = '<!-- /mm:related-tools -->'
+REGION_RE = re.compile(re.escape(MARK_START) + '.*?' + re.escape(MARK_END), re.S)
+LEGACY_RE = re.compile(r'<div class="related-tools">')
+LINK_RE = re.compile(r'<a\b[^>]*\bclass="related-link"[^>]*>(.*?)</a>', re.S)
+HREF_RE = re.compile(r'\bhref="([^"]*)"')
+
+# 類似度の計算に使うページの部分（タイトル・説明文・見出し・リード文）
+TEXT_RE = re.compile(r'<title>(.*?)</title>|<meta name="description" content="([^"]*)"'
+                     r'|<h[1-3]\b[^>]*>(.*?)</h[1-3]>'
+                     r'|<(?:p|div) class="(?:subtitle|card-title|lead)"[^>]*>(.*?)</(?:p|div)>', re.S | re.I)
+TAG_RE = re.compile(r'<[^>]+>')
+
+# 既にスタイルがあるか（インライン、または minify_output.py が外出しした共有CSS）
+HAS_STYLE_RE = re.compile(r'\.related-tools\s*\{|/related-tools\.[0-9a-f]+\.css')
 
 STYLE = '''<style>.related-tools{background:#f8f9fa;border-radius:12px;padding:20px;margin:20px 0}.related-tools h3{font-size:1rem;color:#1a2744;margin-bottom:12px;padding-bottom:8px;border-bottom:2px solid #667eea}.related-grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(200px,1fr));gap:8px}.related-link{display:block;padding:10px 14px;background:#fff;border-radius:8px;text-decoration:none;color:#333;font-size:.9rem;font-weight:500;box-shadow:0 1px 3px rgba(0,0,0,.08);transition:transform .15s,box-shadow .15s}.related-link:hover{transform:translateY(-1px);box-shadow:0 3px 8px rgba(102,126,234,.2);color:#667eea}</style>'''
 
-def build_section(slug):
-    links = RELATED.get(slug, [])
-    if not links:
-        return ''
-    items = ''
-    for s in links:
-        name = TOOLS.get(s, s)
-        items += f'    <a href="{SITE}/{s}/" class="related-link">{name}</a>\n'
-    return f'''
+# 新規挿入の位置（最初に見つかった要素の直前）
+INSERT_BEFORE = [
+    re.compile(r'<p class="note">'),
+    re.compile(r'<footer'),
+    re.compile(r'<!-- Disclaimer -->'),
+    re.compile(r'<div class="disclaimer"'),
+]
+
+
+def page_path(slug):
+    return os.path.join(TOOLS_DIR, slug, 'index.html')
+
+
+def legacy_span(content):
+    """目印の無い旧形式セクションの (開始, 終了) を返す（div の入れ子を数えて閉じタグまで）"""
+    m = LEGACY_RE.search(content)
+    if not m:
+        return None
+    depth = 0
+    for tag in re.finditer(r'<div\b|</div>', content[m.start():]):
+        depth += 1 if tag.group(0) == '<div' else -1
+        if depth == 0:
+            return m.start(), m.start() + tag.end()
+    return None
+
+
+def strip_section(content):
+    """関連ツールのセクションを除いた本文（リンク先の名前が類似度に混ざらないように）"""
+    content = REGION_RE.sub('', content)
+    span = legacy_span(content)
+    return content[:span[0]] + content[span[1]:] if span else content
+
+
+def page_text(content):
+    parts = []
+    for m in TEXT_RE.finditer(strip_section(content)):
+        text = next(group for group in m.groups() if group is not None)
+        parts.append(html.unescape(TAG_RE.sub(' ', text)))
+    return ' '.join(parts)
+
+
+def current_links(content):
+    """ページに入っている関連ツール [(href, 表示名)]（セクションが無ければ None）"""
+    m = REGION_RE.search(content)
+    if not m:
+        return None
+    links = []
+    for link in LINK_RE.finditer(m.group(0)):
+        href = HREF_RE.search(link.group(0))
+        links.append((html.unescape(href.group(1)) if href else '', html.unescape(link.group(1).strip())))
+    return links
+
+
+def build_section(links):
+    items = ''.join(f'      <a href="{html.escape(href)}" class="related-link">{html.escape(name)}</a>\n'
+                    for href, name in links)
+    return f'''{MARK_START}
   <div class="related-tools">
     <h3>関連ツール</h3>
     <div class="related-grid">
 {items}    </div>
-  </div>'''
-
-def inject(slug):
-    path = os.path.join(BASE, slug, 'index.html')
-    if not os.path.isfile(path):
-        print(f'  SKIP: {slug} (not found)')
-        return False
-    with open(path, 'r', encoding='utf-8') as f:
-        html = f.read()
-
-    if 'related-tools' in html:
-        print(f'  SKIP: {slug} (already has related-tools)')
-        return False
-
-    section = build_section(slug)
-    if not section:
-        print(f'  SKIP: {slug} (no related links defined)')
-        return False
-
-    # Insert style before </head>
-    html = html.replace('</head>', STYLE + '\n</head>', 1)
-
-    # Insert section before </div> that precedes <script> or before <footer
-    # Strategy: insert before the last </div> before <script>
-    # Find the footer or note/disclaimer near the end
-    patterns = [
-        (r'(<p class="note">)', r'{}\1'),
-        (r'(<footer)', r'{}\1'),
-        (r'(<!-- Disclaimer -->)', r'{}\1'),
-        (r'(<div class="disclaimer")', r'{}\1'),
-    ]
-    inserted = False
-    for pat, repl in patterns:
-        m = re.search(pat, html)
-        if m:
-            pos = m.start()
-            html = html[:pos] + section + '\n\n  ' + html[pos:]
-            inserted = True
-            break
-
-    if not inserted:
-        # Fallback: insert before </div>\n\n<script>
-        html = re.sub(r'(</div>\s*\n\s*<script>)', section + r'\n\1', html, count=1)
-        inserted = True
-
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write(html)
-    print(f'  OK: {slug}')
-    return True
-
-count = 0
-for slug in TOOLS:
-    if inject(slug):
-        count += 1
-print(f'\nDone: {count} tools updated')
+  </div>
+  {MARK_END}'''
+
+
+def apply_section(content, links):
+    """関連ツールのセクションを差し替え・挿入した内容を返す（挿入位置が無ければ None）"""
+    section = build_section(links)
+    if REGION_RE.search(content):
+        return REGION_RE.sub(lambda _: section, content, count=1)
+
+    span = legacy_span(content)
+    if span:
+        content = content[:span[0]] + section + content[span[1]:]
+    else:
+        for pattern in INSERT_BEFORE:
+            m = pattern.search(content)
+            if m:
+                content = content[:m.start()] + section + '\n\n  ' + content[m.start():]
+                break
+        else:
+            m = re.search(r'</div>\s*\n\s*<script>', content)
+            if not m:
+                return None
+            content = content[:m.start()] + section + '\n' + content[m.start():]
+
+    if not HAS_STYLE_RE.search(content):
+        content = content.replace('</head>', STYLE + '\n</head>', 1)
+    return content
+
+
+def main(ctx=None, dry_run=False):
+    print("=== Related tools ===")
+    conn = ctx.db if ctx else db.get_connection()
+    tools = conn.execute(TOOLS_QUERY).fetchall()
+    names = {slug: name for slug, name, _, _ in tools}
+
+    # ページのあるツールはビルドマニフェストで引く（ツリーを走査しない）
+    built = manifest.paths(conn, 'output/tools/%/index.html')
+    pages = {}
+    for slug in names:
+        if manifest.relpath(page_path(slug)) in built:
+            with open(page_path(slug), encoding='utf-8') as f:
+                pages[slug] = f.read()
+    texts = {slug: page_text(content) for slug, content in pages.items()}
+    graph = related.related_graph(tools, texts, set(pages))
+    # 編集上の定番の組（related.EDITORIAL_PAIRS）が計算結果に入っているか
+    for slug, other in related.missing_editorial(graph):
+        print(f'  WARN: {slug} -> {other} (editorial pair not in the computed graph)')
+
+    updated = 0
+    for slug, content in pages.items():
+        links = [(f'{SITE}/{other}/', names[other]) for other in graph[slug]]
+        if current_links(content) == links:
+            continue
+        new = apply_section(content, links)
+        if new is None:
+            print(f'  WARN: {slug} (no place to insert)')
+            continue
+        updated += 1
+        print(f'  {"WOULD UPDATE" if dry_run else "OK"}: {slug} -> {", ".join(graph[slug])}')
+        if not dry_run:
+            manifest.write_page(conn, page_path(slug), new)
+
+    print(f"\n  Pages: {len(pages)} ({updated} {'would be ' if dry_run else ''}updated, "
+          f"{len(pages) - updated} unchanged), catalogue: {len(tools)} tools")
+    print("=== Done ===")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(dry_run='--dry-run' in sys.argv))
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""output/tools/ 以下のうちジェネレーターが作るページの HTML を縮小する（ビルドの最終段）
+
+縮小するのは GENERATED_PAGES（テンプレートから毎回作り直すサイトインデックスと格安SIM比較）だけ。
+各ツールのページは手で書いた原本で、編集や後段の注入もそのファイルに対して行うので触らない。
+
+- インラインの <style> / <script> と HTML 本文の空白・コメントを削る
+  （意味が変わりうる書き換えはしない保守的な縮小。<pre> / <textarea> はそのまま）
+- inject_related_links.py が入れた同じ <style>（.related-tools）を
+  内容ハッシュ付きの共有CSS（output/tools/assets/related-tools.<hash>.css）へ外出しする
+- ページごとの削減バイト数（gzip 後も）を表示する
+
+<!-- mm:... --> / <!-- /mm:... --> の区間マーカーは後段の差し替えに使うので残す。
+縮小は冪等で、既に縮小済みのページは書き込まない。
+output/tools/ の全ファイルの最終的な内容をビルドマニフェスト（common/manifest.py）に記録し、
+ツリーから消えたファイルはマニフェストでも削除扱いにする。
+
+使い方:
+  python scripts/minify_output.py            # 縮小して書き込む
+  python scripts/minify_output.py --dry-run  # 削減量の表示だけ
+"""
+import glob
+import gzip
+import hashlib
+import os
+import re
+import sys
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from common import db, link_index, manifest
+
+TOOLS_DIR = os.path.join(BASE_DIR, 'output', 'tools')
+ASSETS_DIR = os.path.join(TOOLS_DIR, 'assets')
+
+# 縮小するページ（TOOLS_DIR 相対の glob）。どれもジェネレーターが書き出すので、縮小しても原本は読めるまま
+GENERATED_PAGES = [
+    'index.html',                  # scripts/generate_site_index.py
+    'sim-comparison/**/*.html',    # generators/comparison_generator.py
+]
+
+# 外出しする共有スタイル: (ファイル名の接頭辞, <style> の中身の先頭)
+SHARED_STYLES = [
+    ('related-tools', '.related-tools{'),
+]
+
+KEEP_COMMENT = re.compile(r'<!--\s*/?mm:|<!--\[if|<!\[endif')
+
+# 改行を消すと ASI（自動セミコロン挿入）で意味が変わりうるので、直前がこれらの文字の
+# ときだけ改行を詰める（++ / -- の後ろは詰めない）
+JS_JOIN_AFTER = set('{;,([=:&|?<>!*%')
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'delete',
+                     'instanceof', 'new', 'throw', 'yield', 'await'}
+
+
+def _is_word(ch):
+    return ch.isalnum() or ch in '_$' or ord(ch) > 127
+
+
+class _JsScanner:
+    """文字列・テンプレートリテラル・正規表現リテラル・コメントを区別して空白を詰める"""
+
+    def __init__(self, src):
+        self.src = src
+        self.out = []
+
+    def last(self):
+        return self.out[-1][-1] if self.out and self.out[-1] else ''
+
+    def last_word(self):
+        text = ''.join(self.out[-16:])
+        m = re.search(r'[\w$]+$', text)
+        return m.group(0) if m else ''
+
+    def skip_string(self, i):
+        quote, n = self.src[i], len(self.src)
+        i += 1
+        while i < n:
+            ch = self.src[i]
+            if ch == '\\':
+                i += 2
+                continue
+            if ch == quote or ch == '\n':
+                return i + 1
+            i += 1
+        return n
+
+    def skip_template(self, i):
+        src, n = self.src, len(self.src)
+        i += 1
+        while i < n:
+            ch = src[i]
+            if ch == '\\':
+                i += 2
+            elif ch == '`':
+                return i + 1
+            elif src.startswith('${', i):
+                i = self.skip_braces(i + 2)
+            else:
+                i += 1
+        return n
+
+    def skip_braces(self, i):
+        """${ ... } の中を対応する } の直後まで読み飛ばす（中身は縮小しない）"""
+        src, n, depth = self.src, len(self.src), 1
+        while i < n:
+            ch = src[i]
+            if ch in '"\'':
+                i = self.skip_string(i)
+                continue
+            if ch == '`':
+                i = self.skip_template(i)
+                continue
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            i += 1
+        return n
+
+    def skip_regex(self, i):
+        src, n = self.src, len(self.src)
+        i += 1
+        in_class = False
+        while i < n:
+            ch = src[i]
+            if ch == '\\':
+                i += 2
+                continue
+            if ch == '\n':
+                return i
+            if in_class:
+                in_class = ch != ']'
+            elif ch == '[':
+                in_class = True
+            elif ch == '/':
+                i += 1
+                while i < n and src[i].isalpha():
+                    i += 1
+                return i
+            i += 1
+        return n
+
+    def regex_allowed(self):
+        last = self.last()
+        if not last or last in JS_REGEX_AFTER:
+            return True
+        return _is_word(last) and self.last_word() in JS_REGEX_KEYWORDS
+
+    def minify(self):
+        src, n = self.src, len(self.src)
+        i = 0
+        newline = space = False
+        while i < n:
+            ch = src[i]
+            if ch in ' \t\r\f\v':
+                space = True
+                i += 1
+                continue
+            if ch == '\n':
+                newline = True
+                i += 1
+                continue
+            if src.startswith('//', i):
+                end = src.find('\n', i)
+                i = n if end < 0 else end
+                continue
+            if src.startswith('/*', i):
+                end = src.find('*/', i + 2)
+                end = n if end < 0 else end + 2
+                newline = newline or '\n' in src[i:end]
+                space = True
+                i = end
+                continue
+
+            if ch in '"\'':
+                end = self.skip_string(i)
+            elif ch == '`':
+                end = self.skip_template(i)
+            elif ch == '/' and self.regex_allowed():
+                end = self.skip_regex(i)
+            else:
+                end = i + 1
+            token = src[i:end]
+
+            last = self.last()
+            if self.out:
+                if newline and last not in JS_JOIN_AFTER:
+                    self.out.append('\n')
+                elif (newline or space) and (
+                        (_is_word(last) and (_is_word(ch) or token == '.' and src[end:end + 1].isdigit()))
+                        or (last in '+-' and ch == last)):
+                    self.out.append(' ')
+            newline = space = False
+            self.out.append(token)
+            i = end
+        return ''.join(self.out)
+
+
+def minify_js(src):
+    return _JsScanner(src).minify()
+
+
+CSS_TOKEN = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/|\s+', re.S)
+
+
+def minify_css(src):
+    def token(m):
+        if m.group(1):
+            return m.group(1)
+        return ' '
+
+    css = CSS_TOKEN.sub(token, src)
+    # 文字列を退避してから記号の前後の空白を詰める
+    strings = []
+
+    def stash(m):
+        strings.append(m.group(0))
+        return f'\0{len(strings) - 1}\0'
+
+    css = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', stash, css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}').strip()
+    return re.sub(r'\0(\d+)\0', lambda m: strings[int(m.group(1))], css)
+
+
+HTML_RAW = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)|(<!--.*?-->)', re.S | re.I)
+
+
+def _minify_text(text):
+    # 改行を含む空白の並びは改行1つに、それ以外は空白1つにまとめる（表示は変わらない）
+    return re.sub(r'\s+', lambda m: '\n' if '\n' in m.group(0) else ' ', text)
+
+
+def minify_html(html):
+    # 消したコメントの前後の空白もまとめて詰められるよう、本文は次に残す要素の直前でまとめて処理する
+    out, text, pos = [], [], 0
+    for m in HTML_RAW.finditer(html):
+        text.append(html[pos:m.start()])
+        pos = m.end()
+        if m.group(5):
+            if KEEP_COMMENT.match(m.group(5)):
+                out.append(_minify_text(''.join(text)) + m.group(5))
+                text = []
+            continue
+        open_tag, name, body, close_tag = m.group(1), m.group(2).lower(), m.group(3), m.group(4)
+        if name == 'style':
+            body = minify_css(body)
+        elif name == 'script' and not re.search(r'\btype=["\']?(?!text/javascript|module)', open_tag):
+            body = minify_js(body)
+        out.append(_minify_text(''.join(text) + open_tag) + body + close_tag)
+        text = []
+    text.append(html[pos:])
+    out.append(_minify_text(''.join(text)))
+    return ''.join(out).strip() + '\n'
+
+
+def write_shared_style(prefix, css, dry_run=False):
+    """共有CSSを内容ハッシュ付きのファイル名で書き、そのパスを返す（古いハッシュのファイルは消す）"""
+    digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:10]
+    path = os.path.join(ASSETS_DIR, f'{prefix}.{digest}.css')
+    if dry_run:
+        return path
+    os.makedirs(ASSETS_DIR, exist_ok=True)
+    if not os.path.isfile(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(css + '\n')
+    for old in glob.glob(os.path.join(ASSETS_DIR, f'{prefix}.*.css')):
+        if old != path:
+            os.remove(old)
+    return path
+
+
+def extract_shared_styles(html, page_path, dry_run=False):
+    """SHARED_STYLES に該当する <style> を共有CSSへの <link> に置き換える"""
+    for prefix, start in SHARED_STYLES:
+        pattern = re.compile(r'<style>\s*(' + re.escape(start) + r'.*?)</style>', re.S)
+        m = pattern.search(html)
+        if not m:
+            continue
+        css_path = write_shared_style(prefix, minify_css(m.group(1)), dry_run)
+        href = os.path.relpath(css_path, os.path.dirname(page_path)).replace(os.sep, '/')
+        html = pattern.sub(lambda _: f'<link rel="stylesheet" href="{href}">', html)
+    return html
+
+
+def gzip_size(data):
+    return len(gzip.compress(data, 9, mtime=0))
+
+
+def minify_file(path, dry_run=False, index=None, pages=None):
+    """1ページを縮小し (縮小前, 縮小後, gzip前, gzip後, 書き込んだか) を返す
+
+    index（アフィリエイトリンクの逆引きインデックス）を渡すと、書き換えたページのリンク位置を更新する。
+    pages に dict を渡すと {ファイルパス: 縮小後の内容} を入れる（ビルドマニフェスト用）。
+    """
+    with open(path, 'rb') as f:
+        before = f.read()
+    html = extract_shared_styles(before.decode('utf-8'), path, dry_run)
+    after = minify_html(html).encode('utf-8')
+    changed = after != before
+    if changed and not dry_run:
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(after)
+        os.replace(tmp, path)
+        if index is not None:
+            link_index.update_file(index, path, after)
+    if pages is not None:
+        pages[path] = after
+    gz_before = gzip_size(before) if changed else None
+    gz_after = gzip_size(after) if changed else None
+    return len(before), len(after), gz_before, gz_after, changed
+
+
+def sync_manifest(conn, pages):
+    """縮小後の全ページと output/tools/ のその他のファイル（共有CSS・robots.txt 等）を
+    マニフェストに記録し、ツリーから無くなったものを削除扱いにする"""
+    contents = dict(pages)
+    for path in glob.glob(os.path.join(TOOLS_DIR, '**', '*'), recursive=True):
+        if path not in contents and os.path.isfile(path) and not path.endswith('.tmp'):
+            with open(path, 'rb') as f:
+                contents[path] = f.read()
+    manifest.record(conn, contents)
+    current = {manifest.relpath(path) for path in contents}
+    manifest.remove(conn, sorted(manifest.paths(conn) - current))
+
+
+def main(ctx=None, dry_run=False):
+    print("=== Minify output ===")
+    pages = sorted({path for pattern in GENERATED_PAGES
+                    for path in glob.glob(os.path.join(TOOLS_DIR, pattern), recursive=True)})
+    index = link_index.load()
+    final = {}
+    total_before = total_after = gz_total_before = gz_total_after = changed = 0
+    for path in pages:
+        before, after, gz_before, gz_after, written = minify_file(path, dry_run, index, final)
+        total_before += before
+        total_after += after
+        if written:
+            changed += 1
+            gz_total_before += gz_before
+            gz_total_after += gz_after
+            rel = os.path.relpath(path, BASE_DIR)
+            print(f"  {rel}: {before:,} -> {after:,} bytes (-{1 - after / before:.1%}), "
+                  f"gzip {gz_before:,} -> {gz_after:,}")
+
+    if changed and index is not None and not dry_run:
+        link_index.save(index)
+    if not dry_run:
+        sync_manifest(ctx.db if ctx else db.get_connection(), final)
+
+    saved = total_before - total_after
+    print(f"\n  Pages: {len(pages)} ({changed} {'would be ' if dry_run else ''}minified, "
+          f"{len(pages) - changed} already minified)")
+    if changed:
+        print(f"  Saved: {saved:,} bytes (-{saved / total_before:.1%}), "
+              f"gzip {gz_total_before - gz_total_after:,} bytes")
+    print("=== Done ===")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(dry_run='--dry-run' in sys.argv))
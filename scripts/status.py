@@ -1,17 +1,28 @@
 #!/usr/bin/env python3
-"""Money Machine ステータスダッシュボード"""
-import sqlite3
+"""Money Machine ステータスダッシュボード
+
+使い方:
+  python scripts/status.py             # パイプライン推移は直近7回分
+  python scripts/status.py --runs 30   # 直近30回分
+"""
+import argparse
 import os
+import sys
 import glob
 from datetime import datetime
 
 BASE_DIR = os.path.join(os.path.dirname(__file__), '..')
 DB_PATH = os.path.join(BASE_DIR, 'data', 'money_machine.db')
+TREND_RUNS = 7
+
+sys.path.insert(0, os.path.abspath(BASE_DIR))
 
-def get_db_stats():
+from common import db, manifest, metrics
+
+def get_db_stats(conn=None):
     if not os.path.exists(DB_PATH):
         return {}
-    conn = sqlite3.connect(DB_PATH)
+    conn = conn or db.get_connection()
     c = conn.cursor()
     stats = {}
     for table in ['keywords', 'tools', 'comparison_data', 'social_posts', 'revenue', 'templates']:
@@ -28,7 +39,6 @@ def get_db_stats():
     except:
         stats['tool_status'] = {}
 
-    conn.close()
     return stats
 
 def list_files(directory, pattern='*'):
@@ -43,6 +53,16 @@ def list_files(directory, pattern='*'):
             results.append((rel, size))
     return results
 
+def get_built_files(conn=None):
+    """ビルドマニフェストに記録された output/tools/ のファイル [(パス, バイト数, デプロイ済みか)]"""
+    if not os.path.exists(DB_PATH):
+        return []
+    conn = conn or db.get_connection()
+    manifest.ensure_table(conn)
+    return conn.execute('''SELECT path, bytes, sha256 IS deployed_sha256 FROM build_manifest
+                           WHERE sha256 IS NOT NULL ORDER BY path''').fetchall()
+
+
 def check_scheduler():
     import subprocess
     import platform
@@ -79,9 +99,41 @@ def check_x_queue():
     posted = sum(1 for p in queue if p.get('posted'))
     return {'total': total, 'posted': posted, 'remaining': total - posted}
 
-def main():
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def get_pipeline_trends(conn=None, runs=TREND_RUNS):
+    """直近 runs 回のパイプライン実行からステップ別の推移を集計する"""
+    if not os.path.exists(DB_PATH):
+        return {}
+    by_step = metrics.recent_runs(conn or db.get_connection(), runs)
+
+    trends = {}
+    for step, records in by_step.items():
+        # skipped は入力が同じで実行せず、blocked は上流の失敗で実行しなかったもの
+        executed = [r for r in records if r['status'] not in ('skipped', 'blocked')]
+        walls = [r['wall_s'] for r in executed if r['wall_s'] is not None]
+        latest = executed[0] if executed else records[0]
+        trends[step] = {
+            'runs': len(records),
+            'skipped': sum(1 for r in records if r['status'] == 'skipped'),
+            'blocked': sum(1 for r in records if r['status'] == 'blocked'),
+            'failed': sum(1 for r in records if r['status'] in ('failed', 'timeout')),
+            'latest': latest,
+            'median_wall': _median(walls),
+            'max_wall': max(walls) if walls else None,
+        }
+    return trends
+
+
+def main(ctx=None, runs=TREND_RUNS):
     now = datetime.now().strftime('%Y-%m-%d %H:%M')
-    stats = get_db_stats()
+    stats = get_db_stats(ctx.db if ctx else None)
 
     print("=" * 48)
     print("  MONEY MACHINE STATUS")
@@ -101,11 +153,15 @@ def main():
         print(f"  tools breakdown: {', '.join(status_parts)}")
 
     # Tools
-    print("\n TOOLS (output/tools/)")
-    tools = list_files('output/tools')
+    print("\n TOOLS (output/tools/, build manifest)")
+    tools = get_built_files(ctx.db if ctx else None)
     if tools:
-        for path, size in tools:
-            print(f"  {path} ({size:,} bytes)")
+        for path, size, deployed in tools:
+            print(f"  {path} ({size:,} bytes){'' if deployed else ' [not deployed]'}")
+        pending = manifest.pending(ctx.db if ctx else db.get_connection())
+        if pending:
+            removed = sum(1 for _, is_removed in pending if is_removed)
+            print(f"  pending deploy: {len(pending) - removed} changed, {removed} removed")
     else:
         print("  (none)")
 
@@ -151,6 +207,33 @@ def main():
     for name, status in sched_tasks.items():
         print(f"  {name}: {status}")
 
+    # Pipeline trends
+    print(f"\n PIPELINE (last {runs} runs)")
+    trends = get_pipeline_trends(ctx.db if ctx else None, runs)
+    if trends:
+        for step, t in trends.items():
+            latest = t['latest']
+            wall = latest['wall_s'] or 0
+            median = t['median_wall']
+            flag = ''
+            if median and wall > median * 1.5 and wall - median > 0.5:
+                flag = '  <-- slower than usual'
+            parts = [f"latest {wall:.2f}s"]
+            if median is not None:
+                parts.append(f"median {median:.2f}s, max {t['max_wall']:.2f}s")
+            if latest['cpu_s'] is not None:
+                parts.append(f"cpu {latest['cpu_s']:.2f}s")
+            if latest['rows_read'] is not None:
+                parts.append(f"rows r/w {latest['rows_read']}/{latest['rows_written']}")
+            if latest['bytes_written'] is not None:
+                parts.append(f"io r/w {latest['bytes_read']:,}/{latest['bytes_written']:,}B")
+            if latest['peak_rss_kb'] is not None:
+                parts.append(f"peak rss {latest['peak_rss_kb'] // 1024}MB (whole process, run-level)")
+            print(f"  {step}: {', '.join(parts)}{flag}")
+            print(f"    runs {t['runs']} (skipped {t['skipped']}, failed {t['failed']}, blocked {t['blocked']})")
+    else:
+        print("  (no pipeline runs recorded)")
+
     # X Post Queue
     print("\n X POST QUEUE")
     xq = check_x_queue()
@@ -162,4 +245,8 @@ def main():
     print("\n" + "=" * 48)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Money Machine status dashboard')
+    parser.add_argument('--runs', type=int, default=TREND_RUNS,
+                        help=f'number of recent pipeline runs to summarise (default: {TREND_RUNS})')
+    args = parser.parse_args()
+    main(runs=args.runs)